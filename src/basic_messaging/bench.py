@@ -0,0 +1,235 @@
+"""Generador de carga para el servidor de saludos (hello.py).
+
+Levanta el servidor en localhost en cada modo pedido, lo somete a carga con
+clientes asyncio y mide peticiones por segundo y latencias p50/p95/p99.
+
+Ejemplo:
+    python -m basic_messaging.bench --modos asyncio prefork --concurrencia 200 \\
+        --duracion 10 --tamanos 16 1024 --salida resultados.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from basic_messaging.protocol import MAGIC, CABECERA, TIPO_SALUDO, TIPO_RESPUESTA, codificar_trama
+
+HOST = '127.0.0.1'
+LEGACY_MAX = 1024  # El protocolo antiguo solo lee 1024 bytes por conexión
+MODOS = ('asyncio', 'prefork', 'blocking')
+
+
+def puerto_libre() -> int:
+    """Pide al sistema un puerto TCP libre en localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(modo: str, port: int, workers: int, log_dir: str) -> subprocess.Popen:
+    """Arranca hello.py en un subproceso y espera a que acepte conexiones."""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, HELLO_WORKERS=str(workers))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [src_dir, env.get('PYTHONPATH')]))
+    codigo = ('from basic_messaging import hello; '
+              f'hello.run_server({modo!r}, {HOST!r}, {port})')
+    proceso = subprocess.Popen([sys.executable, '-c', codigo], cwd=log_dir, env=env)
+
+    limite = time.monotonic() + 10
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f'El servidor en modo {modo} terminó al arrancar')
+        try:
+            socket.create_connection((HOST, port), timeout=0.5).close()
+            return proceso
+        except OSError:
+            time.sleep(0.05)
+    proceso.kill()
+    raise RuntimeError(f'El servidor en modo {modo} no respondió a tiempo')
+
+
+def detener_servidor(proceso: subprocess.Popen):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+async def _cliente_persistente(port, mensaje, fin, timeout, latencias, errores):
+    """Un cliente que reutiliza su conexión para todas las peticiones."""
+    trama = codificar_trama(TIPO_SALUDO, mensaje)
+    reader = writer = None
+    while time.monotonic() < fin:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+                writer.write(MAGIC)
+            inicio = time.perf_counter()
+            writer.write(trama)
+            cabecera = await asyncio.wait_for(reader.readexactly(CABECERA.size), timeout)
+            longitud, tipo = CABECERA.unpack(cabecera)
+            await asyncio.wait_for(reader.readexactly(longitud), timeout)
+            if tipo != TIPO_RESPUESTA:
+                raise ValueError(f'Respuesta inesperada: {tipo}')
+            latencias.append(time.perf_counter() - inicio)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            errores[0] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _cliente_una_vez(port, mensaje, fin, timeout, latencias, errores):
+    """Un cliente que abre una conexión nueva por petición (protocolo antiguo)."""
+    while time.monotonic() < fin:
+        inicio = time.perf_counter()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+            writer.write(mensaje)
+            await asyncio.wait_for(writer.drain(), timeout)
+            respuesta = await asyncio.wait_for(reader.read(), timeout)
+            if not respuesta:
+                raise ValueError('Respuesta vacía')
+            latencias.append(time.perf_counter() - inicio)
+        except (OSError, asyncio.TimeoutError, ValueError):
+            errores[0] += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+async def _generar_carga(port, concurrencia, duracion, tamano, reutilizar, timeout):
+    if not reutilizar:
+        tamano = min(tamano, LEGACY_MAX)
+    mensaje = ('hola soy ' + 'x' * max(tamano - 9, 0)).encode('utf-8')
+    inicio = time.monotonic()
+    fin = inicio + duracion
+    latencias, errores = [], [0]
+    cliente = _cliente_persistente if reutilizar else _cliente_una_vez
+    await asyncio.gather(*(cliente(port, mensaje, fin, timeout, latencias, errores)
+                           for _ in range(concurrencia)))
+    return latencias, errores[0], time.monotonic() - inicio
+
+
+def _proceso_carga(args):
+    """Punto de entrada de cada proceso generador de carga."""
+    return asyncio.run(_generar_carga(*args))
+
+
+def percentil(valores_ordenados, p: float) -> float:
+    if not valores_ordenados:
+        return 0.0
+    indice = max(math.ceil(p / 100 * len(valores_ordenados)) - 1, 0)
+    return valores_ordenados[indice]
+
+
+def medir(port, concurrencia, duracion, tamano, reutilizar, procesos, timeout) -> dict:
+    """Lanza la carga repartida en varios procesos y resume las métricas."""
+    por_proceso = [concurrencia // procesos + (1 if i < concurrencia % procesos else 0)
+                   for i in range(procesos)]
+    tareas = [(port, c, duracion, tamano, reutilizar, timeout) for c in por_proceso if c]
+    with multiprocessing.Pool(len(tareas)) as pool:
+        resultados = pool.map(_proceso_carga, tareas)
+
+    # El arranque de los procesos no cuenta: se usa lo que duró la carga
+    transcurrido = max(t for _, _, t in resultados)
+    latencias = sorted(l for lat, _, _ in resultados for l in lat)
+    errores = sum(e for _, e, _ in resultados)
+    return {
+        'peticiones': len(latencias),
+        'errores': errores,
+        'duracion_s': round(transcurrido, 3),
+        'rps': round(len(latencias) / transcurrido, 1) if transcurrido else 0.0,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 3),
+    }
+
+
+def clave(resultado: dict) -> tuple:
+    return (resultado['modo'], resultado['tamano'], resultado['reutilizar'])
+
+
+def comparar(resultados: list, previo_path: str):
+    """Muestra la variación de rps y p99 respecto a una ejecución anterior."""
+    with open(previo_path, 'r') as f:
+        previos = {clave(r): r for r in json.load(f)['resultados']}
+    print(f'\nComparación con {previo_path}:')
+    for r in resultados:
+        anterior = previos.get(clave(r))
+        if not anterior or not anterior['rps']:
+            continue
+        delta_rps = (r['rps'] - anterior['rps']) / anterior['rps'] * 100
+        print(f"  {r['modo']:<9} {r['tamano']:>6}B reuse={r['reutilizar']!s:<5} "
+              f"rps {delta_rps:+.1f}%  p99 {anterior['p99_ms']:.2f} -> {r['p99_ms']:.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark del servidor de saludos en localhost')
+    parser.add_argument('--modos', nargs='+', choices=MODOS, default=['asyncio', 'prefork'])
+    parser.add_argument('--concurrencia', type=int, default=100, help='Clientes simultáneos')
+    parser.add_argument('--duracion', type=float, default=5.0, help='Segundos por escenario')
+    parser.add_argument('--tamanos', nargs='+', type=int, default=[32], help='Bytes por mensaje (máx. 1024 sin reutilizar conexión)')
+    parser.add_argument('--reutilizar', choices=('si', 'no', 'ambos'), default='ambos',
+                        help='Conexión persistente enmarcada, una conexión por petición, o ambos')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Procesos del servidor en modo prefork')
+    parser.add_argument('--procesos', type=int, default=1, help='Procesos generadores de carga')
+    parser.add_argument('--timeout', type=float, default=5.0, help='Timeout por petición (s)')
+    parser.add_argument('--salida', help='Guardar los resultados en este JSON')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar')
+    args = parser.parse_args(argv)
+
+    reutilizar = {'si': [True], 'no': [False], 'ambos': [True, False]}[args.reutilizar]
+    procesos = max(1, min(args.procesos, args.concurrencia))
+    resultados = []
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        for modo in args.modos:
+            port = puerto_libre()
+            servidor = iniciar_servidor(modo, port, args.workers, log_dir)
+            try:
+                for tamano in args.tamanos:
+                    for reuse in reutilizar:
+                        metricas = medir(port, args.concurrencia, args.duracion, tamano,
+                                         reuse, procesos, args.timeout)
+                        resultado = {'modo': modo, 'tamano': tamano, 'reutilizar': reuse, **metricas}
+                        resultados.append(resultado)
+                        print(f"{modo:<9} {tamano:>6}B reuse={reuse!s:<5} "
+                              f"{resultado['rps']:>10.1f} rps  p50 {resultado['p50_ms']:.2f} ms  "
+                              f"p95 {resultado['p95_ms']:.2f} ms  p99 {resultado['p99_ms']:.2f} ms  "
+                              f"errores {resultado['errores']}")
+            finally:
+                detener_servidor(servidor)
+
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+                'parametros': vars(args),
+                'resultados': resultados,
+            }, f, indent=2)
+        print(f'Resultados guardados en {args.salida}')
+
+    if args.comparar:
+        comparar(resultados, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
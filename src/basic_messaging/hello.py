@@ -1,53 +1,313 @@
 import socket
 import logging
+import asyncio
+import json
 from datetime import datetime
 import os
+import signal
 import sys
+import time
 
-# Configuración del logging
-logging.basicConfig(filename='servidor.log', level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+from basic_messaging.protocol import (
+    MAGIC, TIPO_SALUDO, TIPO_LOTE, TIPO_RESPUESTA, TIPO_RESPUESTA_LOTE, TIPO_ERROR,
+    ErrorProtocolo, LectorTramas, codificar_trama, decodificar_lote
+)
+from vps_core.log import configurar_logging, detener_logging, preparar_workers
+
+# Configuración del logging (escritura en segundo plano, fuera del bucle de accept)
+configurar_logging(archivo=os.getenv('LOG_FILE', 'servidor.log'),
+                   formato='%(asctime)s - %(levelname)s - %(message)s')
 
 # Configuración del servidor
 HOST = '0.0.0.0'  # Escuchar en todas las interfaces
 PORT = 12345       # Puerto en el que el servidor escuchará
+MODO = os.getenv('HELLO_MODE', 'asyncio')  # 'asyncio', 'prefork' o 'blocking'
+IDLE_TIMEOUT = float(os.getenv('HELLO_IDLE_TIMEOUT', '10'))  # Segundos sin datos antes de cerrar
+BACKLOG = 4096     # Conexiones pendientes en la cola del kernel
+WORKERS = int(os.getenv('HELLO_WORKERS', '0')) or os.cpu_count() or 1  # Procesos en modo prefork
+GRACE_PERIOD = 10  # Segundos que se espera a los workers antes de matarlos
+LEGACY_BUFFER = 1024  # Tamaño de lectura del protocolo de texto plano
+READ_BUFFER = 64 * 1024  # Tamaño de lectura en conexiones enmarcadas
 
-# Función principal del servidor
-def run_server():
+def obtener_info_vps():
+    """Devuelve el hostname y la IP del VPS."""
+    hostname = socket.gethostname()
+    try:
+        ip_address = socket.gethostbyname(hostname)
+    except socket.gaierror:
+        ip_address = '127.0.0.1'
+    return hostname, ip_address
+
+def procesar_mensaje(data: str, hostname: str, ip_address: str) -> bytes:
+    """Genera la respuesta para un mensaje recibido."""
+    if data.startswith("hola soy "):
+        nombre = data[9:]  # Extraer el nombre
+        hora_actual = datetime.now().strftime("%H:%M:%S")
+        respuesta = (f"{nombre}, la hora es {hora_actual}. "
+                     f"Saludo desde mi VPS ({hostname}, {ip_address})")
+
+        # Guardar el nombre en el log
+        logging.info(f'Nombre recibido: {nombre}')
+        return respuesta.encode('utf-8')
+    return b'Mensaje no reconocido'
+
+def procesar_trama(tipo: int, payload: bytes, hostname: str, ip_address: str) -> bytes:
+    """Genera la trama de respuesta para una trama recibida."""
+    try:
+        if tipo == TIPO_SALUDO:
+            respuesta = procesar_mensaje(payload.decode('utf-8'), hostname, ip_address)
+            return codificar_trama(TIPO_RESPUESTA, respuesta)
+        if tipo == TIPO_LOTE:
+            respuestas = [procesar_mensaje(m, hostname, ip_address).decode('utf-8')
+                          for m in decodificar_lote(payload)]
+            return codificar_trama(TIPO_RESPUESTA_LOTE,
+                                   json.dumps(respuestas, ensure_ascii=False).encode('utf-8'))
+        raise ErrorProtocolo(f'Tipo de trama desconocido: {tipo}')
+    except (ErrorProtocolo, UnicodeDecodeError) as e:
+        return codificar_trama(TIPO_ERROR, str(e).encode('utf-8'))
+
+def es_prefijo_magic(data: bytes) -> bool:
+    """Indica si hacen falta más bytes para decidir el protocolo."""
+    return len(data) < len(MAGIC) and MAGIC.startswith(data)
+
+def subir_limite_descriptores():
+    """Sube el límite de descriptores abiertos al máximo permitido."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError) as e:
+        logging.warning(f'No se pudo subir el límite de descriptores: {e}')
+
+# Servidor bloqueante original (modo de respaldo)
+def run_blocking_server(host=HOST, port=PORT):
     # Crear un socket
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((host, port))
         s.listen()
-        logging.info(f'Servidor escuchando en {HOST}:{PORT}')
+        logging.info(f'Servidor escuchando en {host}:{port} (modo blocking)')
 
         # Obtener información del VPS
-        hostname = socket.gethostname()
-        ip_address = socket.gethostbyname(hostname)
+        hostname, ip_address = obtener_info_vps()
 
         while True:
             conn, addr = s.accept()
             with conn:
-                logging.info(f'Conexión desde {addr}')
-                data = conn.recv(1024).decode('utf-8')
-                if not data:
-                    break
-                
-                # Procesar el mensaje
-                if data.startswith("hola soy "):
-                    nombre = data[9:]  # Extraer el nombre
-                    hora_actual = datetime.now().strftime("%H:%M:%S")
-                    respuesta = (f"{nombre}, la hora es {hora_actual}. "
-                                 f"Saludo desde mi VPS ({hostname}, {ip_address})")
-                    conn.sendall(respuesta.encode('utf-8'))
-                    
-                    # Guardar el nombre en el log
-                    logging.info(f'Nombre recibido: {nombre}')
-                else:
-                    conn.sendall(b'Mensaje no reconocido')
+                try:
+                    conn.settimeout(IDLE_TIMEOUT)
+                    logging.info(f'Conexión desde {addr}')
+                    raw = conn.recv(LEGACY_BUFFER)
+                    while raw and es_prefijo_magic(raw):
+                        mas = conn.recv(LEGACY_BUFFER)
+                        if not mas:
+                            break
+                        raw += mas
+                    if not raw:
+                        continue  # Cliente vacío: seguir atendiendo a los demás
+
+                    if raw.startswith(MAGIC):
+                        atender_tramas_blocking(conn, raw[len(MAGIC):], hostname, ip_address)
+                        continue
+
+                    # Procesar el mensaje
+                    conn.sendall(procesar_mensaje(raw.decode('utf-8'), hostname, ip_address))
+                except (OSError, UnicodeDecodeError, ErrorProtocolo) as e:
+                    logging.warning(f'Error con el cliente {addr}: {e}')
+
+def atender_tramas_blocking(conn: socket.socket, datos: bytes, hostname: str, ip_address: str):
+    """Atiende una conexión enmarcada hasta que el cliente la cierre."""
+    lector = LectorTramas()
+    while datos:
+        respuestas = [procesar_trama(tipo, payload, hostname, ip_address)
+                      for tipo, payload in lector.alimentar(datos)]
+        if respuestas:
+            conn.sendall(b''.join(respuestas))
+        datos = conn.recv(READ_BUFFER)
+
+# Servidor asíncrono (modo por defecto)
+async def manejar_cliente(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                          hostname: str, ip_address: str):
+    """Atiende una conexión sin bloquear al resto de clientes."""
+    addr = writer.get_extra_info('peername')
+    logging.info(f'Conexión desde {addr}')
+    try:
+        raw = await asyncio.wait_for(reader.read(LEGACY_BUFFER), IDLE_TIMEOUT)
+        while raw and es_prefijo_magic(raw):
+            mas = await asyncio.wait_for(reader.read(LEGACY_BUFFER), IDLE_TIMEOUT)
+            if not mas:
+                break
+            raw += mas
+        if not raw:
+            return
+
+        if raw.startswith(MAGIC):
+            await atender_tramas(reader, writer, raw[len(MAGIC):], hostname, ip_address)
+            return
+
+        # Protocolo antiguo: un mensaje de texto plano por conexión
+        writer.write(procesar_mensaje(raw.decode('utf-8'), hostname, ip_address))
+        await asyncio.wait_for(writer.drain(), IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.info(f'Cliente {addr} inactivo, cerrando conexión')
+    except (OSError, UnicodeDecodeError, ErrorProtocolo) as e:
+        logging.warning(f'Error con el cliente {addr}: {e}')
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+async def atender_tramas(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         datos: bytes, hostname: str, ip_address: str):
+    """Atiende peticiones enmarcadas en orden sobre una conexión persistente."""
+    lector = LectorTramas()
+    while datos:
+        for tipo, payload in lector.alimentar(datos):
+            writer.write(procesar_trama(tipo, payload, hostname, ip_address))
+        await asyncio.wait_for(writer.drain(), IDLE_TIMEOUT)
+        datos = await asyncio.wait_for(reader.read(READ_BUFFER), IDLE_TIMEOUT)
+
+async def run_async_server(host=HOST, port=PORT, sock=None):
+    """Servidor asyncio capaz de mantener miles de conexiones concurrentes."""
+    hostname, ip_address = obtener_info_vps()
+
+    async def handler(reader, writer):
+        await manejar_cliente(reader, writer, hostname, ip_address)
+
+    if sock is not None:
+        server = await asyncio.start_server(handler, sock=sock, backlog=BACKLOG)
+    else:
+        server = await asyncio.start_server(handler, host, port, backlog=BACKLOG,
+                                            reuse_address=True)
+    logging.info(f'Servidor escuchando en {host}:{port} (modo asyncio, pid {os.getpid()})')
+
+    # Cierre ordenado con SIGTERM (solo posible desde el hilo principal)
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+    except (NotImplementedError, RuntimeError, ValueError):
+        pass
+
+    async with server:
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            logging.info(f'Servidor detenido (pid {os.getpid()})')
+
+# Pool de procesos con SO_REUSEPORT (modo prefork)
+def crear_socket_reuseport(host=HOST, port=PORT):
+    """Crea un socket de escucha que el kernel reparte entre varios procesos."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    s.bind((host, port))
+    s.listen(BACKLOG)
+    s.setblocking(False)
+    return s
+
+def iniciar_worker(host=HOST, port=PORT):
+    """Lanza un proceso worker con su propio socket y bucle asyncio."""
+    pid = os.fork()
+    if pid > 0:
+        return pid
+
+    # Proceso hijo: el supervisor se encarga de SIGINT
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    codigo = 0
+    try:
+        sock = crear_socket_reuseport(host, port)
+        asyncio.run(run_async_server(host, port, sock=sock))
+    except Exception:
+        logging.exception(f'Worker {os.getpid()} terminó con error')
+        codigo = 1
+    finally:
+        detener_logging()
+        os._exit(codigo)
+
+def run_prefork_server(host=HOST, port=PORT, workers=WORKERS):
+    """Supervisor: mantiene N workers vivos y los detiene con SIGTERM."""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError('SO_REUSEPORT no está disponible en este sistema')
+
+    parar = False
+
+    def terminar(signum, frame):
+        nonlocal parar
+        parar = True
+
+    signal.signal(signal.SIGTERM, terminar)
+    signal.signal(signal.SIGINT, terminar)
+
+    # Solo el supervisor escribe y rota el log; los workers le envían sus registros
+    preparar_workers()
+    activos = {}  # pid -> momento de arranque
+    for _ in range(workers):
+        activos[iniciar_worker(host, port)] = time.monotonic()
+    logging.info(f'Supervisor {os.getpid()} con {workers} workers en {host}:{port}')
+
+    while not parar:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+
+        inicio = activos.pop(pid, None)
+        if inicio is None or parar:
+            continue
+        logging.warning(f'Worker {pid} terminó (estado {status}), reiniciando')
+        # Evitar reinicios en bucle si el worker muere al arrancar
+        if time.monotonic() - inicio < 1:
+            time.sleep(1)
+        activos[iniciar_worker(host, port)] = time.monotonic()
+
+    # Apagado ordenado
+    logging.info(f'Deteniendo {len(activos)} workers')
+    for pid in activos:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    limite = time.monotonic() + GRACE_PERIOD
+    while activos and time.monotonic() < limite:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+        else:
+            activos.pop(pid, None)
+
+    for pid in activos:
+        logging.warning(f'Worker {pid} no terminó a tiempo, forzando cierre')
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+# Función principal del servidor
+def run_server(modo=MODO, host=HOST, port=PORT):
+    subir_limite_descriptores()
+    if modo == 'blocking':
+        run_blocking_server(host, port)
+    elif modo == 'asyncio':
+        asyncio.run(run_async_server(host, port))
+    elif modo == 'prefork':
+        run_prefork_server(host, port)
+    else:
+        raise ValueError(f'Modo de servidor desconocido: {modo}')
 
 if __name__ == "__main__":
     # Ejecutar el servidor en segundo plano
     if os.fork() > 0:
         sys.exit()  # Salir del proceso padre
 
-    run_server()
\ No newline at end of file
+    run_server()
@@ -1,12 +1,192 @@
+import json
+import queue
 import socket
+import threading
+import time
+from contextlib import contextmanager
 
-HOST = '104.131.172.104'  
-PORT = 12345  
+from basic_messaging.protocol import (
+    MAGIC, CABECERA, TIPO_SALUDO, TIPO_LOTE, TIPO_RESPUESTA, TIPO_RESPUESTA_LOTE, TIPO_ERROR,
+    ErrorProtocolo, codificar_lote, codificar_trama
+)
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.connect((HOST, PORT))
-    mensaje = 'hola soy ' #tu nombre aqui
-    s.sendall(mensaje.encode('utf-8'))
-    data = s.recv(1024)
+HOST = '104.131.172.104'
+PORT = 12345
+TIMEOUT = 10  # Segundos de espera por respuesta
+MAX_INACTIVA = 8  # Segundos; el servidor cierra las conexiones inactivas a los 10 (HELLO_IDLE_TIMEOUT)
 
-print('Respuesta del servidor:', data.decode('utf-8'))
+
+def enviar_mensaje(mensaje: str, host=HOST, port=PORT, timeout=TIMEOUT) -> str:
+    """Envía un mensaje con el protocolo antiguo (una conexión por mensaje)."""
+    with socket.create_connection((host, port), timeout=timeout) as s:
+        s.sendall(mensaje.encode('utf-8'))
+        s.shutdown(socket.SHUT_WR)
+        partes = []
+        while True:
+            data = s.recv(4096)
+            if not data:
+                break
+            partes.append(data)
+    return b''.join(partes).decode('utf-8')
+
+
+class Cliente:
+    """Conexión persistente que envía peticiones enmarcadas al servidor."""
+
+    def __init__(self, host=HOST, port=PORT, timeout=TIMEOUT):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.sendall(MAGIC)
+        self.ultimo_uso = time.monotonic()
+
+    def _recibir_exacto(self, n: int) -> bytes:
+        datos = bytearray()
+        while len(datos) < n:
+            parte = self.sock.recv(n - len(datos))
+            if not parte:
+                raise ConnectionError('El servidor cerró la conexión')
+            datos += parte
+        return bytes(datos)
+
+    def _recibir_trama(self):
+        longitud, tipo = CABECERA.unpack(self._recibir_exacto(CABECERA.size))
+        payload = self._recibir_exacto(longitud)
+        self.ultimo_uso = time.monotonic()
+        if tipo == TIPO_ERROR:
+            raise ErrorProtocolo(payload.decode('utf-8', 'replace'))
+        return tipo, payload
+
+    def saludar(self, nombre: str) -> str:
+        """Envía un saludo y devuelve la respuesta."""
+        return self.pipeline([nombre])[0]
+
+    def pipeline(self, nombres) -> list:
+        """Envía varios saludos seguidos y lee las respuestas en orden.
+
+        Si alguna respuesta es un error se leen igualmente las demás antes de
+        lanzarlo, para que la conexión siga sincronizada y se pueda reutilizar.
+        """
+        tramas = [codificar_trama(TIPO_SALUDO, f'hola soy {n}'.encode('utf-8')) for n in nombres]
+        self.sock.sendall(b''.join(tramas))
+        respuestas = []
+        error = None
+        for _ in tramas:
+            try:
+                tipo, payload = self._recibir_trama()
+            except ErrorProtocolo as e:
+                error = error or e
+                continue
+            if tipo != TIPO_RESPUESTA:
+                error = error or ErrorProtocolo(f'Respuesta inesperada: {tipo}')
+                continue
+            respuestas.append(payload.decode('utf-8'))
+        if error is not None:
+            raise error
+        return respuestas
+
+    def saludar_lote(self, nombres) -> list:
+        """Pide muchos saludos en una sola trama (un único viaje de ida y vuelta)."""
+        self.sock.sendall(codificar_trama(TIPO_LOTE, codificar_lote(f'hola soy {n}' for n in nombres)))
+        tipo, payload = self._recibir_trama()
+        if tipo != TIPO_RESPUESTA_LOTE:
+            raise ErrorProtocolo(f'Respuesta inesperada: {tipo}')
+        return json.loads(payload.decode('utf-8'))
+
+    def cerrar(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class PoolConexiones:
+    """Pool de conexiones persistentes, seguro para usar desde varios hilos."""
+
+    def __init__(self, host=HOST, port=PORT, tamano=4, timeout=TIMEOUT, max_inactiva=MAX_INACTIVA):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_inactiva = max_inactiva
+        self._libres = queue.LifoQueue()
+        self._limite = threading.BoundedSemaphore(tamano)
+
+    def _tomar(self):
+        """Conexión libre que el servidor aún no habrá cerrado, o una nueva: (cliente, reutilizada)."""
+        while True:
+            try:
+                cliente = self._libres.get_nowait()
+            except queue.Empty:
+                return Cliente(self.host, self.port, self.timeout), False
+            if time.monotonic() - cliente.ultimo_uso < self.max_inactiva:
+                return cliente, True
+            cliente.cerrar()
+
+    @contextmanager
+    def conexion(self):
+        """Presta una conexión; se descarta si la operación falla."""
+        self._limite.acquire()
+        try:
+            cliente, _ = self._tomar()
+            try:
+                yield cliente
+            except ErrorProtocolo:
+                self._libres.put(cliente)  # Respuestas ya leídas: la conexión sigue sincronizada
+                raise
+            except BaseException:
+                cliente.cerrar()
+                raise
+            self._libres.put(cliente)
+        finally:
+            self._limite.release()
+
+    def _ejecutar(self, operacion):
+        """Ejecuta operacion(cliente) con una conexión del pool.
+
+        Si una conexión reutilizada resulta estar cerrada (el servidor la cerró
+        por inactividad, se reinició...) se reintenta una vez con una nueva.
+        Los saludos no tienen efectos, así que repetirlos es seguro.
+        """
+        with self._limite:
+            cliente, reutilizada = self._tomar()
+            try:
+                try:
+                    resultado = operacion(cliente)
+                except ConnectionError:
+                    if not reutilizada:
+                        raise
+                    cliente.cerrar()
+                    cliente = Cliente(self.host, self.port, self.timeout)
+                    resultado = operacion(cliente)
+            except ErrorProtocolo:
+                self._libres.put(cliente)
+                raise
+            except BaseException:
+                cliente.cerrar()
+                raise
+            self._libres.put(cliente)
+            return resultado
+
+    def saludar(self, nombre: str) -> str:
+        return self._ejecutar(lambda cliente: cliente.saludar(nombre))
+
+    def saludar_lote(self, nombres) -> list:
+        nombres = list(nombres)  # Puede hacer falta enviarlos dos veces
+        return self._ejecutar(lambda cliente: cliente.saludar_lote(nombres))
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().cerrar()
+            except queue.Empty:
+                break
+
+
+if __name__ == "__main__":
+    mensaje = 'hola soy '  # tu nombre aqui
+    print('Respuesta del servidor:', enviar_mensaje(mensaje))
@@ -0,0 +1,78 @@
+import json
+import struct
+
+# Protocolo con tramas de longitud prefijada.
+#
+# Una conexión enmarcada empieza con MAGIC y después envía tramas:
+#   [longitud: uint32 big-endian][tipo: uint8][payload: longitud bytes]
+# El servidor responde cada trama en el mismo orden en que llegó, así que
+# el cliente puede enviar varias peticiones seguidas (pipelining) sin esperar.
+# Si la conexión no empieza con MAGIC se trata como el protocolo antiguo de
+# texto plano: un único "hola soy <nombre>" y cierre.
+
+MAGIC = b'HLF1'
+CABECERA = struct.Struct('!IB')
+MAX_PAYLOAD = 1024 * 1024  # 1MB por trama
+
+# Tipos de petición
+TIPO_SALUDO = 0x01  # payload: mensaje en UTF-8 ("hola soy <nombre>")
+TIPO_LOTE = 0x02    # payload: lista JSON de mensajes
+
+# Tipos de respuesta
+TIPO_RESPUESTA = 0x81       # payload: respuesta en UTF-8
+TIPO_RESPUESTA_LOTE = 0x82  # payload: lista JSON de respuestas
+TIPO_ERROR = 0xFF           # payload: descripción del error en UTF-8
+
+
+class ErrorProtocolo(Exception):
+    """Trama mal formada o demasiado grande."""
+
+
+def codificar_trama(tipo: int, payload: bytes) -> bytes:
+    """Serializa una trama con su cabecera."""
+    if len(payload) > MAX_PAYLOAD:
+        raise ErrorProtocolo(f'Payload de {len(payload)} bytes supera el máximo de {MAX_PAYLOAD}')
+    return CABECERA.pack(len(payload), tipo) + payload
+
+
+def codificar_lote(mensajes) -> bytes:
+    """Serializa una lista de mensajes para una trama de lote."""
+    return json.dumps(list(mensajes), ensure_ascii=False).encode('utf-8')
+
+
+def decodificar_lote(payload: bytes) -> list:
+    """Lee la lista de mensajes de una trama de lote."""
+    try:
+        mensajes = json.loads(payload.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ErrorProtocolo(f'Lote inválido: {e}')
+    if not isinstance(mensajes, list) or not all(isinstance(m, str) for m in mensajes):
+        raise ErrorProtocolo('El lote debe ser una lista de cadenas')
+    return mensajes
+
+
+class LectorTramas:
+    """Acumula bytes recibidos y devuelve las tramas completas en orden."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def alimentar(self, datos: bytes) -> list:
+        """Añade datos al buffer y devuelve una lista de (tipo, payload)."""
+        self._buffer += datos
+        tramas = []
+        while len(self._buffer) >= CABECERA.size:
+            longitud, tipo = CABECERA.unpack_from(self._buffer)
+            if longitud > MAX_PAYLOAD:
+                raise ErrorProtocolo(f'Trama de {longitud} bytes supera el máximo de {MAX_PAYLOAD}')
+            fin = CABECERA.size + longitud
+            if len(self._buffer) < fin:
+                break
+            tramas.append((tipo, bytes(self._buffer[CABECERA.size:fin])))
+            del self._buffer[:fin]
+        return tramas
+
+    @property
+    def pendiente(self) -> int:
+        """Bytes recibidos que aún no forman una trama completa."""
+        return len(self._buffer)
@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Caché persistente de archivos ya procesados.
+#
+# - archives: un archivo comprimido de Telegram (file_unique_id) y cuándo se usó.
+# - members:  los archivos que contenía, en el orden del archivo, con el hash de su contenido.
+# - blobs:    (hash de contenido, nombre) -> file_id con el que ya se subió a Telegram.
+# - archive_digests: hash del archivo comprimido -> unique_id con el que se guardó.
+#
+# Si llega otra vez el mismo archivo se reenvían los file_id sin descargar ni
+# descomprimir; si un miembro ya se subió desde otro archivo con el mismo nombre
+# se reutiliza su file_id (al reenviar un file_id Telegram conserva el nombre original).
+# Si llega el mismo contenido con otro unique_id (p. ej. subido de nuevo), se
+# reconoce por su hash al descargarlo y tampoco se descomprime.
+
+CACHE_DB = os.getenv('UNZIP_CACHE_DB', 'unzip_cache.sqlite3')
+CACHE_MAX_ENTRIES = int(os.getenv('UNZIP_CACHE_MAX_ENTRIES', '5000'))  # Archivos comprimidos
+CACHE_MAX_AGE = float(os.getenv('UNZIP_CACHE_MAX_AGE_DAYS', '90')) * 86400  # Sin usar
+
+# Telegram muestra el nombre con el que se subió un file_id: el mismo contenido
+# con otro nombre es otro blob.
+BLOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT,
+    file_name TEXT,
+    file_id TEXT,
+    size INTEGER,
+    last_used REAL,
+    PRIMARY KEY (digest, file_name)
+);
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    unique_id TEXT PRIMARY KEY,
+    file_name TEXT,
+    created REAL,
+    last_used REAL,
+    hits INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS members (
+    unique_id TEXT,
+    position INTEGER,
+    name TEXT,
+    digest TEXT,
+    size INTEGER,
+    PRIMARY KEY (unique_id, position)
+);
+CREATE INDEX IF NOT EXISTS members_digest ON members (digest);
+""" + BLOBS_SCHEMA + """
+CREATE TABLE IF NOT EXISTS archive_digests (
+    digest TEXT PRIMARY KEY,
+    unique_id TEXT
+);
+CREATE INDEX IF NOT EXISTS archive_digests_unique_id ON archive_digests (unique_id);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+
+class ArchiveCache:
+    """Índice SQLite de archivos y miembros ya subidos a Telegram."""
+
+    def __init__(self, path: str = CACHE_DB, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_age: float = CACHE_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # Nombre del miembro tal como se sube a Telegram (members guarda la ruta dentro del archivo)
+        self._db.create_function('basename', 1, os.path.basename, deterministic=True)
+        self._db.executescript(SCHEMA)
+        self._migrate_blobs()
+
+    def _migrate_blobs(self):
+        """Pasa blobs de cachés antiguas (clave solo por digest) a la clave (digest, nombre)."""
+        columnas = {r[1]: r[5] for r in self._db.execute('PRAGMA table_info(blobs)')}
+        if columnas.get('file_name'):
+            return  # file_name ya forma parte de la clave primaria
+        if 'file_name' not in columnas:
+            self._db.execute('ALTER TABLE blobs ADD COLUMN file_name TEXT')
+        # Los file_id guardados sin nombre no se pueden reutilizar con seguridad: se descartan
+        self._db.executescript(
+            'BEGIN;'
+            'ALTER TABLE blobs RENAME TO blobs_antigua;'
+            + BLOBS_SCHEMA +
+            'INSERT OR REPLACE INTO blobs (digest, file_name, file_id, size, last_used) '
+            'SELECT digest, file_name, file_id, size, last_used FROM blobs_antigua '
+            'WHERE file_name IS NOT NULL;'
+            'DROP TABLE blobs_antigua;'
+            'COMMIT;'
+        )
+
+    def _count(self, key: str, n: int = 1):
+        self._db.execute(
+            'INSERT INTO stats (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value', (key, n)
+        )
+
+    def lookup(self, unique_id: str):
+        """Devuelve [(nombre, file_id), ...] si el archivo está en caché, si no None."""
+        with self._lock, self._db:
+            rows = self._db.execute(
+                'SELECT m.name, m.digest, b.file_id FROM archives a '
+                'JOIN members m ON m.unique_id = a.unique_id '
+                'LEFT JOIN blobs b ON b.digest = m.digest AND b.file_name = basename(m.name) '
+                'WHERE a.unique_id = ? ORDER BY m.position', (unique_id,)
+            ).fetchall()
+            exists = rows or self._db.execute(
+                'SELECT 1 FROM archives WHERE unique_id = ?', (unique_id,)
+            ).fetchone()
+            if not exists or any(file_id is None for _, _, file_id in rows):
+                self._count('misses')
+                return None
+            now = time.time()
+            self._db.execute('UPDATE archives SET last_used = ?, hits = hits + 1 WHERE unique_id = ?',
+                             (now, unique_id))
+            self._db.executemany(
+                'UPDATE blobs SET last_used = ? WHERE digest = ? AND file_name = ?',
+                [(now, digest, os.path.basename(name)) for name, digest, _ in rows]
+            )
+            self._count('hits')
+            return [(name, file_id) for name, _, file_id in rows]
+
+    def unique_id_for(self, archive_digest: str):
+        """unique_id con el que se guardó un archivo de ese mismo contenido, o None."""
+        with self._lock:
+            row = self._db.execute('SELECT unique_id FROM archive_digests WHERE digest = ?',
+                                   (archive_digest,)).fetchone()
+        return row[0] if row else None
+
+    def blob_file_id(self, digest: str, file_name: str):
+        """file_id de un contenido ya subido con ese mismo nombre, o None.
+
+        Telegram ignora el nombre al reenviar un file_id: con otro nombre hay que subirlo.
+        """
+        with self._lock, self._db:
+            row = self._db.execute('SELECT file_id FROM blobs WHERE digest = ? AND file_name = ?',
+                                   (digest, file_name)).fetchone()
+            if row:
+                self._db.execute('UPDATE blobs SET last_used = ? WHERE digest = ? AND file_name = ?',
+                                 (time.time(), digest, file_name))
+                self._count('blob_hits')
+                return row[0]
+            return None
+
+    def store(self, unique_id: str, file_name: str, members, archive_digest: str = None):
+        """Guarda un archivo procesado. members: [(nombre, digest, tamaño, file_id), ...] en orden"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM members WHERE unique_id = ?', (unique_id,))
+            self._db.execute(
+                'INSERT OR REPLACE INTO archives (unique_id, file_name, created, last_used, hits) '
+                'VALUES (?, ?, ?, ?, 0)', (unique_id, file_name, now, now)
+            )
+            self._db.executemany(
+                'INSERT INTO members (unique_id, position, name, digest, size) VALUES (?, ?, ?, ?, ?)',
+                [(unique_id, i, name, digest, size) for i, (name, digest, size, _) in enumerate(members)]
+            )
+            self._store_blobs(members, now)
+            if archive_digest:
+                self._db.execute('INSERT OR REPLACE INTO archive_digests (digest, unique_id) VALUES (?, ?)',
+                                 (archive_digest, unique_id))
+        self.evict()
+
+    def store_blobs(self, members):
+        """Guarda solo los file_id de unos miembros subidos (p. ej. al reenviar los que fallaron)."""
+        with self._lock, self._db:
+            self._store_blobs(members, time.time())
+
+    def _store_blobs(self, members, now: float):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO blobs (digest, file_name, file_id, size, last_used) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(digest, os.path.basename(name), file_id, size, now) for name, digest, size, file_id in members]
+        )
+
+    def forget_file_ids(self, file_ids):
+        """Olvida unos file_id que Telegram ya no acepta (el resto del archivo sigue en caché)."""
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM blobs WHERE file_id = ?', [(f,) for f in file_ids])
+
+    def invalidate(self, unique_id: str):
+        """Olvida un archivo (p. ej. si Telegram ya no acepta sus file_id)."""
+        with self._lock, self._db:
+            self._db.execute(
+                'DELETE FROM blobs WHERE (digest, file_name) IN '
+                '(SELECT digest, basename(name) FROM members WHERE unique_id = ?)', (unique_id,)
+            )
+            self._db.execute('DELETE FROM members WHERE unique_id = ?', (unique_id,))
+            self._db.execute('DELETE FROM archives WHERE unique_id = ?', (unique_id,))
+            self._db.execute('DELETE FROM archive_digests WHERE unique_id = ?', (unique_id,))
+
+    def evict(self) -> int:
+        """Elimina entradas sin usar desde hace max_age y las menos usadas sobre max_entries."""
+        limite = time.time() - self.max_age
+        with self._lock, self._db:
+            viejos = {r[0] for r in self._db.execute(
+                'SELECT unique_id FROM archives WHERE last_used < ?', (limite,)
+            )}
+            viejos.update(r[0] for r in self._db.execute(
+                'SELECT unique_id FROM archives ORDER BY last_used DESC LIMIT -1 OFFSET ?',
+                (self.max_entries,)
+            ))
+            self._db.executemany('DELETE FROM members WHERE unique_id = ?', [(u,) for u in viejos])
+            self._db.executemany('DELETE FROM archives WHERE unique_id = ?', [(u,) for u in viejos])
+            self._db.executemany('DELETE FROM archive_digests WHERE unique_id = ?', [(u,) for u in viejos])
+            self._db.execute(
+                'DELETE FROM blobs WHERE last_used < ? AND NOT EXISTS '
+                '(SELECT 1 FROM members m WHERE m.digest = blobs.digest AND basename(m.name) = blobs.file_name)',
+                (limite,)
+            )
+            if viejos:
+                self._count('evictions', len(viejos))
+        return len(viejos)
+
+    def stats(self) -> dict:
+        with self._lock:
+            datos = dict(self._db.execute('SELECT key, value FROM stats'))
+            datos['archives'] = self._db.execute('SELECT COUNT(*) FROM archives').fetchone()[0]
+            datos['blobs'] = self._db.execute('SELECT COUNT(*) FROM blobs').fetchone()[0]
+        return datos
@@ -0,0 +1,441 @@
+import asyncio
+import importlib
+import inspect
+import multiprocessing
+import os
+import queue
+import threading
+
+from vps_core.hashing import HashingWriter, copy_hashed, hash_file
+
+# Descompresión fuera del event loop: cada trabajo corre en su propio proceso
+# (para poder matarlo por timeout o cancelación) y un semáforo limita cuántos
+# procesos hay a la vez.
+#
+# Las librerías de cada formato se importan la primera vez que se usan (en el
+# proceso hijo): py7zr y rarfile tardan en cargar y no hacen falta para arrancar.
+
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', '0')) or os.cpu_count() or 1
+EXTRACT_TIMEOUT = float(os.getenv('EXTRACT_TIMEOUT', '900'))  # 15 minutos por archivo
+STREAM_LOOKAHEAD = int(os.getenv('STREAM_LOOKAHEAD', '2'))  # Archivos descomprimidos por delante del envío
+
+
+CODECS = {'zip': 'zipfile', 'tar': 'tarfile', '7z': 'py7zr', 'rar': 'rarfile'}
+# Extensiones de comprimido, las compuestas primero
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tar.bz2', '.tgz', '.zip', '.tar', '.7z', '.rar', '.gz', '.bz2')
+
+
+class ExtractionError(Exception):
+    """Error al descomprimir un archivo."""
+
+
+class ExtractionTimeout(ExtractionError):
+    """La descompresión superó el tiempo máximo."""
+
+
+class ExtractionCancelled(ExtractionError):
+    """La descompresión fue cancelada por el usuario."""
+
+
+def detect_format(file_name: str):
+    """Devuelve el formato del archivo según su extensión, o None si no se soporta."""
+    name = file_name.lower()
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(('.tar.gz', '.tgz')):
+        return 'tar:gz'
+    if name.endswith('.tar.bz2'):
+        return 'tar:bz2'
+    if name.endswith('.tar'):
+        return 'tar'
+    if name.endswith('.7z'):
+        return '7z'
+    if name.endswith('.rar'):
+        return 'rar'
+    return None
+
+
+def archive_stem(file_name: str) -> str:
+    """Nombre del archivo sin la extensión de comprimido ('fotos.2024.tar.gz' -> 'fotos.2024')."""
+    name = file_name.lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return file_name[:-len(suffix)]
+    return os.path.splitext(file_name)[0]
+
+
+def _codec(fmt: str):
+    """Módulo que lee el formato, importado al usarlo por primera vez."""
+    return importlib.import_module(CODECS[fmt.split(':')[0]])
+
+
+def list_members(file_path: str, fmt: str) -> list:
+    """Lee solo el índice del archivo y devuelve [(nombre, tamaño), ...].
+
+    zip, 7z y rar tienen un índice propio; un tar hay que recorrerlo entero,
+    pero sin escribir nada en disco.
+    """
+    if fmt == 'zip':
+        with _codec('zip').ZipFile(file_path, 'r') as z:
+            return [(i.filename, i.file_size) for i in z.infolist() if not i.is_dir()]
+    if fmt.startswith('tar'):
+        modo = 'r|' + fmt[4:] if ':' in fmt else 'r|'
+        with _codec('tar').open(file_path, modo) as tar:
+            return [(m.name, m.size) for m in tar if m.isfile()]
+    if fmt == '7z':
+        with _codec('7z').SevenZipFile(file_path, mode='r') as z:
+            return [(f.filename, f.uncompressed) for f in z.list() if not f.is_directory]
+    if fmt == 'rar':
+        with _codec('rar').RarFile(file_path) as rf:
+            return [(i.filename, i.file_size) for i in rf.infolist() if not i.isdir()]
+    raise ExtractionError(f'Formato de archivo no soportado: {fmt}')
+
+
+def extract_archive(file_path: str, extract_dir: str, fmt: str, members=None) -> dict:
+    """Descomprime el archivo en extract_dir (código síncrono).
+
+    Si se indica members solo se descomprimen esos nombres. Devuelve
+    {ruta: hash} de los archivos extraídos, en el orden del archivo.
+    """
+    if fmt != 'rar':
+        return dict(iter_extract(file_path, extract_dir, fmt, members=members))
+    # En un rar sólido extraer miembro a miembro obliga a descomprimir desde el
+    # principio cada vez: mejor todo de una y el hash después, recién escrito
+    with _codec('rar').RarFile(file_path) as rf:
+        rf.extractall(extract_dir, members=members)
+        orden = [_member_path(extract_dir, i.filename) for i in rf.infolist() if not i.isdir()]
+    rutas = [p for p in orden if p and os.path.isfile(p)]
+    vistas = set(rutas)
+    rutas += [os.path.join(root, name) for root, _, names in os.walk(extract_dir)
+              for name in sorted(names) if os.path.join(root, name) not in vistas]
+    return {path: hash_file(path) for path in rutas}
+
+
+def iter_extract(file_path: str, extract_dir: str, fmt: str, before_member=None, members=None):
+    """Descomprime miembro a miembro y devuelve (ruta, hash) de cada archivo extraído.
+
+    before_member se llama antes de descomprimir cada miembro; sirve para
+    frenar la extracción mientras el consumidor no haya procesado los anteriores.
+    Si se indica members solo se descomprimen esos nombres.
+
+    El contenido pasa por el hash mientras se escribe en disco.
+    """
+    before_member = before_member or (lambda: None)
+    wanted = set(members) if members is not None else None
+    skip = lambda name: wanted is not None and name not in wanted
+    if fmt == 'zip':
+        with _codec('zip').ZipFile(file_path, 'r') as z:
+            for info in z.infolist():
+                target = _member_path(extract_dir, info.filename)
+                if info.is_dir() or skip(info.filename) or target is None:
+                    continue
+                before_member()
+                with z.open(info) as src:
+                    yield target, _write_member(src, target)
+    elif fmt.startswith('tar'):
+        # Modo flujo ('r|'): se lee el tar una sola vez, de principio a fin
+        modo = 'r|' + fmt[4:] if ':' in fmt else 'r|'
+        with _codec('tar').open(file_path, modo) as tar:
+            for member in tar:
+                target = _member_path(extract_dir, member.name)
+                if not member.isfile() or skip(member.name) or target is None:
+                    continue
+                before_member()
+                with tar.extractfile(member) as src:
+                    yield target, _write_member(src, target)
+    elif fmt == '7z':
+        yield from _iter_extract_7z(file_path, extract_dir, before_member, members)
+    elif fmt == 'rar':
+        with _codec('rar').RarFile(file_path) as rf:
+            for info in rf.infolist():
+                target = _member_path(extract_dir, info.filename)
+                if info.isdir() or skip(info.filename) or target is None:
+                    continue
+                before_member()
+                with rf.open(info) as src:
+                    yield target, _write_member(src, target)
+    else:
+        raise ExtractionError(f'Formato de archivo no soportado: {fmt}')
+
+
+def _iter_extract_7z(file_path: str, extract_dir: str, before_member, members):
+    """Descomprime un 7z en una sola pasada entregando cada archivo al terminarlo.
+
+    En un 7z sólido extraer miembro a miembro obliga a descomprimir desde el
+    principio cada vez (O(n²)). Aquí py7zr descomprime todo de una vez en un
+    hilo y escribe cada miembro a través de _MemberWriters; los archivos
+    terminados llegan por una cola.
+    """
+    with _codec('7z').SevenZipFile(file_path, mode='r') as z:
+        if 'factory' not in inspect.signature(z.extract).parameters:
+            # py7zr < 1.0 no admite escritores propios: todo de una y se entrega al final
+            before_member()
+            if members is None:
+                z.extractall(extract_dir)
+            else:
+                z.extract(path=extract_dir, targets=list(members))
+            for f in z.list():
+                path = _member_path(extract_dir, f.filename)
+                if not f.is_directory and path and os.path.isfile(path):
+                    yield path, hash_file(path)
+            return
+
+        listos = queue.Queue()
+        writers = _MemberWriters(extract_dir, before_member, lambda path, digest: listos.put((path, digest)))
+
+        def extraer():
+            try:
+                z.extract(path=extract_dir, targets=list(members) if members is not None else None,
+                          factory=writers)
+                writers.close_all()
+                listos.put(None)
+            except BaseException as e:
+                listos.put(e)
+
+        hilo = threading.Thread(target=extraer, daemon=True)
+        hilo.start()
+        while True:
+            item = listos.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        hilo.join()
+
+
+class _MemberWriters:
+    """Fábrica de escritores para py7zr: un _MemberWriter por miembro del 7z."""
+
+    def __init__(self, extract_dir: str, before_member, on_done):
+        self.extract_dir = extract_dir
+        self.before_member = before_member
+        self.on_done = on_done
+        self._writers = []
+
+    def create(self, filename: str):
+        # py7zr pide el escritor justo antes de descomprimir el miembro
+        self.before_member()
+        relativa = os.path.relpath(filename, os.path.abspath(self.extract_dir))
+        writer = _MemberWriter(_member_path(self.extract_dir, relativa), self.on_done)
+        self._writers.append(writer)
+        return writer
+
+    def close_all(self):
+        for writer in self._writers:
+            writer.close()
+
+
+class _MemberWriter:
+    """Escribe un miembro en disco calculando su hash y avisa al terminarlo."""
+
+    def __init__(self, path: str, on_done):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.on_done = on_done
+        self._file = open(path, 'wb')
+        self._writer = HashingWriter(self._file)
+
+    def write(self, data) -> int:
+        return self._writer.write(data)
+
+    def read(self, size=None) -> bytes:
+        return b''
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # py7zr rebobina el escritor al cerrar el miembro (las versiones nuevas
+        # llaman además a close); es la señal de que el archivo está completo
+        if offset == 0 and whence == 0:
+            self.close()
+        return 0
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def size(self) -> int:
+        return self._writer.size
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        self.on_done(self.path, self._writer.hexdigest())
+
+
+def _member_path(extract_dir: str, name: str):
+    """Ruta de destino de un miembro, sin salir de extract_dir (None si no tiene nombre)."""
+    partes = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.', '..')]
+    return os.path.join(extract_dir, *partes) if partes else None
+
+
+def _write_member(src, target: str) -> str:
+    """Escribe un miembro en disco y devuelve su hash, calculado al escribirlo."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as dst:
+        return copy_hashed(src, dst)
+
+
+def _run_job(conn, func, *args):
+    """Punto de entrada del proceso hijo (extracción completa o listado)."""
+    try:
+        conn.send(('done', func(*args)))
+    except BaseException as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+def _stream_job(conn, credits, file_path, extract_dir, fmt, members):
+    """Punto de entrada del proceso hijo (extracción miembro a miembro)."""
+    try:
+        for path, digest in iter_extract(file_path, extract_dir, fmt, credits.acquire, members):
+            conn.send(('file', (path, digest)))
+        conn.send(('done', None))
+    except BaseException as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+def _mp_context():
+    # forkserver evita heredar hilos y el event loop del proceso del bot
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class ExtractorPool:
+    """Pool acotado de procesos de descompresión con timeout y cancelación."""
+
+    def __init__(self, max_workers: int = EXTRACT_WORKERS, timeout: float = EXTRACT_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._semaphore = None
+        self._owners = {}     # job_id -> usuario (en espera o en curso)
+        self._processes = {}  # job_id -> proceso en curso
+        self._cancelled = set()
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def extract(self, job_id, owner, file_path: str, extract_dir: str, fmt: str,
+                      members=None, timeout: float = None) -> dict:
+        """Descomprime en un proceso aparte sin bloquear el event loop: {ruta: hash}"""
+        return await self._call(job_id, owner, timeout, extract_archive, file_path, extract_dir, fmt, members)
+
+    async def list(self, job_id, owner, file_path: str, fmt: str, timeout: float = None) -> list:
+        """Lee el índice del archivo en un proceso aparte: [(nombre, tamaño), ...]"""
+        return await self._call(job_id, owner, timeout, list_members, file_path, fmt)
+
+    async def _call(self, job_id, owner, timeout, func, *args):
+        timeout = self.timeout if timeout is None else timeout
+        self._owners[job_id] = owner
+        try:
+            async with self._get_semaphore():
+                conn, proceso = self._start(job_id, _run_job, func, *args)
+                try:
+                    kind, value = await self._receive(job_id, conn, proceso, timeout)
+                    if kind == 'error':
+                        raise ExtractionError(value)
+                    return value
+                finally:
+                    self._stop(job_id, conn, proceso)
+        finally:
+            self._owners.pop(job_id, None)
+            self._cancelled.discard(job_id)
+
+    async def stream(self, job_id, owner, file_path: str, extract_dir: str, fmt: str,
+                     members=None, lookahead: int = STREAM_LOOKAHEAD, timeout: float = None):
+        """Generador asíncrono que entrega (ruta, hash) de cada archivo en cuanto se descomprime.
+
+        El proceso hijo no descomprime más de `lookahead` archivos por delante
+        del consumidor: el siguiente se libera cuando se pide el próximo
+        elemento, así que el consumidor debe borrar el archivo antes de pedirlo.
+        El timeout se aplica a la espera de cada archivo, no al envío.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        self._owners[job_id] = owner
+        try:
+            async with self._get_semaphore():
+                credits = _mp_context().Semaphore(lookahead)
+                conn, proceso = self._start(job_id, _stream_job, credits, file_path, extract_dir,
+                                            fmt, members)
+                try:
+                    while True:
+                        kind, value = await self._receive(job_id, conn, proceso, timeout)
+                        if kind == 'done':
+                            break
+                        if kind == 'error':
+                            raise ExtractionError(value)
+                        yield value
+                        credits.release()
+                finally:
+                    self._stop(job_id, conn, proceso)
+        finally:
+            self._owners.pop(job_id, None)
+            self._cancelled.discard(job_id)
+
+    def _start(self, job_id, target, *args):
+        if job_id in self._cancelled:
+            raise ExtractionCancelled('Trabajo cancelado')
+        ctx = _mp_context()
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proceso = ctx.Process(target=target, args=(child_conn, *args), daemon=True)
+        proceso.start()
+        child_conn.close()
+        self._processes[job_id] = proceso
+        return parent_conn, proceso
+
+    def _stop(self, job_id, conn, proceso):
+        self._processes.pop(job_id, None)
+        if proceso.is_alive():
+            proceso.kill()
+        proceso.join()
+        conn.close()
+
+    async def _receive(self, job_id, conn, proceso, timeout):
+        """Espera el siguiente mensaje del hijo sin bloquear el event loop."""
+        if not conn.poll():
+            loop = asyncio.get_running_loop()
+            listo = loop.create_future()
+            aviso = lambda: listo.done() or listo.set_result(None)
+            loop.add_reader(conn.fileno(), aviso)
+            loop.add_reader(proceso.sentinel, aviso)
+            try:
+                await asyncio.wait_for(listo, timeout)
+            except asyncio.TimeoutError:
+                raise ExtractionTimeout(f'La descompresión superó {timeout:.0f} s')
+            finally:
+                loop.remove_reader(conn.fileno())
+                loop.remove_reader(proceso.sentinel)
+
+        if job_id in self._cancelled:
+            raise ExtractionCancelled('Trabajo cancelado')
+        try:
+            return conn.recv()
+        except EOFError:
+            proceso.join()
+            raise ExtractionError(f'El proceso terminó inesperadamente (código {proceso.exitcode})')
+
+    def cancel(self, job_id) -> bool:
+        """Cancela un trabajo en curso o en espera."""
+        if job_id not in self._owners:
+            return False
+        self._cancelled.add(job_id)
+        proceso = self._processes.get(job_id)
+        if proceso is not None and proceso.is_alive():
+            proceso.kill()
+        return True
+
+    def cancel_owner(self, owner) -> int:
+        """Cancela todos los trabajos de un usuario."""
+        ids = [job_id for job_id, o in self._owners.items() if o == owner]
+        for job_id in ids:
+            self.cancel(job_id)
+        return len(ids)
+
+    def active_jobs(self, owner=None) -> list:
+        return [job_id for job_id, o in self._owners.items() if owner is None or o == owner]
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+# Planificador de trabajos de descompresión.
+#
+# - Cada usuario tiene su propia cola FIFO y los turnos se reparten por
+#   round-robin entre usuarios, así que nadie acapara el bot con diez archivos.
+# - Hay un máximo global de trabajos simultáneos.
+# - Antes de descargar o descomprimir, el trabajo reserva el espacio que va a
+#   necesitar; si el disco no da para ello se rechaza (o espera a que otros
+#   trabajos liberen su reserva).
+# - Cada trabajo tiene su propio directorio de trabajo.
+
+WORK_DIR = os.getenv('UNZIP_WORK_DIR', 'unzip_jobs')
+MAX_JOBS = int(os.getenv('UNZIP_MAX_JOBS', '4'))  # Trabajos simultáneos en total
+MAX_JOBS_PER_USER = int(os.getenv('UNZIP_MAX_JOBS_PER_USER', '1'))
+DISK_RESERVE = int(os.getenv('UNZIP_DISK_RESERVE_MB', '1024')) * 1024 * 1024  # Nunca usar este margen
+MAX_EXTRACTED_SIZE = int(os.getenv('UNZIP_MAX_EXTRACTED_MB', str(20 * 1024))) * 1024 * 1024
+MAX_RATIO = float(os.getenv('UNZIP_MAX_RATIO', '200'))  # Tamaño descomprimido / comprimido
+ADMISSION_TIMEOUT = float(os.getenv('UNZIP_ADMISSION_TIMEOUT', '600'))  # Espera máxima por disco
+
+
+class JobRejected(Exception):
+    """El trabajo no se puede admitir (disco insuficiente, posible zip bomb...)."""
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras esperaba en la cola."""
+
+
+class Job:
+    """Un trabajo en curso: su directorio y el espacio que tiene reservado."""
+
+    def __init__(self, scheduler, user_id, workspace: str):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.workspace = workspace
+        self.reserved = 0
+        self.keep_workspace = False  # True para conservar el directorio al terminar
+
+    async def reserve(self, nbytes: int):
+        """Reserva nbytes de disco para este trabajo (espera si otros lo tienen ocupado)."""
+        await self.scheduler.reserve(self, nbytes)
+
+    def check_archive(self, archive_size: int, listing):
+        """Rechaza archivos cuyo contenido declarado es sospechosamente grande."""
+        declared = sum(size for _, size in listing)
+        if declared > MAX_EXTRACTED_SIZE:
+            raise JobRejected(f'El contenido ocupa {declared/1024/1024:.0f} MB, '
+                              f'más que el máximo permitido ({MAX_EXTRACTED_SIZE/1024/1024:.0f} MB)')
+        if archive_size and declared / archive_size > MAX_RATIO:
+            raise JobRejected(f'Ratio de compresión sospechoso ({declared / archive_size:.0f}:1)')
+        return declared
+
+
+class JobScheduler:
+    """Colas justas por usuario, límite global de concurrencia y control de disco."""
+
+    def __init__(self, root: str = WORK_DIR, max_jobs: int = MAX_JOBS,
+                 max_per_user: int = MAX_JOBS_PER_USER, disk_reserve: int = DISK_RESERVE,
+                 admission_timeout: float = ADMISSION_TIMEOUT):
+        self.root = root
+        self.max_jobs = max_jobs
+        self.max_per_user = max_per_user
+        self.disk_reserve = disk_reserve
+        self.admission_timeout = admission_timeout
+        self._queues = OrderedDict()  # user_id -> deque de futures (orden de round-robin)
+        self._running = 0
+        self._running_per_user = {}
+        self._reserved = 0
+        self._disk_changed = None
+        self._workspaces = set()  # Directorios de los trabajos en curso
+        os.makedirs(root, exist_ok=True)
+
+    # --- Turnos ---------------------------------------------------------------
+
+    def will_wait(self, user_id) -> bool:
+        """Indica si un trabajo nuevo de este usuario tendría que esperar turno."""
+        return (self._running >= self.max_jobs
+                or self._running_per_user.get(user_id, 0) >= self.max_per_user
+                or bool(self._queues.get(user_id)))
+
+    def queued(self, user_id=None) -> int:
+        if user_id is not None:
+            return len(self._queues.get(user_id, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    def _dispatch(self):
+        """Da turno a los siguientes trabajos, un usuario cada vez."""
+        progreso = True
+        while self._running < self.max_jobs and progreso:
+            progreso = False
+            for user_id in list(self._queues):
+                if self._running >= self.max_jobs:
+                    break
+                if self._running_per_user.get(user_id, 0) >= self.max_per_user:
+                    continue
+                cola = self._queues.pop(user_id)
+                fut = cola.popleft()
+                if cola:
+                    self._queues[user_id] = cola  # Vuelve al final del round-robin
+                if fut.done():
+                    # Cancelado mientras esperaba: su tarea aún no lo ha quitado de la cola
+                    progreso = True
+                    continue
+                self._running += 1
+                self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+                fut.set_result(None)
+                progreso = True
+
+    def _finish(self, user_id):
+        self._running -= 1
+        self._running_per_user[user_id] -= 1
+        if not self._running_per_user[user_id]:
+            del self._running_per_user[user_id]
+        if user_id in self._queues:
+            self._queues.move_to_end(user_id)  # Acaba de tener turno: pasa al final
+        self._dispatch()
+
+    async def _acquire(self, user_id):
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(fut)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._finish(user_id)  # Ya tenía turno: devolverlo
+            else:
+                self._remove_waiter(user_id, fut)
+            raise
+
+    def _remove_waiter(self, user_id, fut):
+        cola = self._queues.get(user_id)
+        if cola and fut in cola:
+            cola.remove(fut)
+            if not cola:
+                del self._queues[user_id]
+
+    def workspaces(self) -> set:
+        """Directorios de los trabajos en curso (la limpieza automática no los toca)."""
+        return set(self._workspaces)
+
+    def cancel_owner(self, user_id) -> int:
+        """Cancela los trabajos en cola (no los que ya están en curso) de un usuario."""
+        cola = [fut for fut in self._queues.pop(user_id, deque()) if not fut.done()]
+        for fut in cola:
+            fut.set_exception(JobCancelled('Trabajo cancelado'))
+        return len(cola)
+
+    @asynccontextmanager
+    async def job(self, user_id, workspace: str = None):
+        """Espera turno y entrega un Job con su propio directorio de trabajo."""
+        await self._acquire(user_id)
+        job = None
+        try:
+            if workspace is None:
+                workspace = tempfile.mkdtemp(prefix=f'job_{user_id}_', dir=self.root)
+            job = Job(self, user_id, workspace)
+            self._workspaces.add(workspace)
+            yield job
+        finally:
+            if job is not None:
+                self._release(job)
+                self._workspaces.discard(job.workspace)
+                if not job.keep_workspace:
+                    # Borrar un árbol grande tarda: en un hilo para no frenar a los demás
+                    await asyncio.to_thread(shutil.rmtree, job.workspace, ignore_errors=True)
+            self._finish(user_id)
+
+    # --- Disco ----------------------------------------------------------------
+
+    def free_space(self) -> int:
+        """Espacio libre que aún no está reservado por ningún trabajo."""
+        return shutil.disk_usage(self.root).free - self._reserved - self.disk_reserve
+
+    async def reserve(self, job: Job, nbytes: int):
+        if self._disk_changed is None:
+            self._disk_changed = asyncio.Condition()
+        # Aunque todos los demás terminaran no habría sitio: rechazar ya
+        if nbytes > self.free_space() + self._reserved:
+            raise JobRejected(f'No hay espacio en disco para {nbytes/1024/1024:.0f} MB')
+
+        limite = time.monotonic() + self.admission_timeout
+        async with self._disk_changed:
+            while self.free_space() < nbytes:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise JobRejected('Tiempo de espera agotado esperando espacio en disco')
+                try:
+                    await asyncio.wait_for(self._disk_changed.wait(), restante)
+                except asyncio.TimeoutError:
+                    pass
+            self._reserved += nbytes
+            job.reserved += nbytes
+
+    def _release(self, job: Job):
+        if not job.reserved:
+            return
+        self._reserved -= job.reserved
+        job.reserved = 0
+        if self._disk_changed is not None:
+            asyncio.ensure_future(self._notify())
+
+    async def _notify(self):
+        async with self._disk_changed:
+            self._disk_changed.notify_all()
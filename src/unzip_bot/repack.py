@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+# Reempaquetado de archivos con muchos archivos pequeños.
+#
+# En lugar de una llamada a la API por archivo:
+# - las fotos y vídeos pequeños se agrupan en álbumes (media groups) de 10,
+# - el resto de archivos pequeños se meten en zips de hasta REPACK_BUNDLE_SIZE,
+# - los archivos grandes se siguen enviando sueltos.
+
+REPACK_BUNDLE_SIZE = int(os.getenv('REPACK_BUNDLE_MB', '45')) * 1024 * 1024
+REPACK_SMALL_FILE = int(os.getenv('REPACK_SMALL_FILE_MB', '5')) * 1024 * 1024
+REPACK_AUTO_FILES = int(os.getenv('REPACK_AUTO_FILES', '100'))  # Reempaquetar siempre a partir de aquí
+MEDIA_GROUP_SIZE = 10  # Máximo de Telegram por álbum
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+VIDEO_EXTENSIONS = ('.mp4',)
+PHOTO_MAX_SIZE = 10 * 1024 * 1024  # Límite de Telegram para fotos
+VIDEO_MAX_SIZE = 20 * 1024 * 1024
+
+
+def media_kind(path: str, size: int):
+    """'photo', 'video' o None si el archivo no puede ir en un álbum."""
+    name = path.lower()
+    if name.endswith(PHOTO_EXTENSIONS) and size <= PHOTO_MAX_SIZE:
+        return 'photo'
+    if name.endswith(VIDEO_EXTENSIONS) and size <= VIDEO_MAX_SIZE:
+        return 'video'
+    return None
+
+
+class Repacker:
+    """Agrupa los archivos extraídos en álbumes y zips antes de enviarlos.
+
+    Los envíos se hacen con callbacks del bot:
+    - send_file(path) para archivos sueltos,
+    - send_bundle(path, nombres) para cada zip,
+    - send_media_group([(tipo, path), ...]) para cada álbum.
+    Cada callback devuelve True si el envío fue bien. El Repacker borra los
+    archivos en cuanto dejan de hacer falta.
+    """
+
+    def __init__(self, bundle_dir: str, base_name: str, send_file, send_bundle, send_media_group,
+                 bundle_size: int = REPACK_BUNDLE_SIZE, small_file: int = REPACK_SMALL_FILE):
+        self.bundle_dir = bundle_dir
+        self.base_name = base_name
+        self.send_file = send_file
+        self.send_bundle = send_bundle
+        self.send_media_group = send_media_group
+        self.bundle_size = bundle_size
+        self.small_file = small_file
+        self._media = []
+        self._bundle = None
+        self._bundle_path = None
+        self._bundle_bytes = 0
+        self._bundle_names = []
+        self._bundle_count = 0
+        os.makedirs(bundle_dir, exist_ok=True)
+
+    async def add(self, path: str, arcname: str):
+        """Procesa un archivo extraído (arcname es su ruta dentro del archivo original)."""
+        size = os.path.getsize(path)
+        kind = media_kind(path, size)
+        if kind:
+            self._media.append((kind, path))
+            if len(self._media) >= MEDIA_GROUP_SIZE:
+                await self._flush_media()
+        elif size <= self.small_file:
+            if self._bundle_bytes and self._bundle_bytes + size > self.bundle_size:
+                await self._flush_bundle()
+            await asyncio.to_thread(self._write_to_bundle, path, arcname)
+            self._bundle_bytes += size
+            self._bundle_names.append(arcname)
+            _remove(path)
+        else:
+            await self.send_file(path)
+            _remove(path)
+
+    async def flush(self):
+        """Envía lo que quede pendiente."""
+        await self._flush_media()
+        await self._flush_bundle()
+
+    def _write_to_bundle(self, path: str, arcname: str):
+        if self._bundle is None:
+            self._bundle_count += 1
+            self._bundle_path = os.path.join(self.bundle_dir,
+                                             f'{self.base_name}_parte{self._bundle_count}.zip')
+            import zipfile  # Solo se carga si hay algo que agrupar
+
+            # Sin compresión: el objetivo es reducir llamadas a la API, no bytes
+            self._bundle = zipfile.ZipFile(self._bundle_path, 'w', zipfile.ZIP_STORED)
+        self._bundle.write(path, arcname)
+
+    async def _flush_bundle(self):
+        if self._bundle is None:
+            return
+        self._bundle.close()
+        path, names = self._bundle_path, self._bundle_names
+        self._bundle, self._bundle_path, self._bundle_bytes, self._bundle_names = None, None, 0, []
+        await self.send_bundle(path, names)
+        _remove(path)
+
+    async def _flush_media(self):
+        if not self._media:
+            return
+        media, self._media = self._media, []
+        if len(media) == 1 or not await self.send_media_group(media):
+            # Un álbum necesita al menos 2 elementos; si falla se envían sueltos
+            for _, path in media:
+                if os.path.exists(path):
+                    await self.send_file(path)
+        for _, path in media:
+            _remove(path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
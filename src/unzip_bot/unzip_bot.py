@@ -1,36 +1,74 @@
 import os
+import asyncio
+import fnmatch
 import logging
-import rarfile 
-import zipfile
-import tarfile
-import py7zr
-from dotenv import load_dotenv
-from telegram import Update
+import secrets
+import time
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo, Update
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
     ContextTypes,
     filters
 )
+from vps_core.auth import AllowList
+from vps_core.config import env_flag, load_env
+from vps_core.hashing import HashingWriter, copy_hashed, hash_file
+from vps_core.janitor import TempJanitor
+from vps_core.log import configurar_logging
+from vps_core.runner import configure_builder, run_application, upload_limit
+from vps_core.tempdir import remove_tree
+from vps_core.uploader import UploadProgress, UploadScheduler
+from unzip_bot.cache import ArchiveCache
+from unzip_bot.extractor import (
+    ExtractorPool, ExtractionCancelled, ExtractionTimeout, STREAM_LOOKAHEAD, archive_stem, detect_format
+)
+from unzip_bot.jobs import Job, JobCancelled, JobRejected, JobScheduler
+from unzip_bot.repack import MEDIA_GROUP_SIZE, REPACK_AUTO_FILES, REPACK_BUNDLE_SIZE, Repacker
 
 # Configuración básica
-load_dotenv()
+load_env()
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-ALLOWED_USERS = set()  # Usamos un set para evitar duplicados
+# Vacía (por defecto) = cualquiera puede usar el bot hasta que se use /adduser
+ALLOWED_USERS = AllowList(open_if_empty=True)
+# Enviar cada archivo en cuanto se descomprime en lugar de extraer todo primero
+STREAM_EXTRACT = env_flag('', 'STREAM_EXTRACT', True)
+SELECT_PAGE_SIZE = 8  # Archivos por página en el modo /select
+SELECT_TTL = 3600  # Segundos que se guarda un archivo esperando selección
+SELECT_SWEEP_INTERVAL = 300  # Cada cuánto se descartan las selecciones caducadas
+# 50 MB con api.telegram.org, 2000 MB con un servidor local de la Bot API (TELEGRAM_LOCAL_MODE)
+UPLOAD_LIMIT = upload_limit('UNZIP')
 
-# Configurar logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Configurar logging (cola + hilo en segundo plano, no bloquea el event loop)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
+# Colas por usuario, límite de trabajos simultáneos y control de disco
+job_scheduler = JobScheduler()
+# Pool de procesos para descomprimir sin bloquear el event loop
+extractor_pool = ExtractorPool()
+# Subidas concurrentes con control de flood de Telegram
+upload_scheduler = UploadScheduler()
+# Archivos ya subidos (file_unique_id y hash de contenido -> file_id)
+archive_cache = ArchiveCache()
+# Archivos descargados esperando a que el usuario elija qué descomprimir
+pending_selections = {}
+# Limpieza periódica de directorios de trabajo huérfanos (p. ej. tras un reinicio)
+janitor = TempJanitor(
+    [job_scheduler.root],
+    pinned=lambda: job_scheduler.workspaces() | {s['workspace'] for s in pending_selections.values()}
+)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mensaje de bienvenida cuando se usa /start"""
     user = update.effective_user
     await update.message.reply_text(
-        f'Hola {user.first_name}! Envíame un archivo comprimido (.zip, .rar, etc.) y lo descomprimiré para ti.'
+        f'Hola {user.first_name}! Envíame un archivo comprimido (.zip, .rar, etc.) y lo descomprimiré para ti.\n\n'
+        'Escribe /select en el pie del archivo para elegir qué archivos extraer, '
+        'o /filter <patrón> (p. ej. /filter *.pdf) para extraer solo los que coincidan.\n'
+        'Con /repack los archivos pequeños se envían agrupados en zips y álbumes.'
     )
 
 async def add_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -49,12 +87,10 @@ async def add_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def handle_compressed_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Maneja los archivos comprimidos recibidos"""
     # Verificar si el usuario está permitido
-    if ALLOWED_USERS and update.effective_user.id not in ALLOWED_USERS:
+    if not ALLOWED_USERS.allows(update.effective_user.id):
         await update.message.reply_text("⚠️ Lo siento, no tienes permiso para usar este bot.")
         return
     
-    # Obtener el archivo
-    file = await update.message.document.get_file()
     file_name = update.message.document.file_name
     
     if not file_name:
@@ -67,90 +103,543 @@ async def handle_compressed_file(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("Por favor envía un archivo comprimido (.zip, .rar, .7z, etc.)")
         return
     
-    # Crear directorio temporal
-    user_dir = f"temp_{update.effective_user.id}"
-    os.makedirs(user_dir, exist_ok=True)
+    # Modo selectivo: "/select" en el pie del archivo muestra su contenido para
+    # elegir; "/filter <patrón> ..." descomprime solo lo que coincida
+    selection_mode, patterns = parse_selection_caption(update.message.caption)
+    # "/repack": agrupar los archivos pequeños en zips y álbumes
+    repack = wants_repack(update.message.caption)
     
-    # Descargar el archivo
-    file_path = os.path.join(user_dir, file_name)
-    await file.download_to_drive(file_path)
+    # Si ya se procesó este mismo archivo, reenviar los file_id sin descargar nada
+    unique_id = update.message.document.file_unique_id
+    retry = None
+    if selection_mode is None:
+        cached = archive_cache.lookup(unique_id)
+        if cached is not None:
+            retry = await send_cached_files(update, file_name, cached)
+            if not retry:
+                return
     
-    await update.message.reply_text(f"Archivo {file_name} recibido. Descomprimiendo...")
+    if job_scheduler.will_wait(update.effective_user.id):
+        await update.message.reply_text(f"⏳ {file_name} en cola, se procesará en cuanto haya turno")
     
     try:
-        extract_dir = os.path.join(user_dir, "extracted")
-        os.makedirs(extract_dir, exist_ok=True)
-        
-        # Determinar el tipo de archivo y descomprimir
-        if file_name.lower().endswith('.zip'):
-            with zipfile.ZipFile(file_path, 'r') as z:
-                z.extractall(extract_dir)
-        
-        elif file_name.lower().endswith('.tar.gz') or file_name.lower().endswith('.tgz'):
-            with tarfile.open(file_path, 'r:gz') as tar:
-                tar.extractall(extract_dir)
-        
-        elif file_name.lower().endswith('.tar.bz2'):
-            with tarfile.open(file_path, 'r:bz2') as tar:
-                tar.extractall(extract_dir)
-        
-        elif file_name.lower().endswith('.7z'):
-            with py7zr.SevenZipFile(file_path, mode='r') as z:
-                z.extractall(extract_dir)
-        
-        elif file_name.lower().endswith('.rar'):
-            with rarfile.RarFile(file_path) as rf:
-                rf.extractall(extract_dir)
-        else:
-            await update.message.reply_text("Formato de archivo no soportado")
+        # Cada trabajo espera su turno y tiene su propio directorio
+        async with job_scheduler.job(update.effective_user.id) as job:
+            await process_archive(update, context, job, file_name, unique_id, selection_mode, patterns,
+                                  repack, retry)
+    except Exception as e:
+        await reply_job_error(update, file_name, e)
+
+async def process_archive(update: Update, context: ContextTypes.DEFAULT_TYPE, job: Job, file_name: str,
+                          unique_id: str, selection_mode=None, patterns=None, repack=False, retry=None):
+    """Descarga, comprueba y descomprime un archivo dentro de su trabajo
+
+    retry son los nombres que no se pudieron reenviar desde la caché: solo se
+    descomprimen y suben esos.
+    """
+    document = update.message.document
+    
+    # Determinar el tipo de archivo
+    fmt = detect_format(file_name)
+    if fmt is None:
+        await update.message.reply_text("Formato de archivo no soportado")
+        return
+    
+    # Reservar espacio y descargar el archivo (con su hash, calculado al escribirlo)
+    await job.reserve(document.file_size or 0)
+    file = await document.get_file()
+    file_path = os.path.join(job.workspace, file_name)
+    archive_digest = await download_document(file, file_path, document.file_size)
+    
+    # ¿El mismo contenido ya se procesó con otro unique_id? Entonces no hace falta descomprimir
+    alias = archive_cache.unique_id_for(archive_digest)
+    if selection_mode is None and not repack and retry is None and alias and alias != unique_id:
+        cached = archive_cache.lookup(alias)
+        if cached is not None:
+            retry = await send_cached_files(update, file_name, cached)
+            if not retry:
+                return
+    
+    extract_dir = os.path.join(job.workspace, "extracted")
+    os.makedirs(extract_dir, exist_ok=True)
+    
+    # Leer solo el índice para comprobar tamaños antes de descomprimir nada
+    job_id = (update.effective_user.id, update.message.message_id)
+    listing = await extractor_pool.list(job_id, update.effective_user.id, file_path, fmt)
+    job.check_archive(os.path.getsize(file_path), listing)
+    
+    members = None
+    if selection_mode == 'select':
+        await show_selection(update, file_name, file_path, extract_dir, fmt, job.workspace, listing,
+                             repack)
+        job.keep_workspace = True
+        return
+    if selection_mode == 'filter':
+        members = [name for name, _ in listing if matches_patterns(name, patterns)]
+        if not members:
+            await update.message.reply_text(f"Ningún archivo coincide con: {' '.join(patterns)}")
             return
-        
-        await send_extracted_files(update, context, extract_dir)
-        await update.message.reply_text("✅ Descompresión completada!")
+        await update.message.reply_text(
+            f"🔎 {len(members)} de {len(listing)} archivos coinciden. Descomprimiendo..."
+        )
+    elif retry and any(name in retry for name, _ in listing):
+        members = [name for name, _ in listing if name in retry]
+        await update.message.reply_text(
+            f"♻️ Descomprimiendo de nuevo los {len(members)} archivos que fallaron..."
+        )
+    else:
+        await update.message.reply_text(f"Archivo {file_name} recibido. Descomprimiendo...")
     
-    except Exception as e:
+    # Con muchos archivos se reempaqueta aunque no se pida (salvo al repetir los que fallaron,
+    # que tienen que subirse sueltos para volver a la caché)
+    count = len(members if members is not None else listing)
+    repack = retry is None and (repack or count >= REPACK_AUTO_FILES)
+    await job.reserve(extraction_budget(listing, members, repack))
+    await run_extraction(update, context, job_id, file_name, file_path, extract_dir, fmt,
+                         members, unique_id, repack, archive_digest)
+
+async def download_document(file, file_path: str, expected_size: int = None) -> str:
+    """Descarga un archivo de Telegram y devuelve su hash, calculado mientras se escribe.
+    
+    Comprueba además que el tamaño coincide con el que anunció Telegram.
+    """
+    if os.path.isabs(file.file_path or ''):
+        # Servidor local de la Bot API: el archivo ya está en disco, se copia en un hilo
+        def copy():
+            with open(file.file_path, 'rb') as src, open(file_path, 'wb') as dst:
+                return copy_hashed(src, dst)
+        digest = await asyncio.to_thread(copy)
+    else:
+        with open(file_path, 'wb') as f:
+            writer = HashingWriter(f)
+            await file.download_to_memory(out=writer)
+        digest = writer.hexdigest()
+    size = os.path.getsize(file_path)
+    if expected_size and size != expected_size:
+        raise ValueError(f"descarga incompleta ({size} de {expected_size} bytes)")
+    return digest
+
+def extraction_budget(listing, members=None, repack=False) -> int:
+    """Espacio en disco que necesita la descompresión"""
+    wanted = set(members) if members is not None else None
+    sizes = sorted((size for name, size in listing if wanted is None or name in wanted), reverse=True)
+    if STREAM_EXTRACT:
+        # En modo streaming solo hay en disco los archivos pendientes de enviar
+        window = STREAM_LOOKAHEAD + upload_scheduler.concurrency
+        if repack:
+            # Más el zip en construcción y el álbum pendiente
+            budget = sum(sizes[:window + MEDIA_GROUP_SIZE]) + REPACK_BUNDLE_SIZE
+            return min(budget, sum(sizes))
+        return sum(sizes[:window])
+    return sum(sizes)
+
+async def run_extraction(update: Update, context: ContextTypes.DEFAULT_TYPE, job_id, file_name: str,
+                         file_path: str, extract_dir: str, fmt: str, members=None, unique_id=None,
+                         repack=False, archive_digest=None):
+    """Descomprime (todo o solo members) en un proceso aparte y envía los archivos"""
+    repack_name = file_name if repack else None
+    if STREAM_EXTRACT:
+        progress = await send_streamed_files(update, context, job_id, file_path, extract_dir, fmt, members,
+                                             repack_name)
+    else:
+        digests = await extractor_pool.extract(job_id, update.effective_user.id, file_path, extract_dir,
+                                               fmt, members)
+        progress = await send_extracted_files(update, context, extract_dir, repack_name, digests)
+    
+    # Guardar en caché solo si se envió el archivo completo, sin fallos y sin reempaquetar.
+    # Los archivos se suben a la vez y terminan en cualquier orden: se guardan en el del archivo
+    if not repack:
+        results = [r[1:] for r in sorted(progress.results, key=lambda r: r[0])]
+        if members is None and unique_id and not progress.failed:
+            archive_cache.store(unique_id, file_name, results, archive_digest)
+        elif results:
+            # Extracción parcial: al menos se reutilizan los file_id de lo que sí se subió
+            archive_cache.store_blobs(results)
+    await update.effective_message.reply_text("✅ Descompresión completada!")
+
+async def reply_job_error(update: Update, file_name: str, e: Exception):
+    """Informa al usuario de un error al descomprimir"""
+    if isinstance(e, (ExtractionCancelled, JobCancelled)):
+        await update.effective_message.reply_text(f"🛑 Descompresión de {file_name} cancelada")
+    elif isinstance(e, JobRejected):
+        logger.warning(f"Archivo {file_name} rechazado: {e}")
+        await update.effective_message.reply_text(f"🚫 {file_name} rechazado: {e}")
+    elif isinstance(e, ExtractionTimeout):
+        logger.error(f"Timeout al descomprimir {file_name}: {e}")
+        await update.effective_message.reply_text(f"⏱️ {e}")
+    else:
         logger.error(f"Error al descomprimir: {e}")
-        await update.message.reply_text(f"❌ Error al descomprimir: {str(e)}")
+        await update.effective_message.reply_text(f"❌ Error al descomprimir: {str(e)}")
+
+def parse_selection_caption(caption):
+    """Devuelve ('select', None), ('filter', [patrones]) o (None, None) según el pie del archivo"""
+    words = (caption or '').split()
+    if not words:
+        return None, None
+    command = words[0].lower()
+    if command == '/select':
+        return 'select', None
+    if command == '/filter' and len(words) > 1:
+        patterns = [w for w in words[1:] if w.lower() != '/repack']
+        if patterns:
+            return 'filter', patterns
+    return None, None
+
+def wants_repack(caption) -> bool:
+    """Comprueba si el pie del archivo pide /repack"""
+    return '/repack' in (caption or '').lower().split()
+
+def matches_patterns(name: str, patterns) -> bool:
+    """Comprueba si la ruta o el nombre del archivo coincide con algún patrón (*.pdf, docs/*)"""
+    base = os.path.basename(name)
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(base, p) for p in patterns)
+
+async def show_selection(update: Update, file_name: str, file_path: str, extract_dir: str, fmt: str,
+                         workspace: str, listing, repack=False):
+    """Muestra el contenido del archivo con botones para elegir qué descomprimir"""
+    await expire_selections()
+    selection_id = secrets.token_hex(4)
+    pending_selections[selection_id] = {
+        'user_id': update.effective_user.id,
+        'file_name': file_name,
+        'file_path': file_path,
+        'extract_dir': extract_dir,
+        'fmt': fmt,
+        'workspace': workspace,
+        'members': listing,
+        'repack': repack,
+        'selected': set(),
+        'page': 0,
+        'created': time.monotonic(),
+    }
+    await update.message.reply_text(
+        selection_text(pending_selections[selection_id]),
+        reply_markup=selection_keyboard(selection_id)
+    )
+
+def selection_text(state) -> str:
+    total = sum(size for _, size in state['members']) / 1024 / 1024
+    return (f"📋 {state['file_name']}: {len(state['members'])} archivos ({total:.2f} MB)\n"
+            "Elige qué descomprimir:")
+
+def selection_keyboard(selection_id: str) -> InlineKeyboardMarkup:
+    """Teclado de una página de la lista de contenidos"""
+    state = pending_selections[selection_id]
+    members = state['members']
+    first = state['page'] * SELECT_PAGE_SIZE
+    rows = []
+    for index, (name, size) in enumerate(members[first:first + SELECT_PAGE_SIZE], first):
+        mark = '✅' if index in state['selected'] else '⬜'
+        label = name if len(name) <= 40 else '…' + name[-39:]
+        rows.append([InlineKeyboardButton(f"{mark} {label} ({size/1024/1024:.2f} MB)",
+                                          callback_data=f"sel:{selection_id}:tog:{index}")])
     
+    nav = []
+    if first > 0:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"sel:{selection_id}:pg:{state['page'] - 1}"))
+    if first + SELECT_PAGE_SIZE < len(members):
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"sel:{selection_id}:pg:{state['page'] + 1}"))
+    if nav:
+        rows.append(nav)
+    rows.append([
+        InlineKeyboardButton("☑️ Todos", callback_data=f"sel:{selection_id}:all:0"),
+        InlineKeyboardButton(f"📦 Extraer ({len(state['selected'])})", callback_data=f"sel:{selection_id}:go:0"),
+        InlineKeyboardButton("❌", callback_data=f"sel:{selection_id}:x:0"),
+    ])
+    return InlineKeyboardMarkup(rows)
+
+async def expire_selections():
+    """Descarta las selecciones abandonadas y sus archivos"""
+    now = time.monotonic()
+    for selection_id, state in list(pending_selections.items()):
+        if now - state['created'] > SELECT_TTL:
+            del pending_selections[selection_id]
+            await clean_temp_files(state['workspace'])
+
+async def expire_selections_loop():
+    """Descarta las selecciones caducadas aunque no lleguen nuevas.
+
+    Mientras siguen en pending_selections el janitor no toca su directorio.
+    """
+    while True:
+        await asyncio.sleep(SELECT_SWEEP_INTERVAL)
+        try:
+            await expire_selections()
+        except Exception as e:
+            logger.warning(f"Error al descartar selecciones caducadas: {e}")
+
+async def handle_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Maneja los botones de la lista de contenidos"""
+    query = update.callback_query
+    _, selection_id, action, arg = query.data.split(':')
+    state = pending_selections.get(selection_id)
+    if state is None or state['user_id'] != update.effective_user.id:
+        await query.answer("Esta selección ya no está disponible")
+        return
+    
+    if action == 'tog':
+        state['selected'] ^= {int(arg)}
+    elif action == 'pg':
+        state['page'] = int(arg)
+    elif action == 'all':
+        everything = set(range(len(state['members'])))
+        state['selected'] = set() if state['selected'] == everything else everything
+    elif action == 'x':
+        del pending_selections[selection_id]
+        await clean_temp_files(state['workspace'])
+        await query.answer()
+        await query.edit_message_text(f"❌ Selección de {state['file_name']} cancelada")
+        return
+    elif action == 'go':
+        if not state['selected']:
+            await query.answer("No has elegido ningún archivo")
+            return
+        del pending_selections[selection_id]
+        await query.answer()
+        members = [state['members'][i][0] for i in sorted(state['selected'])]
+        await query.edit_message_text(
+            f"📦 Descomprimiendo {len(members)} de {len(state['members'])} archivos de {state['file_name']}..."
+        )
+        job_id = (update.effective_user.id, query.message.message_id)
+        try:
+            # El directorio del archivo pasa al nuevo trabajo, que lo borra al terminar
+            async with job_scheduler.job(update.effective_user.id, workspace=state['workspace']) as job:
+                repack = state['repack'] or len(members) >= REPACK_AUTO_FILES
+                await job.reserve(extraction_budget(state['members'], members, repack))
+                await run_extraction(update, context, job_id, state['file_name'], state['file_path'],
+                                     state['extract_dir'], state['fmt'], members, repack=repack)
+        except Exception as e:
+            await reply_job_error(update, state['file_name'], e)
+            if os.path.exists(state['workspace']):
+                await clean_temp_files(state['workspace'])
+        return
+    
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=selection_keyboard(selection_id))
+
+async def send_cached_files(update: Update, file_name: str, cached) -> set:
+    """Reenvía los archivos de un comprimido ya procesado usando sus file_id.
+
+    Se envían de uno en uno, en el orden del archivo (reenviar un file_id no
+    sube nada). Devuelve los nombres que no se pudieron reenviar.
+    """
+    progress = UploadProgress(update.effective_message, f"♻️ {file_name} ya procesado, reenviando...",
+                              total=len(cached))
+    await progress.start()
+    
+    failed = []
+    for name, file_id in cached:
+        try:
+            await upload_scheduler.send(
+                update.effective_chat.id,
+                lambda: update.effective_message.reply_document(document=file_id)
+            )
+            await progress.add(True, name)
+        except Exception as e:
+            logger.error(f"Error al reenviar {name} desde caché: {e}")
+            failed.append((name, file_id))
+            await progress.add(False, name)
+    
+    if failed:
+        archive_cache.forget_file_ids(file_id for _, file_id in failed)
+        await progress.finish(
+            f"♻️ {len(failed)} archivos no se pudieron reenviar, procesándolos de nuevo..."
+        )
+        return {name for name, _ in failed}
+    await progress.finish("✅ Archivos reenviados desde caché")
+    return set()
+
+async def send_extracted_files(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               directory: str, repack_name: str = None, digests=None) -> UploadProgress:
+    """Envía los archivos descomprimidos al usuario (digests: {ruta: hash} de la extracción)"""
+    # El extractor devuelve los archivos en el orden del archivo
+    files = list(digests) if digests else [os.path.join(root, file) for root, _, names in os.walk(directory)
+                                           for file in names]
+    digests = digests or {}
+    progress = UploadProgress(update.effective_message, "📦 Enviando archivos...", total=len(files))
+    await progress.start()
+    if repack_name:
+        repacker = new_repacker(update, repack_name, directory, progress)
+        for file_path in files:
+            await repacker.add(file_path, os.path.relpath(file_path, directory))
+        await repacker.flush()
+    else:
+        await asyncio.gather(*(send_file(update, file_path, progress, digests.get(file_path), position,
+                                         os.path.relpath(file_path, directory))
+                               for position, file_path in enumerate(files)))
+    await progress.finish("📦 Envío terminado")
+    return progress
+
+async def send_streamed_files(update: Update, context: ContextTypes.DEFAULT_TYPE, job_id,
+                              file_path: str, extract_dir: str, fmt: str, members=None,
+                              repack_name: str = None) -> UploadProgress:
+    """Envía cada archivo en cuanto se descomprime y lo borra después de enviarlo"""
+    progress = UploadProgress(update.effective_message, "📦 Descomprimiendo y enviando...")
+    await progress.start()
+    # Reempaquetando, los archivos se procesan en orden y se envían por lotes
+    repacker = new_repacker(update, repack_name, extract_dir, progress) if repack_name else None
+    pending = set()
+    position = 0  # Orden en el archivo: las subidas terminan en cualquier orden
+    try:
+        async for member_path, digest in extractor_pool.stream(job_id, update.effective_user.id,
+                                                               file_path, extract_dir, fmt, members):
+            name = os.path.relpath(member_path, extract_dir)
+            if repacker:
+                await repacker.add(member_path, name)
+                continue
+            pending.add(asyncio.create_task(send_and_remove(update, member_path, progress, digest,
+                                                            position, name)))
+            position += 1
+            # No pedir más archivos mientras todas las subidas estén ocupadas
+            if len(pending) >= upload_scheduler.concurrency:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if repacker:
+            await repacker.flush()
     finally:
-        clean_temp_files(user_dir)
-async def send_extracted_files(update: Update, context: ContextTypes.DEFAULT_TYPE, directory: str):
-    """Envía los archivos descomprimidos al usuario"""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            try:
-                await update.message.reply_document(
-                    document=file_path,
-                    filename=file
-                )
-            except Exception as e:
-                logger.error(f"Error al enviar archivo {file}: {e}")
-                await update.message.reply_text(f"No se pudo enviar el archivo {file}")
-
-def clean_temp_files(directory: str):
-    """Elimina los archivos temporales"""
+        if pending:
+            await asyncio.gather(*pending)
+    await progress.finish("📦 Envío terminado")
+    return progress
+
+def new_repacker(update: Update, file_name: str, extract_dir: str, progress: UploadProgress) -> Repacker:
+    """Crea un Repacker que envía los zips y álbumes con el upload_scheduler"""
+    # Sin puntos iniciales: los zips no deben quedar ocultos ('.fotos.zip' -> 'fotos')
+    base_name = archive_stem(file_name).lstrip('.') or 'archivos'
+    
+    async def send_single(path: str) -> bool:
+        return await send_file(update, path, progress)
+    
+    async def send_bundle(path: str, names) -> bool:
+        ok = await send_file(update, path)
+        for name in names:
+            await progress.add(ok, name)
+        return ok
+    
+    async def send_media_group(media) -> bool:
+        try:
+            items = await asyncio.to_thread(build_media_group, media)
+            await upload_scheduler.send(
+                update.effective_chat.id,
+                lambda: update.effective_message.reply_media_group(media=items)
+            )
+        except Exception as e:
+            # El Repacker los reenvía uno a uno
+            logger.warning(f"No se pudo enviar el álbum ({len(media)} archivos): {e}")
+            return False
+        for _, path in media:
+            await progress.add(True, os.path.basename(path))
+        return True
+    
+    return Repacker(os.path.join(os.path.dirname(extract_dir), "bundles"), base_name,
+                    send_single, send_bundle, send_media_group)
+
+def build_media_group(media):
+    """Lee los archivos de un álbum (se llama en un hilo aparte)"""
+    items = []
+    for kind, path in media:
+        with open(path, 'rb') as f:
+            data = f.read()
+        media_class = InputMediaPhoto if kind == 'photo' else InputMediaVideo
+        items.append(media_class(media=data, filename=os.path.basename(path)))
+    return items
+
+async def send_and_remove(update: Update, file_path: str, progress: UploadProgress = None,
+                          digest: str = None, position: int = None, name: str = None):
+    """Envía un archivo y lo borra del disco"""
+    await send_file(update, file_path, progress, digest, position, name)
+    try:
+        os.remove(file_path)
+    except OSError as e:
+        logger.error(f"Error al eliminar {file_path}: {e}")
+
+async def send_file(update: Update, file_path: str, progress: UploadProgress = None,
+                    digest: str = None, position: int = None, name: str = None) -> bool:
+    """Envía un archivo descomprimido al usuario respetando los límites de Telegram.
+    
+    Si el mismo contenido ya se subió antes con el mismo nombre se reenvía su
+    file_id en lugar de subirlo. digest es el hash calculado al extraerlo; si no
+    se conoce (con /repack) se lee el archivo. position y name (ruta dentro del
+    archivo) son los que se guardan en la caché.
+    """
+    file = os.path.basename(file_path)
     try:
-        for root, dirs, files in os.walk(directory, topdown=False):
-            for file in files:
-                os.remove(os.path.join(root, file))
-            for dir in dirs:
-                os.rmdir(os.path.join(root, dir))
-        os.rmdir(directory)
+        if digest is None:
+            digest = await asyncio.to_thread(hash_file, file_path)
+        size = os.path.getsize(file_path)
+        document = archive_cache.blob_file_id(digest, file)
+        if document is None:
+            if size > UPLOAD_LIMIT:
+                raise ValueError(f"ocupa {size/1024/1024:.0f} MB, más que el límite de subida "
+                                 f"({UPLOAD_LIMIT/1024/1024:.0f} MB)")
+            # En modo local PTB pasa la ruta al servidor en lugar de leer el archivo
+            document = file_path
+        message = await upload_scheduler.send(
+            update.effective_chat.id,
+            lambda: update.effective_message.reply_document(document=document, filename=file)
+        )
+        ok = True
     except Exception as e:
-        logger.error(f"Error al limpiar archivos temporales: {e}")
+        logger.error(f"Error al enviar archivo {file}: {e}")
+        ok = False
+    if progress:
+        if ok:
+            progress.results.append((position, name or file, digest, size, message.document.file_id))
+        await progress.add(ok, file)
+    return ok
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Cancela las descompresiones en curso o en cola del usuario (/cancel)"""
+    if not ALLOWED_USERS.allows(update.effective_user.id):
+        await update.message.reply_text("⚠️ Lo siento, no tienes permiso para usar este bot.")
+        return
+    
+    cancelled = (job_scheduler.cancel_owner(update.effective_user.id)
+                 + extractor_pool.cancel_owner(update.effective_user.id))
+    if cancelled:
+        await update.message.reply_text(f"🛑 {cancelled} descompresión(es) cancelada(s)")
+    else:
+        await update.message.reply_text("No tienes descompresiones en curso")
+
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Muestra los contadores de la caché (/cache)"""
+    if not ALLOWED_USERS.allows(update.effective_user.id):
+        await update.message.reply_text("⚠️ Lo siento, no tienes permiso para usar este bot.")
+        return
+    
+    stats = archive_cache.stats()
+    await update.message.reply_text(
+        "♻️ Caché de archivos:\n"
+        f"📦 Archivos: {stats.get('archives', 0)} | Contenidos: {stats.get('blobs', 0)}\n"
+        f"✅ Aciertos: {stats.get('hits', 0)} | ❌ Fallos: {stats.get('misses', 0)}\n"
+        f"🔁 Contenidos reutilizados: {stats.get('blob_hits', 0)}\n"
+        f"🧹 Expulsados: {stats.get('evictions', 0)}"
+    )
+
+async def clean_temp_files(directory: str):
+    """Elimina los archivos temporales (en un hilo, sin bloquear el event loop)"""
+    await asyncio.to_thread(remove_tree, directory)
+
+async def post_init(application: Application) -> None:
+    """Tareas en segundo plano que necesitan el event loop"""
+    application.create_task(janitor.run())
+    application.create_task(expire_selections_loop())
 
 def main() -> None:
     """Inicia el bot"""
-    application = Application.builder().token(TOKEN).build()
+    # concurrent_updates: los demás usuarios siguen atendidos mientras se descomprime
+    builder = Application.builder().token(TOKEN).post_init(post_init)
+    application = configure_builder(builder, 'UNZIP').build()
 
     # Handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("adduser", add_user))
+    application.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("cache", cache_stats))
+    application.add_handler(CallbackQueryHandler(handle_selection, pattern=r'^sel:'))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_compressed_file))
 
-    # Iniciar el bot
-    application.run_polling()
+    # Iniciar el bot (polling o webhook según BOT_MODE)
+    run_application(application, 'UNZIP')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
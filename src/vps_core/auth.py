@@ -0,0 +1,35 @@
+import os
+
+# Lista de usuarios autorizados, común a los bots.
+
+
+def parse_user_ids(value: str) -> set:
+    """Convierte "123, 456" en {123, 456}, ignorando entradas vacías."""
+    return {int(parte.strip()) for parte in (value or '').split(',') if parte.strip()}
+
+
+class AllowList:
+    """Usuarios que pueden usar el bot.
+
+    Con open_if_empty una lista vacía deja pasar a todos (unzip_bot hasta que
+    se añade el primer usuario); si no, una lista vacía no deja pasar a nadie.
+    """
+
+    def __init__(self, users=(), open_if_empty: bool = False):
+        self.users = set(users)
+        self.open_if_empty = open_if_empty
+
+    @classmethod
+    def from_env(cls, name: str, open_if_empty: bool = False):
+        return cls(parse_user_ids(os.getenv(name, '')), open_if_empty)
+
+    def allows(self, user_id) -> bool:
+        if not self.users:
+            return self.open_if_empty
+        return user_id in self.users
+
+    def add(self, user_id: int):
+        self.users.add(user_id)
+
+    def __iter__(self):
+        return iter(sorted(self.users))
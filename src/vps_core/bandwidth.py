@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+
+# Reparto del ancho de banda del VPS entre descargas y subidas.
+#
+# Cada transferencia activa se registra con una prioridad y va informando de
+# los bytes que lleva; con eso se mide su velocidad real (media exponencial).
+# El enlace se reparte en proporción a las prioridades, pero sin desperdiciar:
+# si otra transferencia no usa su parte, la que tiene margen puede aprovecharla.
+# Con las velocidades medidas también se calculan timeouts acordes al tamaño.
+#
+# Las descargas se frenan pausando yt-dlp (ver downloads.py). Una subida no se
+# puede frenar por dentro: httpx lee el archivo desde el event loop y dormir ahí
+# pararía el bot entero. Por eso las subidas se regulan al admitirlas: acquire()
+# solo abre una subida más cuando a las que ya hay les sobra parte de su reparto.
+
+BANDWIDTH = float(os.getenv('BANDWIDTH_MB', '0')) * 1024 * 1024  # Capacidad del enlace, 0 = medirla
+PRIORITIES = {'upload': 2, 'download': 1}  # Las subidas desbloquean al usuario antes
+MIN_RATE = 256 * 1024  # Velocidad mínima supuesta para calcular timeouts (bytes/s)
+TIMEOUT_MIN = 60
+TIMEOUT_MAX = 6 * 3600
+TIMEOUT_MARGIN = 3  # El timeout cubre una transferencia hasta 3 veces más lenta que la medida
+RATE_SMOOTHING = 0.3  # Peso de cada medida nueva en la media exponencial
+PEAK_DECAY = 0.999  # El pico medido del enlace decae poco a poco
+SETTLE_TIME = 3  # Segundos que se deja medir una transferencia nueva antes de admitir otra
+ADMIT_INTERVAL = 0.5  # Cada cuánto se vuelve a mirar si cabe una transferencia en espera
+
+
+class Transfer:
+    """Una transferencia en curso y su velocidad medida."""
+
+    def __init__(self, scheduler, kind: str, priority: float, name: str = ''):
+        self.scheduler = scheduler
+        self.kind = kind
+        self.priority = priority
+        self.name = name
+        self.bytes = 0
+        self.rate = 0.0
+        self.started = time.monotonic()
+        self._last_time = self.started
+        self._last_bytes = 0
+
+    def record(self, nbytes: int):
+        """Suma nbytes transferidos."""
+        self.bytes += nbytes
+        self._update()
+
+    def set_total(self, total: int):
+        """Fija el total transferido (para fuentes que informan del acumulado)."""
+        self.bytes = total
+        self._update()
+
+    def _update(self):
+        ahora = time.monotonic()
+        dt = ahora - self._last_time
+        if dt < 0.5:
+            return
+        medida = max(0, self.bytes - self._last_bytes) / dt
+        self.rate = medida if not self.rate else self.rate + RATE_SMOOTHING * (medida - self.rate)
+        self._last_time, self._last_bytes = ahora, self.bytes
+        self.scheduler._observe()
+
+    def current_rate(self) -> float:
+        """Velocidad medida, que cae si hace rato que no llegan bytes (p. ej. en pausa)."""
+        parado = time.monotonic() - self._last_time
+        return self.rate if parado < 2 else self.rate * 2 / parado
+
+    @property
+    def allowed(self) -> float:
+        """Velocidad que le corresponde ahora mismo (bytes/s)."""
+        return self.scheduler.allowed(self)
+
+    def close(self):
+        self.scheduler._finish(self)
+
+
+class BandwidthScheduler:
+    """Mide y reparte el ancho de banda entre las transferencias activas."""
+
+    def __init__(self, capacity: float = BANDWIDTH):
+        self.configured = capacity
+        self._active = set()
+        self._peak = 0.0
+        self._kind_rate = {}  # Velocidad media de las últimas transferencias terminadas por tipo
+
+    def open(self, kind: str, name: str = '', priority: float = None) -> Transfer:
+        transfer = Transfer(self, kind, priority or PRIORITIES.get(kind, 1), name)
+        self._active.add(transfer)
+        return transfer
+
+    async def acquire(self, kind: str, name: str = '', priority: float = None) -> Transfer:
+        """Abre una transferencia en cuanto quepa en el reparto del enlace (ver has_room)."""
+        while not self.has_room(kind, priority or PRIORITIES.get(kind, 1)):
+            await asyncio.sleep(ADMIT_INTERVAL)
+        return self.open(kind, name, priority)
+
+    def has_room(self, kind: str, priority: float) -> bool:
+        """Indica si otra transferencia de ese tipo aprovecharía el enlace sin quitar a las demás.
+
+        Cabe si no hay ninguna de ese tipo o si las que hay, a su velocidad media,
+        dejan libre en su parte del enlace lo que usaría una más. Mientras una
+        recién abierta no tiene medidas se espera.
+        """
+        mismas = self.active(kind)
+        capacidad = self.capacity()
+        if not mismas or not capacidad:
+            return True
+        ahora = time.monotonic()
+        if any(ahora - t.started < SETTLE_TIME for t in mismas):
+            return False
+        pesos = sum(t.priority for t in self._active) + priority
+        parte = capacidad * (sum(t.priority for t in mismas) + priority) / pesos
+        usado = sum(t.current_rate() for t in mismas)
+        return usado + usado / len(mismas) <= parte
+
+    def capacity(self) -> float:
+        """Capacidad del enlace: la configurada o el pico medido."""
+        return self.configured or self._peak
+
+    def allowed(self, transfer: Transfer) -> float:
+        """Parte proporcional a la prioridad, o lo que dejen libre las demás si es más."""
+        capacidad = self.capacity()
+        if not capacidad:
+            return float('inf')  # Aún no hay medidas
+        pesos = sum(t.priority for t in self._active) or transfer.priority
+        justa = capacidad * transfer.priority / pesos
+        libre = capacidad - sum(t.current_rate() for t in self._active if t is not transfer)
+        return max(justa, libre)
+
+    def timeout_for(self, nbytes: int, kind: str = 'upload') -> float:
+        """Timeout para transferir nbytes según la velocidad medida para ese tipo."""
+        rate = max(self._kind_rate.get(kind, 0), MIN_RATE)
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, TIMEOUT_MARGIN * nbytes / rate))
+
+    def active(self, kind: str = None):
+        return [t for t in self._active if kind is None or t.kind == kind]
+
+    def _observe(self):
+        total = sum(t.current_rate() for t in self._active)
+        self._peak = max(total, self._peak * PEAK_DECAY)
+
+    def _finish(self, transfer: Transfer):
+        self._active.discard(transfer)
+        duracion = time.monotonic() - transfer.started
+        if transfer.bytes and duracion > 1:
+            media = transfer.bytes / duracion
+            previa = self._kind_rate.get(transfer.kind)
+            self._kind_rate[transfer.kind] = media if previa is None else previa + RATE_SMOOTHING * (media - previa)
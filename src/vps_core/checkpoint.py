@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Puntos de control de subidas por partes.
+#
+# Por cada archivo que se sube en partes se guarda un JSON con las partes ya
+# enviadas (file_id de Telegram y SHA-256). Si el bot se reinicia a mitad, el
+# siguiente /upload del mismo archivo continúa por la primera parte que falte.
+# El punto de control solo vale si el archivo no ha cambiado (tamaño y mtime)
+# y se divide con el mismo tamaño de parte.
+
+CHECKPOINT_DIR = os.getenv('UPLOAD_CHECKPOINT_DIR', 'upload_checkpoints')
+
+
+class UploadCheckpoint:
+    """Partes ya subidas de un archivo, guardadas en disco tras cada parte."""
+
+    def __init__(self, file_path: str, part_size: int, directory: str = CHECKPOINT_DIR):
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        self.file_path = file_path
+        self.key = {'file': file_path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                    'part_size': part_size}
+        nombre = hashlib.sha1(file_path.encode()).hexdigest()
+        self.path = os.path.join(directory, f'{nombre}.json')
+        self.sent = {}  # número de parte -> {'file_id': ..., 'sha256': ...}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return
+        if datos.get('key') != self.key:
+            return  # El archivo cambió: empezar de cero
+        self.sent = {int(i): parte for i, parte in datos.get('parts', {}).items()}
+
+    def _save(self):
+        datos = {'key': self.key, 'parts': {str(i): p for i, p in sorted(self.sent.items())}}
+        # Escritura atómica: un corte a mitad nunca deja un JSON roto
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(datos, f)
+        os.replace(tmp, self.path)
+
+    def mark_sent(self, index: int, file_id: str, digest: str = None):
+        self.sent[index] = {'file_id': file_id, 'sha256': digest}
+        self._save()
+
+    def digests(self) -> dict:
+        """número de parte -> SHA-256 de las partes enviadas."""
+        return {i: p['sha256'] for i, p in self.sent.items() if p.get('sha256')}
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
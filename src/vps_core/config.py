@@ -0,0 +1,34 @@
+import os
+
+# Lectura de la configuración común a los bots.
+#
+# Cada variable se puede definir por bot con un prefijo (UNZIP_WEBHOOK_PORT,
+# YT_WEBHOOK_PORT...) o en común sin él (WEBHOOK_PORT).
+
+TRUE_VALUES = ('1', 'true', 'si', 'yes')
+
+
+def load_env():
+    """Carga el archivo .env si python-dotenv está instalado."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def env(prefix: str, name: str, default: str = None):
+    """Valor de PREFIX_NAME, o de NAME si no está definido."""
+    if prefix:
+        valor = os.getenv(f'{prefix}_{name}')
+        if valor is not None:
+            return valor
+    return os.getenv(name, default)
+
+
+def env_flag(prefix: str, name: str, default: bool = False) -> bool:
+    """Interpreta la variable como sí/no (1, true, si, yes)."""
+    valor = env(prefix, name)
+    if valor is None:
+        return default
+    return valor.lower() in TRUE_VALUES
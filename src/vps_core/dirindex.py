@@ -0,0 +1,302 @@
+import asyncio
+import bisect
+import ctypes
+import ctypes.util
+import logging
+import os
+import stat
+import struct
+import time
+from collections import OrderedDict
+
+# Índice en memoria del contenido de directorios.
+#
+# La primera vez que se pide un directorio se recorre entero (en un hilo) y a
+# partir de ahí se mantiene al día con eventos de inotify: cada archivo creado,
+# cerrado tras escribir, movido o borrado se actualiza con un solo stat. Así
+# listar no vuelve a recorrer el directorio y los totales ya están calculados.
+#
+# inotify se usa por ctypes (sin dependencias). Si no está disponible (otro
+# sistema, límite de watches agotado) el directorio se vuelve a recorrer cada
+# DIR_POLL_INTERVAL segundos; con inotify también se recorre cada
+# DIR_RESCAN_INTERVAL por si se perdió algún evento.
+#
+# Cada orden de /list se calcula entero la primera vez que se pide y después se
+# mantiene con bisect: un evento mueve una sola entrada en cada vista, así que
+# una descarga en curso no obliga a reordenar el directorio en cada página.
+
+DIR_RESCAN_INTERVAL = float(os.getenv('DIR_RESCAN_INTERVAL', '600'))
+DIR_POLL_INTERVAL = float(os.getenv('DIR_POLL_INTERVAL', '30'))
+DIR_INDEX_MAX = int(os.getenv('DIR_INDEX_MAX', '8'))  # Directorios indexados a la vez
+
+# Constantes de <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# Sin IN_MODIFY: llega con cada write(). El tamaño de un archivo que aún se
+# escribe se actualiza al cerrarlo (o al renombrarlo, como hace yt-dlp con .part)
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, len (y después el nombre)
+
+# Clave de cada vista, de menor a mayor: clave(nombre, tamaño, mtime). Las
+# vistas guardan (clave, nombre): el nombre desempata y hace única cada entrada.
+SORTS = {
+    'mtime': lambda name, size, mtime: -mtime,  # Más recientes primero
+    'size': lambda name, size, mtime: -size,  # Más grandes primero
+    'name': lambda name, size, mtime: name.lower(),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Inotify:
+    """Descriptor de inotify no bloqueante."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Eventos pendientes: [(wd, mask, nombre)]."""
+        eventos = []
+        while True:
+            try:
+                datos = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return eventos
+            pos = 0
+            while pos < len(datos):
+                wd, mask, _, longitud = EVENT.unpack_from(datos, pos)
+                pos += EVENT.size
+                nombre = os.fsdecode(datos[pos:pos + longitud].rstrip(b'\0'))
+                pos += longitud
+                eventos.append((wd, mask, nombre))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirectoryIndex:
+    """Archivos de un directorio (sin entrar en subdirectorios) con sus totales."""
+
+    def __init__(self, path: str, index_id: int):
+        self.path = path
+        self.real = os.path.realpath(path)
+        self.id = index_id
+        self.entries = {}  # nombre -> (tamaño, mtime)
+        self.total_size = 0
+        self.scanned = 0.0
+        self.wd = None  # Watch de inotify, None si se sondea
+        self._sorted = {}  # orden -> [(clave, nombre)] ordenada, solo de los órdenes ya pedidos
+        self._dirty = None  # Nombres con eventos durante un recorrido completo
+
+    @property
+    def count(self) -> int:
+        return len(self.entries)
+
+    def scan(self) -> dict:
+        """Recorre el directorio entero (código síncrono, para un hilo)."""
+        entries = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        info = entry.stat()
+                        entries[entry.name] = (info.st_size, info.st_mtime)
+                except OSError:
+                    continue  # Borrado mientras se recorría
+        return entries
+
+    def replace(self, entries: dict):
+        self.entries = entries
+        self.total_size = sum(size for size, _ in entries.values())
+        self.scanned = time.monotonic()
+        self._sorted.clear()
+
+    def update(self, name: str):
+        """Vuelve a leer un solo archivo tras un evento."""
+        if self._dirty is not None:
+            self._dirty.add(name)
+        try:
+            info = os.stat(os.path.join(self.path, name))
+            entry = (info.st_size, info.st_mtime) if stat.S_ISREG(info.st_mode) else None
+        except OSError:
+            entry = None
+        previa = self.entries.pop(name, None) if entry is None else self.entries.get(name)
+        if previa == entry:
+            return
+        if entry is not None:
+            self.entries[name] = entry
+        self.total_size += (entry[0] if entry else 0) - (previa[0] if previa else 0)
+        for sort, vista in self._sorted.items():
+            clave = SORTS[sort]
+            if previa is not None:
+                del vista[bisect.bisect_left(vista, (clave(name, *previa), name))]
+            if entry is not None:
+                bisect.insort(vista, (clave(name, *entry), name))
+
+    def page(self, sort: str, page: int, page_size: int):
+        """Una página de la vista ordenada: ([(nombre, tamaño, mtime)], página, páginas)."""
+        vista = self._sorted.get(sort)
+        if vista is None:
+            clave = SORTS[sort]
+            vista = self._sorted[sort] = sorted((clave(name, *entry), name) for name, entry in self.entries.items())
+        paginas = max(1, -(-len(vista) // page_size))
+        page = min(max(page, 0), paginas - 1)
+        inicio = page * page_size
+        return [(nombre, *self.entries[nombre]) for _, nombre in vista[inicio:inicio + page_size]], page, paginas
+
+
+class DirectoryIndexes:
+    """Índices de los últimos directorios pedidos, actualizados en segundo plano."""
+
+    def __init__(self, max_dirs: int = DIR_INDEX_MAX):
+        self.max_dirs = max_dirs
+        self._indexes = OrderedDict()  # ruta real -> DirectoryIndex
+        self._by_wd = {}
+        self._pending = {}  # ruta real -> tarea del primer recorrido, compartida por quien lo pida a la vez
+        self._ids = 0
+        self._inotify = None
+        self._task = None
+
+    def _start(self):
+        """Abre inotify y lanza el recorrido periódico (necesita el event loop)."""
+        self._task = asyncio.ensure_future(self._rescan_loop())
+        inotify = None
+        try:
+            inotify = Inotify()
+            asyncio.get_running_loop().add_reader(inotify.fd, self._on_events)
+            self._inotify = inotify
+        except (OSError, AttributeError, NotImplementedError) as e:
+            logger.warning(f"inotify no disponible, los directorios se recorrerán cada "
+                           f"{DIR_POLL_INTERVAL:.0f} s: {e}")
+            if inotify is not None:
+                inotify.close()
+
+    async def get(self, path: str) -> DirectoryIndex:
+        """Índice del directorio; solo la primera vez se recorre entero."""
+        if self._task is None:
+            self._start()
+        real = os.path.realpath(path)
+        index = self._indexes.get(real)
+        if index is not None:
+            self._indexes.move_to_end(real)
+            return index
+
+        # Dos /list a la vez del mismo directorio nuevo esperan al mismo recorrido
+        tarea = self._pending.get(real)
+        if tarea is None:
+            tarea = self._pending[real] = asyncio.ensure_future(self._index(path, real))
+            tarea.add_done_callback(lambda _: self._pending.pop(real, None))
+        # shield: si se cancela quien espera, el recorrido sigue para los demás
+        return await asyncio.shield(tarea)
+
+    async def _index(self, path: str, real: str) -> DirectoryIndex:
+        """Crea el índice de un directorio nuevo: watch, recorrido completo y LRU."""
+        self._ids += 1
+        index = DirectoryIndex(path, self._ids)
+        if self._inotify is not None:
+            # El watch va antes del recorrido para no perder lo que cambie mientras
+            try:
+                index.wd = self._inotify.add_watch(index.real)
+                self._by_wd[index.wd] = index
+            except OSError as e:
+                logger.warning(f"No se pudo vigilar {path}, se recorrerá periódicamente: {e}")
+        try:
+            await self._rescan(index)
+        except Exception:
+            self._unwatch(index)
+            raise
+        self._indexes[real] = index
+        while len(self._indexes) > self.max_dirs:
+            _, viejo = self._indexes.popitem(last=False)
+            self._unwatch(viejo)
+        return index
+
+    def by_id(self, index_id: int):
+        """Índice todavía vigente con ese id (para los botones de /list), o None."""
+        for index in self._indexes.values():
+            if index.id == index_id:
+                return index
+        return None
+
+    async def _rescan(self, index: DirectoryIndex):
+        index._dirty = set()
+        try:
+            entries = await asyncio.to_thread(index.scan)
+            dirty, index._dirty = index._dirty, None
+            index.replace(entries)
+            # Lo que cambió durante el recorrido puede no estar en la foto
+            for name in dirty:
+                index.update(name)
+        finally:
+            index._dirty = None
+
+    async def _rescan_loop(self):
+        while True:
+            await asyncio.sleep(DIR_POLL_INTERVAL)
+            ahora = time.monotonic()
+            for real, index in list(self._indexes.items()):
+                if index.wd is not None and ahora - index.scanned < DIR_RESCAN_INTERVAL:
+                    continue
+                try:
+                    await self._rescan(index)
+                except OSError as e:
+                    logger.info(f"Se deja de indexar {index.path}: {e}")
+                    self._forget(real)
+
+    def _on_events(self):
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # Se perdieron eventos: se fuerza recorrer todo en la próxima vuelta
+                for index in self._indexes.values():
+                    index.scanned = 0.0
+                continue
+            index = self._by_wd.get(wd)
+            if index is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self._forget(index.real)
+            elif name and not mask & IN_ISDIR:
+                index.update(name)
+
+    def _forget(self, real: str):
+        index = self._indexes.pop(real, None)
+        if index is not None:
+            self._unwatch(index)
+
+    def _unwatch(self, index: DirectoryIndex):
+        if index.wd is None:
+            return
+        self._by_wd.pop(index.wd, None)
+        if self._inotify is not None:
+            self._inotify.rm_watch(index.wd)
+        index.wd = None
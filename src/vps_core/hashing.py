@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Hash del contenido mientras se transfiere.
+#
+# En lugar de leer otra vez un archivo de varios GB para calcular su hash, los
+# bytes pasan por el hash a la vez que se escriben (HashingWriter, copy_hashed).
+# Los hashes se guardan en un índice aparte (DigestIndex) junto con el tamaño y
+# la fecha de modificación: mientras no cambien, el hash sigue valiendo para
+# comprobar la integridad o detectar duplicados sin volver a leer el archivo.
+#
+# Un archivo escrito por otro programa (yt-dlp) se puede registrar sin hash:
+# el tamaño basta para descartar casi todos los duplicados, y solo se lee
+# entero si aparece otro del mismo tamaño (o se rellena al subirlo).
+#
+# Se usa SHA-256, como los manifiestos de las partes y la caché de unzip_bot:
+# con las instrucciones SHA de las CPU actuales es más rápido que BLAKE2.
+
+DIGEST_INDEX_DB = os.getenv('DIGEST_INDEX_DB', 'digests.sqlite3')
+HASH_CHUNK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    digest TEXT,
+    recorded REAL
+);
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+"""
+
+
+def new_hash():
+    return hashlib.sha256()
+
+
+class HashingWriter:
+    """Envuelve un archivo abierto para escritura y calcula el hash de lo escrito."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+        self._hash = new_hash()
+
+    def write(self, data) -> int:
+        self._hash.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self):
+        self.raw.flush()
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def copy_hashed(src, dst) -> str:
+    """Copia de un archivo abierto a otro calculando el hash por el camino."""
+    writer = HashingWriter(dst)
+    for chunk in iter(lambda: src.read(HASH_CHUNK), b''):
+        writer.write(chunk)
+    return writer.hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """Hash del contenido de un archivo ya escrito (cuando no se pudo calcular al escribirlo)."""
+    h = new_hash()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_duplicate(existing: str, path: str) -> bool:
+    """Sustituye path por un enlace duro a existing (mismo contenido, sin ocupar el doble).
+
+    Cada nombre se puede borrar por separado sin afectar al otro. Devuelve
+    False si no se pudo enlazar (otro sistema de archivos, por ejemplo).
+    """
+    temporal = f'{path}.enlace'
+    try:
+        if os.path.samefile(existing, path):
+            return False
+        os.link(existing, temporal)
+        os.replace(temporal, path)
+        return True
+    except OSError:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        return False
+
+
+class DigestIndex:
+    """Índice SQLite ruta -> hash, válido mientras no cambien el tamaño ni la fecha."""
+
+    def __init__(self, path: str = DIGEST_INDEX_DB):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def record(self, file_path: str, digest: str = None):
+        """Guarda el hash de un archivo recién escrito (o solo su tamaño si digest es None)."""
+        info = os.stat(file_path)
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO files (path, size, mtime_ns, digest, recorded) VALUES (?, ?, ?, ?, ?)',
+                (os.path.abspath(file_path), info.st_size, info.st_mtime_ns, digest, time.time())
+            )
+
+    def _row(self, file_path: str):
+        with self._lock:
+            return self._db.execute('SELECT size, mtime_ns, digest FROM files WHERE path = ?',
+                                    (os.path.abspath(file_path),)).fetchone()
+
+    def digest(self, file_path: str):
+        """Hash guardado del archivo, o None si no se conoce o el archivo cambió."""
+        row = self._row(file_path)
+        if row is None:
+            return None
+        if not self._unchanged(file_path, row[0], row[1]):
+            self.forget(file_path)
+            return None
+        return row[2]
+
+    def verify(self, file_path: str, digest: str):
+        """Compara un hash recién calculado (p. ej. al subir) con el guardado al escribirlo.
+
+        Devuelve True si coinciden y False si difieren aunque el tamaño y la
+        fecha sean los mismos (datos dañados en disco). Devuelve None si no
+        había hash o el archivo se modificó después. Un archivo registrado sin
+        hash se queda con este; los que no se registraron al escribirlos siguen
+        fuera del índice.
+        """
+        row = self._row(file_path)
+        if row is None or not self._unchanged(file_path, row[0], row[1]):
+            return None
+        if row[2] is None:
+            with self._lock, self._db:
+                self._db.execute('UPDATE files SET digest = ? WHERE path = ? AND digest IS NULL',
+                                 (digest, os.path.abspath(file_path)))
+            return None
+        return row[2] == digest
+
+    def same_size(self, size: int, exclude: str = None, under: str = None):
+        """[(ruta, hash o None)] de los archivos en disco con ese tamaño (dentro de under)."""
+        exclude = os.path.abspath(exclude) if exclude else None
+        under = os.path.join(os.path.abspath(under), '') if under else None
+        with self._lock:
+            filas = self._db.execute('SELECT path, mtime_ns, digest FROM files WHERE size = ?',
+                                     (size,)).fetchall()
+        iguales = []
+        for path, mtime_ns, digest in filas:
+            if path == exclude or under and not path.startswith(under):
+                continue
+            if self._unchanged(path, size, mtime_ns):
+                iguales.append((path, digest))
+            else:
+                self.forget(path)
+        return iguales
+
+    def forget(self, file_path: str):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM files WHERE path = ?', (os.path.abspath(file_path),))
+
+    @staticmethod
+    def _unchanged(file_path: str, size: int, mtime_ns: int) -> bool:
+        try:
+            info = os.stat(file_path)
+        except OSError:
+            return False
+        return info.st_size == size and info.st_mtime_ns == mtime_ns
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Limpieza automática de los directorios temporales.
+#
+# Cada JANITOR_INTERVAL segundos se recorren los directorios y se borran, de
+# menos a más recientemente usado, los archivos que superan la edad máxima y
+# los necesarios para volver al presupuesto de bytes. Nunca se borran:
+# - los archivos (o directorios enteros) fijados por trabajos en curso,
+# - los de PROTECTED_NAMES (cookies.txt),
+# - los modificados hace menos de JANITOR_GRACE segundos, que pueden ser
+#   descargas en curso cuyo nombre final aún no se conoce.
+# El recorrido y los borrados se hacen en un hilo para no frenar el event loop.
+
+JANITOR_INTERVAL = float(os.getenv('JANITOR_INTERVAL', '600'))
+JANITOR_BUDGET = int(float(os.getenv('JANITOR_BUDGET_MB', '0')) * 1024 * 1024)  # 0 = sin límite
+JANITOR_MAX_AGE = float(os.getenv('JANITOR_MAX_AGE_HOURS', '24')) * 3600  # 0 = sin límite
+JANITOR_GRACE = float(os.getenv('JANITOR_GRACE', '600'))
+PROTECTED_NAMES = {'cookies.txt'}
+
+logger = logging.getLogger(__name__)
+
+
+class TempJanitor:
+    """Aplica presupuesto de bytes y edad máxima a unos directorios temporales."""
+
+    def __init__(self, directories, budget: int = JANITOR_BUDGET, max_age: float = JANITOR_MAX_AGE,
+                 grace: float = JANITOR_GRACE, interval: float = JANITOR_INTERVAL, pinned=None):
+        self.directories = list(directories)
+        self.budget = budget
+        self.max_age = max_age
+        self.grace = grace
+        self.interval = interval
+        self.pinned = pinned  # Función opcional que devuelve más rutas fijadas (p. ej. trabajos activos)
+        self._pins = Counter()
+
+    @contextmanager
+    def pin(self, path: str):
+        """Protege un archivo o directorio mientras dura el bloque."""
+        real = os.path.realpath(path)
+        self._pins[real] += 1
+        try:
+            yield
+        finally:
+            self._pins[real] -= 1
+            if not self._pins[real]:
+                del self._pins[real]
+
+    def _pinned_paths(self) -> set:
+        """Foto de las rutas fijadas (se toma en el event loop antes de ir al hilo)."""
+        pins = set(self._pins)
+        if self.pinned is not None:
+            pins.update(os.path.realpath(p) for p in self.pinned())
+        return pins
+
+    async def sweep(self, everything: bool = False):
+        """Pasa la limpieza ahora. Con everything se borra todo lo que no está protegido.
+
+        Devuelve (archivos borrados, bytes liberados).
+        """
+        return await asyncio.to_thread(self._sweep, self._pinned_paths(), everything)
+
+    async def run(self):
+        """Bucle de limpieza en segundo plano."""
+        while True:
+            try:
+                borrados, liberado = await self.sweep()
+                if borrados:
+                    logger.info(f"Limpieza: {borrados} archivos borrados, {liberado/1024/1024:.1f} MB liberados")
+            except Exception as e:
+                logger.warning(f"Error en la limpieza de temporales: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _sweep(self, pins: set, everything: bool):
+        ahora = time.time()
+        archivos = []  # (último uso, tamaño, ruta) de los que se pueden borrar
+        total = 0
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        info = os.lstat(path)
+                    except OSError:
+                        continue
+                    total += info.st_size
+                    if (name in PROTECTED_NAMES or ahora - info.st_mtime < self.grace
+                            or _is_pinned(os.path.realpath(path), pins)):
+                        continue
+                    archivos.append((max(info.st_atime, info.st_mtime), info.st_size, path))
+
+        borrados = liberado = 0
+        archivos.sort()  # Menos recientemente usados primero
+        for ultimo_uso, size, path in archivos:
+            caducado = self.max_age and ahora - ultimo_uso > self.max_age
+            excede = self.budget and total > self.budget
+            if not (everything or caducado or excede):
+                break  # Los siguientes son más recientes: tampoco caducan
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"No se pudo borrar {path}: {e}")
+                continue
+            total -= size
+            borrados += 1
+            liberado += size
+
+        for directory in self.directories:
+            _remove_empty_dirs(directory, pins, self.grace)
+        return borrados, liberado
+
+
+def _is_pinned(path: str, pins: set) -> bool:
+    """La ruta o alguno de sus directorios padre está fijado."""
+    while True:
+        if path in pins:
+            return True
+        padre = os.path.dirname(path)
+        if padre == path:
+            return False
+        path = padre
+
+
+def _remove_empty_dirs(directory: str, pins: set, grace: float):
+    """Quita los subdirectorios vacíos que dejó la limpieza (no el directorio raíz)."""
+    if not os.path.isdir(directory):
+        return
+    ahora = time.time()
+    for root, dirs, files in os.walk(directory, topdown=False):
+        if root == directory or files or _is_pinned(os.path.realpath(root), pins):
+            continue
+        try:
+            if ahora - os.stat(root).st_mtime < grace:
+                continue  # Recién creado (p. ej. el directorio de un trabajo que empieza)
+            os.rmdir(root)
+        except OSError:
+            pass  # No está vacío (tenía subdirectorios o alguien escribió en él)
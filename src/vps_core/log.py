@@ -0,0 +1,217 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import pickle
+import queue
+import socket
+import threading
+from datetime import datetime, timezone
+
+# Logging no bloqueante: los handlers solo encolan el registro y un hilo en
+# segundo plano (QueueListener) se encarga de formatear y escribir a disco.
+#
+# Con varios procesos (modo prefork de hello.py) solo escribe el supervisor:
+# si cada worker rotara el mismo RotatingFileHandler se perderían líneas. El
+# hilo de cada worker envía sus registros al supervisor por un socket Unix de
+# datagramas (un registro por datagrama, así no se mezclan) y un hilo del
+# supervisor los pasa a sus handlers.
+
+FORMATO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = os.getenv('LOG_FILE')  # Si no se define se escribe en stderr
+LOG_JSON = os.getenv('LOG_JSON', '').lower() in ('1', 'true', 'si', 'yes')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # 10MB por archivo
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+QUEUE_SIZE = 10000  # Registros pendientes antes de empezar a descartar
+MAX_DATAGRAM = 64 * 1024  # Registro más grande que un worker envía al supervisor
+
+_estado = {}
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            datos['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:  # Registro recibido de un worker
+            datos['exc'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que nunca espera: si la cola está llena descarta el registro."""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # El formateo se hace en el hilo del listener, no en el del llamador
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class WorkerHandler(logging.Handler):
+    """Envía cada registro al proceso supervisor (desde el hilo del listener del worker)."""
+
+    def __init__(self, sock: socket.socket):
+        super().__init__()
+        self.sock = sock
+
+    def emit(self, record):
+        try:
+            datos = _serializar(record)
+            if len(datos) > MAX_DATAGRAM:
+                record.msg, record.args, record.exc_text = record.getMessage()[:MAX_DATAGRAM // 2], None, None
+                datos = _serializar(record)
+            self.sock.send(datos)
+        except Exception:
+            self.handleError(record)
+
+
+def _serializar(record) -> bytes:
+    """Registro listo para otro proceso: mensaje ya formateado y sin objetos que no se puedan copiar."""
+    datos = dict(record.__dict__)
+    datos['msg'] = record.getMessage()
+    datos['args'] = None
+    if record.exc_info:
+        datos['exc_text'] = record.exc_text or logging.Formatter().formatException(record.exc_info)
+    datos['exc_info'] = None
+    return pickle.dumps(datos)
+
+
+def _recibir_de_workers(sock: socket.socket, handlers):
+    """Hilo del supervisor: escribe los registros de los workers con sus propios handlers."""
+    while True:
+        try:
+            datos = sock.recv(MAX_DATAGRAM * 2)
+        except OSError:
+            return
+        if not datos:
+            return  # detener_logging() lo pide con un datagrama vacío
+        record = logging.makeLogRecord(pickle.loads(datos))
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _crear_handlers(archivo, json_logs, formato, max_bytes, backups):
+    if archivo:
+        handler = logging.handlers.RotatingFileHandler(
+            archivo, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True
+        )
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_logs else logging.Formatter(formato))
+    return [handler]
+
+
+def _iniciar_listener(handlers):
+    cola = queue.Queue(QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(cola, *handlers, respect_handler_level=True)
+    listener.start()
+    return cola, listener
+
+
+def _reiniciar_en_hijo():
+    """Tras un fork el hilo del listener no existe en el hijo: se crea otro.
+
+    Si el padre preparó workers, el del hijo envía al supervisor en lugar de escribir.
+    """
+    if not _estado:
+        return
+    workers = _estado.pop('workers', None)
+    if workers is not None:
+        recibir, enviar = workers
+        recibir.close()
+        # Los handlers del padre son suyos: el hijo no los escribe ni los cierra
+        _estado['handlers'] = [WorkerHandler(enviar)]
+        _estado.pop('receptor', None)
+    cola, listener = _iniciar_listener(_estado['handlers'])
+    _estado['handler'].queue = cola
+    _estado['listener'] = listener
+
+
+def preparar_workers():
+    """Llamar en el supervisor antes de crear procesos hijo con fork.
+
+    A partir de entonces los hijos envían sus registros al supervisor, que es
+    el único que escribe (y rota) el archivo de log.
+    """
+    with _lock:
+        if not _estado or 'workers' in _estado:
+            return
+        recibir, enviar = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receptor = threading.Thread(target=_recibir_de_workers, args=(recibir, _estado['handlers']),
+                                    name='log-workers', daemon=True)
+        receptor.start()
+        _estado.update(workers=(recibir, enviar), receptor=receptor)
+
+
+def configurar_logging(archivo=LOG_FILE, nivel=logging.INFO, json_logs=LOG_JSON, formato=FORMATO,
+                       max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS) -> logging.Logger:
+    """Configura el logger raíz para escribir a través de una cola en segundo plano.
+
+    Llamarla varias veces no tiene efecto después de la primera.
+    """
+    with _lock:
+        raiz = logging.getLogger()
+        if _estado:
+            return raiz
+
+        handlers = _crear_handlers(archivo, json_logs, formato, max_bytes, backups)
+        cola, listener = _iniciar_listener(handlers)
+        handler = NonBlockingQueueHandler(cola)
+
+        for h in list(raiz.handlers):
+            raiz.removeHandler(h)
+        raiz.addHandler(handler)
+        raiz.setLevel(nivel)
+
+        _estado.update(handlers=handlers, handler=handler, listener=listener)
+        atexit.register(detener_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_reiniciar_en_hijo)
+        return raiz
+
+
+def detener_logging():
+    """Vacía la cola y detiene el hilo de escritura."""
+    listener = _estado.get('listener')
+    if listener is not None and listener._thread is not None:
+        # Como listener.stop(), pero esperando sitio para el centinela si la cola está llena
+        listener.queue.put(listener._sentinel)
+        listener._thread.join()
+        listener._thread = None
+    workers = _estado.pop('workers', None)
+    if workers is not None:
+        # Lo que los workers ya enviaron se escribe antes de cerrar los handlers
+        recibir, enviar = workers
+        enviar.send(b'')
+        _estado['receptor'].join(5)
+        recibir.close()
+        enviar.close()
+    for h in _estado.get('handlers', []):
+        h.close()
+
+
+def registros_descartados() -> int:
+    """Número de registros perdidos porque la cola estaba llena."""
+    handler = _estado.get('handler')
+    return handler.descartados if handler else 0
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+# Muestreo periódico del estado del VPS.
+#
+# Una tarea en segundo plano lee /proc cada METRICS_INTERVAL segundos y guarda
+# la muestra en un buffer circular de tamaño fijo. Cada muestra lleva también
+# la velocidad de cada descarga y subida activa ('jobs'). /status muestra el
+# valor actual y mínimo/media/máximo de los últimos minutos, y lo mismo se
+# sirve en formato de texto de Prometheus en 127.0.0.1:METRICS_PORT (/metrics).
+
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '5'))
+METRICS_HISTORY = int(os.getenv('METRICS_HISTORY', '720'))  # Muestras (1 hora con el intervalo por defecto)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9101'))  # 0 = sin endpoint
+METRICS_WINDOW = float(os.getenv('METRICS_WINDOW', '900'))  # Ventana de mín/media/máx en /metrics
+TRANSFER_METRIC = 'vps_transfer_bytes_per_second'
+
+# (clave, nombre en Prometheus, descripción)
+METRICS = [
+    ('cpu', 'vps_cpu_percent', 'Uso de CPU (%)'),
+    ('mem_used', 'vps_memory_used_bytes', 'Memoria usada (MemTotal - MemAvailable)'),
+    ('mem_total', 'vps_memory_total_bytes', 'Memoria total'),
+    ('disk_read', 'vps_disk_read_bytes_per_second', 'Lectura de disco'),
+    ('disk_write', 'vps_disk_write_bytes_per_second', 'Escritura de disco'),
+    ('net_rx', 'vps_network_receive_bytes_per_second', 'Red recibida'),
+    ('net_tx', 'vps_network_transmit_bytes_per_second', 'Red enviada'),
+    ('download', 'vps_download_bytes_per_second', 'Descargas del bot'),
+    ('upload', 'vps_upload_bytes_per_second', 'Subidas del bot'),
+]
+
+logger = logging.getLogger(__name__)
+
+
+def read_cpu():
+    """(tiempo ocupado, tiempo total) acumulados de /proc/stat."""
+    with open('/proc/stat') as f:
+        campos = [int(x) for x in f.readline().split()[1:]]
+    inactivo = campos[3] + (campos[4] if len(campos) > 4 else 0)  # idle + iowait
+    return sum(campos) - inactivo, sum(campos)
+
+
+def read_memory():
+    """(usada, total) en bytes, usando MemAvailable."""
+    datos = {}
+    with open('/proc/meminfo') as f:
+        for linea in f:
+            clave, valor = linea.split(':', 1)
+            datos[clave] = int(valor.split()[0]) * 1024
+    total = datos['MemTotal']
+    return total - datos.get('MemAvailable', datos['MemFree']), total
+
+
+def read_disk():
+    """(bytes leídos, bytes escritos) acumulados de los discos físicos."""
+    discos = set(os.listdir('/sys/block')) if os.path.isdir('/sys/block') else None
+    leidos = escritos = 0
+    with open('/proc/diskstats') as f:
+        for linea in f:
+            campos = linea.split()
+            nombre = campos[2]
+            if nombre.startswith(('loop', 'ram')) or (discos is not None and nombre not in discos):
+                continue  # Particiones y dispositivos virtuales se contarían dos veces
+            leidos += int(campos[5]) * 512
+            escritos += int(campos[9]) * 512
+    return leidos, escritos
+
+
+def read_network():
+    """(bytes recibidos, bytes enviados) acumulados de todas las interfaces salvo lo."""
+    rx = tx = 0
+    with open('/proc/net/dev') as f:
+        for linea in f.readlines()[2:]:
+            nombre, datos = linea.split(':', 1)
+            if nombre.strip() == 'lo':
+                continue
+            campos = datos.split()
+            rx += int(campos[0])
+            tx += int(campos[8])
+    return rx, tx
+
+
+class MetricsSampler:
+    """Toma muestras periódicas y guarda las últimas en un buffer circular."""
+
+    def __init__(self, bandwidth=None, interval: float = METRICS_INTERVAL, history: int = METRICS_HISTORY):
+        self.bandwidth = bandwidth  # BandwidthScheduler opcional para la velocidad de cada trabajo
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self._previous = None
+
+    def read(self):
+        """Lee los contadores de /proc (se puede llamar desde otro hilo)."""
+        return {'time': time.monotonic(), 'cpu': read_cpu(), 'disk': read_disk(), 'net': read_network(),
+                'mem': read_memory()}
+
+    def sample(self, actual=None):
+        """Toma una muestra (la primera solo sirve de referencia para las tasas)."""
+        actual = actual or self.read()
+        anterior, self._previous = self._previous, actual
+        if anterior is None:
+            return None
+        dt = actual['time'] - anterior['time'] or 1
+        ocupado = actual['cpu'][0] - anterior['cpu'][0]
+        total = actual['cpu'][1] - anterior['cpu'][1]
+        mem_used, mem_total = actual['mem']
+        muestra = {
+            'ts': time.time(),
+            'cpu': 100 * ocupado / total if total else 0.0,
+            'mem_used': mem_used,
+            'mem_total': mem_total,
+            'disk_read': (actual['disk'][0] - anterior['disk'][0]) / dt,
+            'disk_write': (actual['disk'][1] - anterior['disk'][1]) / dt,
+            'net_rx': (actual['net'][0] - anterior['net'][0]) / dt,
+            'net_tx': (actual['net'][1] - anterior['net'][1]) / dt,
+            'download': 0.0,
+            'upload': 0.0,
+            'jobs': {},  # (tipo, nombre) -> bytes/s de cada transferencia activa
+        }
+        if self.bandwidth is not None:
+            for transfer in self.bandwidth.active():
+                rate = transfer.current_rate()
+                job = (transfer.kind, transfer.name)
+                muestra['jobs'][job] = muestra['jobs'].get(job, 0.0) + rate
+                if transfer.kind in ('download', 'upload'):
+                    muestra[transfer.kind] += rate
+        self.samples.append(muestra)
+        return muestra
+
+    async def run(self):
+        """Bucle de muestreo; la lectura de /proc va en un hilo para no bloquear."""
+        while True:
+            try:
+                self.sample(await asyncio.to_thread(self.read))
+            except Exception as e:
+                logger.warning(f"Error tomando métricas: {e}")
+            await asyncio.sleep(self.interval)
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def transfers(self):
+        """[(tipo, nombre, bytes/s)] de las transferencias activas en la última muestra."""
+        muestra = self.latest()
+        return [(kind, name, rate) for (kind, name), rate in muestra['jobs'].items()] if muestra else []
+
+    def summary(self, key, window: float):
+        """(mínimo, media, máximo) en los últimos window segundos, o None.
+
+        key es una métrica de METRICS o (tipo, nombre) de una transferencia; de
+        estas solo cuentan las muestras en las que estaba activa.
+        """
+        desde = time.time() - window
+        if isinstance(key, tuple):
+            valores = [m['jobs'][key] for m in self.samples if m['ts'] >= desde and key in m['jobs']]
+        else:
+            valores = [m[key] for m in self.samples if m['ts'] >= desde]
+        if not valores:
+            return None
+        return min(valores), sum(valores) / len(valores), max(valores)
+
+    def prometheus(self, window: float = METRICS_WINDOW) -> str:
+        """Última muestra y mín/media/máx de la ventana en formato de texto de Prometheus."""
+        muestra = self.latest()
+        if muestra is None:
+            return ''
+        # nombre -> (descripción, [(etiquetas, clave para summary, valor actual)])
+        familias = {nombre: (descripcion, [('', clave, muestra[clave])]) for clave, nombre, descripcion in METRICS}
+        if muestra['jobs']:
+            familias[TRANSFER_METRIC] = ('Velocidad de cada transferencia activa', [
+                (f'kind="{kind}",name="{_label(name)}"', (kind, name), rate)
+                for (kind, name), rate in muestra['jobs'].items()
+            ])
+        lineas = []
+        for nombre, (descripcion, series) in familias.items():
+            lineas += [f'# HELP {nombre} {descripcion}', f'# TYPE {nombre} gauge']
+            lineas += [f'{nombre}{{{etiquetas}}} {valor}' if etiquetas else f'{nombre} {valor}'
+                       for etiquetas, _, valor in series]
+            ventana = f'{nombre}_window'
+            lineas += [f'# HELP {ventana} {descripcion} (mín/media/máx en {window:g} s)', f'# TYPE {ventana} gauge']
+            for etiquetas, clave, _ in series:
+                stats = self.summary(clave, window)
+                prefijo = f'{etiquetas},' if etiquetas else ''
+                lineas += [f'{ventana}{{{prefijo}stat="{stat}"}} {valor}'
+                           for stat, valor in zip(('min', 'avg', 'max'), stats or ())]
+        return '\n'.join(lineas) + '\n'
+
+    async def serve(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        """Sirve /metrics por HTTP (basta con leer la petición y responder)."""
+
+        async def atender(reader, writer):
+            try:
+                peticion = await asyncio.wait_for(reader.readline(), 10)
+                partes = peticion.decode(errors='replace').split()
+                if len(partes) >= 2 and partes[1] == '/metrics':
+                    estado, cuerpo = '200 OK', self.prometheus().encode()
+                else:
+                    estado, cuerpo = '404 Not Found', b'Not found\n'
+                writer.write(
+                    f'HTTP/1.0 {estado}\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                    f'Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n'.encode() + cuerpo
+                )
+                await writer.drain()
+            except (asyncio.TimeoutError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(atender, host, port)
+        logger.info(f"Métricas en http://{host}:{port}/metrics")
+        return server
+
+
+def _label(valor: str) -> str:
+    """Escapa un valor de etiqueta de Prometheus."""
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import time
+
+from vps_core.config import env, env_flag
+
+# Arranque común de los bots: polling (por defecto) o webhook.
+#
+# En modo webhook se usa el servidor integrado de python-telegram-bot
+# (requiere el extra [webhooks]): Telegram entrega cada update por HTTP en
+# cuanto llega, sin el ida y vuelta de getUpdates, y los handlers se ejecutan
+# en paralelo hasta MAX_CONCURRENT_UPDATES.
+#
+# Cada variable se puede definir por bot con un prefijo (UNZIP_WEBHOOK_PORT,
+# YT_WEBHOOK_PORT...) o en común sin él (WEBHOOK_PORT). TELEGRAM_API_URL
+# permite apuntar a un servidor de la Bot API distinto (o a uno falso en pruebas).
+#
+# Con un servidor propio de la Bot API (telegram-bot-api --local) y
+# TELEGRAM_LOCAL_MODE=1 los archivos se pasan por ruta (file://): el servidor
+# los lee directamente del disco, sin pasar los bytes por Python, y el límite
+# de subida pasa de 50 MB a 2000 MB (el de descarga, de 20 MB a sin límite).
+#
+# Se registra cuánto tarda el arranque en frío: desde que se lanza el proceso
+# hasta empezar a recibir updates y hasta atender el primero.
+
+CLOUD_UPLOAD_LIMIT = 50 * 1000 * 1000  # api.telegram.org
+LOCAL_UPLOAD_LIMIT = 2000 * 1024 * 1024  # Servidor propio en modo local
+
+_IMPORT_TIME = time.monotonic()  # Respaldo si no se puede leer /proc
+
+logger = logging.getLogger(__name__)
+
+
+def process_uptime() -> float:
+    """Segundos desde que arrancó el proceso (incluido el intérprete y los imports)."""
+    try:
+        with open('/proc/self/stat') as f:
+            # starttime (campo 22) va en ticks desde el arranque del sistema
+            inicio = int(f.read().rsplit(')', 1)[1].split()[19]) / os.sysconf('SC_CLK_TCK')
+        with open('/proc/uptime') as f:
+            return float(f.read().split()[0]) - inicio
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORT_TIME
+
+
+def local_mode(prefix: str = '') -> bool:
+    """Indica si se usa un servidor propio de la Bot API en modo local."""
+    return env_flag(prefix, 'TELEGRAM_LOCAL_MODE')
+
+
+def upload_limit(prefix: str = '') -> int:
+    """Tamaño máximo de un archivo subido con el servidor de la API configurado."""
+    return LOCAL_UPLOAD_LIMIT if local_mode(prefix) else CLOUD_UPLOAD_LIMIT
+
+
+def configure_builder(builder, prefix: str = ''):
+    """Aplica al ApplicationBuilder el servidor de la API y la concurrencia configurados."""
+    api_url = env(prefix, 'TELEGRAM_API_URL')
+    if api_url:
+        api_url = api_url.rstrip('/')
+        builder = builder.base_url(f'{api_url}/bot').base_file_url(f'{api_url}/file/bot')
+    if local_mode(prefix):
+        if not api_url:
+            raise RuntimeError('TELEGRAM_LOCAL_MODE necesita TELEGRAM_API_URL (el servidor local de la Bot API)')
+        builder = builder.local_mode(True)
+    return builder.concurrent_updates(int(env(prefix, 'MAX_CONCURRENT_UPDATES', '256')))
+
+
+def track_cold_start(application):
+    """Registra en el log el tiempo desde el arranque hasta el primer update atendido."""
+    from telegram.ext import TypeHandler
+    from telegram import Update
+
+    atendido = False
+
+    async def primer_update(update, context):
+        nonlocal atendido
+        if not atendido:
+            atendido = True
+            logger.info(f"Primer update atendido a los {process_uptime():.2f} s del arranque")
+
+    # Grupo -1: se ejecuta antes que los handlers del bot y no los interrumpe
+    application.add_handler(TypeHandler(Update, primer_update), group=-1)
+
+
+def _new_event_loop():
+    """Deja un bucle nuevo como actual: PTB < 22 lo necesita y asyncio.run() no deja ninguno."""
+    # run_polling y run_webhook lo cierran al terminar
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+def run_application(application, prefix: str = ''):
+    """Ejecuta el bot en modo polling o webhook según BOT_MODE."""
+    track_cold_start(application)
+    modo = env(prefix, 'BOT_MODE', 'polling').lower()
+    logger.info(f"Arranque en {process_uptime():.2f} s, iniciando en modo {modo}")
+    if modo != 'webhook':
+        _new_event_loop()
+        application.run_polling()
+        return
+
+    url_path = env(prefix, 'WEBHOOK_PATH', prefix.lower() or 'bot').strip('/')
+    public_url = env(prefix, 'WEBHOOK_URL')
+    if not public_url:
+        raise RuntimeError('BOT_MODE=webhook necesita WEBHOOK_URL (URL pública, p. ej. https://mi.vps)')
+    # Por defecto solo en local: el HTTPS lo pone un proxy inverso delante
+    listen = env(prefix, 'WEBHOOK_LISTEN', '127.0.0.1')
+    port = int(env(prefix, 'WEBHOOK_PORT', '8443'))
+    logger.info(f"Webhook escuchando en {listen}:{port}/{url_path}")
+    _new_event_loop()
+    application.run_webhook(
+        listen=listen,
+        port=port,
+        url_path=url_path,
+        webhook_url=f"{public_url.rstrip('/')}/{url_path}",
+        # Telegram envía el secreto en cada petición; las que no lo traen se rechazan
+        secret_token=env(prefix, 'WEBHOOK_SECRET') or None,
+        max_connections=int(env(prefix, 'WEBHOOK_MAX_CONNECTIONS', '40')),
+    )
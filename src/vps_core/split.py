@@ -0,0 +1,123 @@
+import hashlib
+import io
+import os
+
+# División de archivos grandes sin copiarlos.
+#
+# Cada parte es una vista de solo lectura sobre un rango de bytes del archivo
+# original (os.pread), así que no se crean archivos intermedios ni se duplica
+# el espacio en disco. Mientras se sube cada parte se calcula su SHA-256 y con
+# ello se genera un manifiesto compatible con `sha256sum -c`.
+
+PART_SIZE = int(os.getenv('SPLIT_PART_MB', str(1900))) * 1024 * 1024  # 1.9GB (para dejar margen)
+
+
+def split_ranges(size: int, part_size: int = PART_SIZE):
+    """[(offset, longitud), ...] que cubren size bytes en trozos de part_size."""
+    return [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+
+
+class FilePart(io.RawIOBase):
+    """Rango [offset, offset + length) de un archivo, legible como un archivo normal.
+
+    No expone fileno() a propósito: así los clientes HTTP calculan la longitud
+    con seek/tell (la de la parte) y no con fstat (la del archivo entero).
+    """
+
+    def __init__(self, path: str, offset: int, length: int, name: str):
+        super().__init__()
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.name = name
+        self._fd = None
+        self._pos = 0
+        self._hash = hashlib.sha256()
+        self._hashed = 0  # Bytes consecutivos desde el principio que ya están en el hash
+        self.on_read = None  # Callback opcional on_read(nbytes), p. ej. para medir la velocidad
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self.length
+        self._pos = max(0, min(pos, self.length))
+        if self._pos == 0:
+            # Una relectura completa (p. ej. un reintento) recalcula el hash
+            self._hash = hashlib.sha256()
+            self._hashed = 0
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        n = min(len(buffer), self.length - self._pos)
+        if n <= 0:
+            return 0
+        data = os.pread(self._fd, n, self.offset + self._pos)
+        if not data:
+            raise IOError(f'{self.path} se ha truncado mientras se leía')
+        buffer[:len(data)] = data
+        if self._pos == self._hashed:
+            self._hash.update(data)
+            self._hashed += len(data)
+        self._pos += len(data)
+        if self.on_read:
+            self.on_read(len(data))
+        return len(data)
+
+    @property
+    def digest(self):
+        """SHA-256 de la parte si ya se leyó entera, si no None."""
+        if self._hashed != self.length:
+            return None
+        return self._hash.hexdigest()
+
+    def compute_digest(self) -> str:
+        """Lee la parte solo para calcular el hash (si la subida no lo hizo)."""
+        if self.digest is None:
+            self.seek(0)
+            while self.read(1024 * 1024):
+                pass
+        return self.digest
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        super().close()
+
+
+def file_parts(path: str, part_size: int = PART_SIZE):
+    """Divide un archivo en FilePart de hasta part_size bytes (nombre.ext.part001, ...)."""
+    name = os.path.basename(path)
+    ranges = split_ranges(os.path.getsize(path), part_size)
+    width = max(3, len(str(len(ranges))))
+    return [FilePart(path, offset, length, f'{name}.part{i:0{width}d}')
+            for i, (offset, length) in enumerate(ranges, 1)]
+
+
+def build_manifest(path: str, parts, digests: dict = None) -> str:
+    """Manifiesto con el hash de cada parte y cómo volver a unirlas.
+
+    digests (número de parte desde 1 -> SHA-256) evita releer partes cuyo hash ya se conoce.
+    """
+    digests = digests or {}
+    name = os.path.basename(path)
+    lineas = [
+        f'# {name}: {os.path.getsize(path)} bytes en {len(parts)} partes',
+        f'# Comprobar: sha256sum -c {name}.sha256',
+        f'# Unir:      cat "{name}".part* > "{name}"',
+    ]
+    lineas += [f'{digests.get(i) or part.compute_digest()}  {part.name}'
+               for i, part in enumerate(parts, 1)]
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,23 @@
+import logging
+import os
+import shutil
+
+# Directorios temporales de los bots (descargas, extracciones).
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_dir(path: str) -> str:
+    """Crea el directorio si no existe y devuelve su ruta."""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def remove_tree(path: str) -> None:
+    """Borra un directorio temporal entero; los errores solo se registran."""
+    try:
+        shutil.rmtree(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Error al limpiar archivos temporales de {path}: {e}")
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+# Subidas concurrentes respetando los límites de Telegram: ~30 mensajes/s en
+# total para el bot y ~1 mensaje/s sostenido por chat (con ráfagas cortas).
+
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '4'))
+UPLOAD_GLOBAL_RATE = float(os.getenv('UPLOAD_GLOBAL_RATE', '30'))  # mensajes/s para todo el bot
+UPLOAD_CHAT_RATE = float(os.getenv('UPLOAD_CHAT_RATE', '1'))  # mensajes/s por chat
+UPLOAD_CHAT_BURST = int(os.getenv('UPLOAD_CHAT_BURST', '3'))
+UPLOAD_RETRIES = int(os.getenv('UPLOAD_RETRIES', '5'))
+PROGRESS_INTERVAL = 3  # Segundos mínimos entre ediciones del mensaje de progreso
+
+logger = logging.getLogger(__name__)
+
+
+def _seconds(value) -> float:
+    """retry_after puede venir como int o como timedelta según la versión de PTB."""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class TokenBucket:
+    """Cubeta de tokens: `rate` tokens por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Bloquea la cubeta (p. ej. tras un 429) y la deja vacía."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class UploadScheduler:
+    """Limita la concurrencia y el ritmo de envíos, con reintentos."""
+
+    def __init__(self, concurrency: int = UPLOAD_CONCURRENCY, global_rate: float = UPLOAD_GLOBAL_RATE,
+                 chat_rate: float = UPLOAD_CHAT_RATE, chat_burst: int = UPLOAD_CHAT_BURST,
+                 retries: int = UPLOAD_RETRIES):
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retries = retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._semaphore = None
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        if chat_id not in self._chats:
+            self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self._chats[chat_id]
+
+    async def send(self, chat_id, make_request):
+        """Ejecuta `make_request()` (una corrutina nueva por intento) respetando los límites.
+
+        En un 429 se espera lo que indique retry_after sin gastar reintentos;
+        los errores de red se reintentan con backoff exponencial.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                await bucket.acquire()
+                await self._global.acquire()
+                try:
+                    return await make_request()
+                except RetryAfter as e:
+                    espera = _seconds(e.retry_after) + 0.5
+                    logger.warning(f"Flood control en el chat {chat_id}: esperando {espera:.1f} s")
+                    bucket.pause(espera)
+                except BadRequest:
+                    raise
+                except (TimedOut, NetworkError) as e:
+                    attempt += 1
+                    if attempt > self.retries:
+                        raise
+                    espera = min(2 ** attempt, 60) * (0.5 + random.random())
+                    logger.warning(f"Error transitorio subiendo al chat {chat_id} ({e}), "
+                                   f"reintento {attempt}/{self.retries} en {espera:.1f} s")
+                    await asyncio.sleep(espera)
+
+
+class UploadProgress:
+    """Informa del avance editando un único mensaje, como mucho cada PROGRESS_INTERVAL s."""
+
+    def __init__(self, reply_to, title: str, total: int = None, interval: float = PROGRESS_INTERVAL):
+        self.reply_to = reply_to
+        self.title = title
+        self.total = total
+        self.interval = interval
+        self.sent = 0
+        self.failed = []
+        self.results = []  # Datos que el llamador quiera guardar de cada envío
+        self.finished = False
+        self._message = None
+        self._last_text = None
+        self._last_edit = 0.0
+
+    def _text(self) -> str:
+        hechos = f"{self.sent}/{self.total}" if self.total is not None else str(self.sent)
+        texto = f"{self.title}\n📤 Enviados: {hechos}"
+        if self.failed:
+            texto += f"\n❌ Fallidos: {len(self.failed)}"
+            if self.finished:
+                texto += "\n" + "\n".join(f"• {n}" for n in self.failed[:20])
+                if len(self.failed) > 20:
+                    texto += f"\n...y {len(self.failed) - 20} más"
+        return texto
+
+    async def start(self):
+        self._last_text = self._text()
+        self._message = await self.reply_to.reply_text(self._last_text)
+        self._last_edit = time.monotonic()
+
+    async def add(self, ok: bool, name: str = None):
+        if ok:
+            self.sent += 1
+        else:
+            self.failed.append(name)
+        if time.monotonic() - self._last_edit >= self.interval:
+            await self._edit()
+
+    async def finish(self, title: str = None):
+        if title:
+            self.title = title
+        self.finished = True
+        await self._edit()
+
+    async def _edit(self):
+        texto = self._text()
+        if self._message is None or texto == self._last_text:
+            return
+        self._last_edit = time.monotonic()
+        try:
+            await self._message.edit_text(texto)
+            self._last_text = texto
+        except (BadRequest, NetworkError, RetryAfter) as e:
+            logger.debug(f"No se pudo actualizar el progreso: {e}")
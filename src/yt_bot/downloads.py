@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+import signal
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from vps_core.bandwidth import BandwidthScheduler
+from vps_core.uploader import PROGRESS_INTERVAL
+
+# Gestor de descargas de yt-dlp.
+#
+# - Las descargas se encolan y como mucho DOWNLOAD_CONCURRENCY corren a la vez.
+# - La salida de yt-dlp se lee línea a línea mientras descarga: el progreso se
+#   imprime con una plantilla propia (PROGRESS_PREFIX) y la ruta final con
+#   --print after_move (FILE_PREFIX), así no hay que adivinar qué archivo creó.
+# - Cada trabajo se puede listar (/jobs) y cancelar (/cancel).
+# - El ancho de banda lo reparte un BandwidthScheduler compartido con las
+#   subidas. yt-dlp no deja cambiar --limit-rate en marcha, así que cuando una
+#   descarga va más rápido de lo que le toca se pausa su grupo de procesos
+#   (SIGSTOP/SIGCONT) la fracción de tiempo necesaria.
+# - Si la tarea que espera a yt-dlp se cancela (o vence un timeout) fuera de
+#   cancel(), p. ej. al apagar el bot, el grupo de procesos se termina igual:
+#   no quedan yt-dlp sueltos, ni pausados con SIGSTOP.
+# - Con work_dir cada trabajo descarga sus archivos intermedios (.part, vídeo y
+#   audio antes de unirlos) en su propio directorio temporal (--paths temp:).
+#   Ese directorio y el archivo final quedan fijados con pin (p. ej.
+#   TempJanitor.pin) hasta que wait() devuelve, aunque la descarga esté pausada.
+
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', '2'))
+DOWNLOAD_FRAGMENTS = int(os.getenv('DOWNLOAD_FRAGMENTS', '4'))  # --concurrent-fragments por descarga
+PACE_INTERVAL = 1.0  # Segundos entre ajustes de ritmo
+FINISHED_HISTORY = 20  # Trabajos terminados que se siguen mostrando en /jobs
+STDERR_LINES = 20  # Últimas líneas de stderr que se guardan para el mensaje de error
+KILL_GRACE = 5  # Segundos entre SIGTERM y SIGKILL al cancelar
+
+PROGRESS_PREFIX = '[progreso]'
+FILE_PREFIX = '[archivo]'
+PROGRESS_ARGS = [
+    '--newline',
+    '--progress',  # --print implica --quiet; esto mantiene el progreso
+    '--progress-template',
+    f'download:{PROGRESS_PREFIX} %(progress._percent_str)s|%(progress._speed_str)s|%(progress._eta_str)s'
+    '|%(progress.downloaded_bytes)s',
+    '--print', f'after_move:{FILE_PREFIX} %(filepath)s',
+]
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCancelled(Exception):
+    """La descarga se canceló con /cancel."""
+
+
+class DownloadJob:
+    """Una descarga y su estado actual."""
+
+    def __init__(self, job_id: int, user_id, url: str, cmd, on_progress=None):
+        self.id = job_id
+        self.user_id = user_id
+        self.url = url
+        self.cmd = cmd
+        self.on_progress = on_progress  # async def on_progress(job), como mucho cada PROGRESS_INTERVAL s
+        self.status = 'en cola'
+        self.percent = None
+        self.speed = None
+        self.eta = None
+        self.filename = None
+        self.error = None
+        self.created = time.monotonic()
+        self.process = None
+        self.cancelled = False
+        self._done = asyncio.get_running_loop().create_future()
+        self._last_notify = 0.0
+        self._pins = ExitStack()
+
+    def describe(self) -> str:
+        texto = f"#{self.id} [{self.status}] {self.url}"
+        if self.status == 'descargando' and self.percent:
+            texto += f"\n   {self.percent} a {self.speed}, quedan {self.eta}"
+        elif self.filename:
+            texto += f"\n   {os.path.basename(self.filename)}"
+        return texto
+
+    async def wait(self) -> str:
+        """Espera a que termine y devuelve la ruta del archivo descargado.
+
+        Los archivos del trabajo dejan de estar fijados al volver: quien lo
+        llama debe fijar el archivo antes de esperar a otra cosa.
+        """
+        try:
+            return await asyncio.shield(self._done)
+        finally:
+            self._pins.close()
+
+
+class DownloadManager:
+    """Cola de descargas con límite de concurrencia, progreso en vivo y cancelación."""
+
+    def __init__(self, concurrency: int = DOWNLOAD_CONCURRENCY, fragments: int = DOWNLOAD_FRAGMENTS,
+                 bandwidth: BandwidthScheduler = None, work_dir: str = None, pin=None):
+        self.concurrency = concurrency
+        self.fragments = fragments
+        self.bandwidth = bandwidth or BandwidthScheduler()
+        self.work_dir = work_dir  # Donde van los directorios temporales de cada trabajo
+        self.pin = pin  # pin(ruta): context manager que protege la ruta de la limpieza
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._finished = deque(maxlen=FINISHED_HISTORY)
+        self._semaphore = None
+
+    def submit(self, user_id, url: str, cmd, on_progress=None) -> DownloadJob:
+        """Encola una descarga. cmd es la orden de yt-dlp sin los argumentos de progreso."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        job = DownloadJob(next(self._ids), user_id, url, cmd[:1] + PROGRESS_ARGS + cmd[1:], on_progress)
+        self._jobs[job.id] = job
+        asyncio.ensure_future(self._run(job))
+        return job
+
+    def jobs(self, user_id=None):
+        """Trabajos activos y terminados recientemente (de un usuario o de todos)."""
+        todos = list(self._jobs.values()) + list(self._finished)
+        return [j for j in todos if user_id is None or j.user_id == user_id]
+
+    def cancel(self, job_id: int = None, user_id=None) -> int:
+        """Cancela un trabajo (o todos los del usuario si job_id es None)."""
+        cancelados = 0
+        for job in list(self._jobs.values()):
+            if (job_id is not None and job.id != job_id) or (user_id is not None and job.user_id != user_id):
+                continue
+            job.cancelled = True
+            if job.process and job.process.returncode is None:
+                self._terminate(job.process)
+            cancelados += 1
+        return cancelados
+
+    @staticmethod
+    def _terminate(process):
+        """SIGTERM al grupo de procesos (reanudándolo antes) y SIGKILL si no sale a tiempo."""
+        _signal(process, signal.SIGCONT)  # Por si estaba pausada
+        _signal(process, signal.SIGTERM)
+        asyncio.ensure_future(DownloadManager._kill_later(process))
+
+    @staticmethod
+    async def _kill_later(process):
+        try:
+            await asyncio.wait_for(process.wait(), KILL_GRACE)
+        except asyncio.TimeoutError:
+            _signal(process, signal.SIGKILL)
+
+    async def _run(self, job: DownloadJob):
+        try:
+            async with self._semaphore:
+                if job.cancelled:
+                    raise DownloadCancelled('Descarga cancelada')
+                job.status = 'descargando'
+                await self._notify(job, force=True)
+                filename = await self._download(job)
+            job.status, job.filename = 'terminado', filename
+            job._done.set_result(filename)
+        except Exception as e:
+            job.status = 'cancelado' if isinstance(e, DownloadCancelled) else 'error'
+            job.error = e
+            job._pins.close()  # No hay archivo que proteger
+            job._done.set_exception(e)
+        finally:
+            del self._jobs[job.id]
+            self._finished.append(job)
+            await self._notify(job, force=True)
+
+    def _transfer_args(self):
+        """Argumentos de fragmentos y velocidad para una descarga que empieza ahora."""
+        args = ['--concurrent-fragments', str(self.fragments)]
+        if self.bandwidth.configured:
+            # Nunca más que el enlace; el reparto fino lo hace _pace
+            args += ['--limit-rate', str(int(self.bandwidth.configured))]
+        return args
+
+    def _pin(self, job: DownloadJob, path: str):
+        if self.pin is not None:
+            job._pins.enter_context(self.pin(path))
+
+    async def _download(self, job: DownloadJob) -> str:
+        args = self._transfer_args()
+        temp_dir = None
+        if self.work_dir:
+            temp_dir = os.path.join(self.work_dir, f'.job_{job.id}')
+            os.makedirs(temp_dir, exist_ok=True)
+            self._pin(job, temp_dir)
+            args += ['--paths', f'temp:{temp_dir}']
+        transfer = self.bandwidth.open('download', job.url)
+        try:
+            return await self._run_ytdlp(job, job.cmd[:1] + args + job.cmd[1:], transfer)
+        finally:
+            transfer.close()
+            if temp_dir:
+                # Restos de una descarga cancelada o fallida (el archivo final ya se movió)
+                await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
+
+    async def _pace(self, job: DownloadJob, transfer):
+        """Pausa yt-dlp a ratos mientras vaya más rápido de lo que le corresponde."""
+        saldo = 0.0  # Bytes que aún puede bajar (negativo: se ha adelantado)
+        anterior, antes = transfer.bytes, time.monotonic()
+        while True:
+            await asyncio.sleep(PACE_INTERVAL)
+            ahora = time.monotonic()
+            allowed = transfer.allowed
+            saldo = min(saldo + allowed * (ahora - antes) - (transfer.bytes - anterior),
+                        allowed * PACE_INTERVAL)  # Sin acumular crédito para ráfagas largas
+            anterior, antes = transfer.bytes, ahora
+            if job.cancelled or saldo >= 0:
+                continue
+            _signal(job.process, signal.SIGSTOP)
+            try:
+                await asyncio.sleep(min(-saldo / allowed, PACE_INTERVAL * 5))
+            finally:
+                _signal(job.process, signal.SIGCONT)
+
+    async def _run_ytdlp(self, job: DownloadJob, cmd, transfer) -> str:
+        # Sesión propia: las señales llegan también a ffmpeg y demás hijos de yt-dlp
+        job.process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+        errores = deque(maxlen=STDERR_LINES)
+
+        async def leer_stderr():
+            async for linea in job.process.stderr:
+                errores.append(linea.decode(errors='replace').rstrip())
+
+        lector = asyncio.ensure_future(leer_stderr())
+        ritmo = asyncio.ensure_future(self._pace(job, transfer))
+        filename = None
+        base = ultimo = 0  # downloaded_bytes vuelve a 0 con cada formato (vídeo, audio)
+        try:
+            async for linea in job.process.stdout:
+                linea = linea.decode(errors='replace').strip()
+                if linea.startswith(PROGRESS_PREFIX):
+                    campos = linea[len(PROGRESS_PREFIX):].strip().split('|')
+                    if len(campos) == 4:
+                        job.percent, job.speed, job.eta = (c.strip() for c in campos[:3])
+                        if campos[3].strip().isdigit():
+                            descargado = int(campos[3])
+                            if descargado < ultimo:
+                                base += ultimo
+                            ultimo = descargado
+                            transfer.set_total(base + descargado)
+                        await self._notify(job)
+                elif linea.startswith(FILE_PREFIX):
+                    filename = linea[len(FILE_PREFIX):].strip()
+                    self._pin(job, filename)
+            await lector
+            await job.process.wait()
+        finally:
+            ritmo.cancel()
+            if job.process.returncode is None:
+                # Se canceló quien esperaba (no /cancel): que yt-dlp no siga descargando
+                lector.cancel()
+                self._terminate(job.process)
+
+        if job.cancelled:
+            raise DownloadCancelled('Descarga cancelada')
+        if job.process.returncode != 0:
+            raise Exception(f'Error en yt-dlp: {chr(10).join(errores)}')
+        if not filename or not os.path.exists(filename):
+            raise Exception('yt-dlp no informó del archivo descargado.')
+        return filename
+
+    async def _notify(self, job: DownloadJob, force: bool = False):
+        if job.on_progress is None:
+            return
+        ahora = time.monotonic()
+        if not force and ahora - job._last_notify < PROGRESS_INTERVAL:
+            return
+        job._last_notify = ahora
+        try:
+            await job.on_progress(job)
+        except Exception as e:
+            logger.debug(f"No se pudo actualizar el progreso de la descarga #{job.id}: {e}")
+
+
+async def communicate(process, timeout: float):
+    """process.communicate() con timeout para un yt-dlp auxiliar (sin grupo propio).
+
+    Si vence el timeout o se cancela quien espera, el proceso se mata.
+    """
+    try:
+        return await asyncio.wait_for(process.communicate(), timeout)
+    finally:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+
+def _signal(process, sig):
+    """Envía una señal a yt-dlp y a sus procesos hijos."""
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,141 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+# Índice persistente de descargas.
+#
+# Cada vídeo se identifica por extractor + id + formato pedido. Para cada uno se
+# guarda el archivo local (mientras exista) y los file_id de las partes que ya
+# se subieron a Telegram, de modo que repetir /download o /upload del mismo
+# vídeo termina al instante reutilizando el archivo o reenviando los file_id.
+# Los archivos locales se expulsan por LRU cuando superan DOWNLOAD_CACHE_MB.
+
+INDEX_DB = os.getenv('DOWNLOAD_INDEX_DB', 'downloads.sqlite3')
+DOWNLOAD_CACHE_BUDGET = int(os.getenv('DOWNLOAD_CACHE_MB', str(10 * 1024))) * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    file_path TEXT,
+    size INTEGER,
+    created REAL,
+    last_used REAL
+);
+CREATE INDEX IF NOT EXISTS videos_path ON videos (file_path);
+CREATE TABLE IF NOT EXISTS parts (
+    key TEXT,
+    position INTEGER,
+    file_id TEXT,
+    PRIMARY KEY (key, position)
+);
+"""
+
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com')
+YOUTUBE_PATH = re.compile(r'^/(?:shorts|live|embed)/([\w-]{11})')
+
+
+def youtube_id(url: str):
+    """Saca el id de un vídeo de YouTube de la URL sin preguntar a yt-dlp (o None)."""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    if host == 'youtu.be':
+        video_id = parsed.path.lstrip('/')[:11]
+    elif host in YOUTUBE_HOSTS:
+        match = YOUTUBE_PATH.match(parsed.path)
+        video_id = match.group(1) if match else parse_qs(parsed.query).get('v', [''])[0]
+    else:
+        return None
+    return video_id if re.fullmatch(r'[\w-]{11}', video_id) else None
+
+
+def video_key(extractor: str, video_id: str, fmt: str) -> str:
+    return f'{extractor.lower()}:{video_id}:{fmt}'
+
+
+class MediaIndex:
+    """Índice SQLite de vídeos descargados y sus partes subidas."""
+
+    def __init__(self, path: str = INDEX_DB, budget: int = DOWNLOAD_CACHE_BUDGET):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(SCHEMA)
+
+    def lookup(self, key: str):
+        """(ruta local o None, [file_id, ...]) de un vídeo conocido, o None."""
+        with self._lock, self._db:
+            row = self._db.execute('SELECT file_path FROM videos WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            file_path = row[0]
+            if file_path and not os.path.exists(file_path):
+                # Lo borró alguien: olvidar la copia local pero no los file_id
+                self._db.execute('UPDATE videos SET file_path = NULL, size = 0 WHERE key = ?', (key,))
+                file_path = None
+            file_ids = [r[0] for r in self._db.execute(
+                'SELECT file_id FROM parts WHERE key = ? ORDER BY position', (key,)
+            )]
+            self._db.execute('UPDATE videos SET last_used = ? WHERE key = ?', (time.time(), key))
+            return file_path, file_ids
+
+    def key_for_path(self, file_path: str):
+        """Clave del vídeo descargado en file_path (si lo descargó el bot)."""
+        with self._lock:
+            row = self._db.execute('SELECT key FROM videos WHERE file_path = ?',
+                                   (os.path.abspath(file_path),)).fetchone()
+        return row[0] if row else None
+
+    def store_file(self, key: str, url: str, file_path: str):
+        """Registra un vídeo recién descargado y expulsa copias locales antiguas si hace falta."""
+        now = time.time()
+        file_path = os.path.abspath(file_path)
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT INTO videos (key, url, file_path, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET file_path = excluded.file_path, size = excluded.size, '
+                'last_used = excluded.last_used',
+                (key, url, file_path, os.path.getsize(file_path), now, now)
+            )
+            # Un archivo nuevo invalida las partes subidas de la versión anterior
+            self._db.execute('DELETE FROM parts WHERE key = ?', (key,))
+        self.evict(keep=key)
+
+    def store_parts(self, key: str, file_ids):
+        """Guarda los file_id de las partes subidas (en orden)."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM parts WHERE key = ?', (key,))
+            self._db.executemany('INSERT INTO parts (key, position, file_id) VALUES (?, ?, ?)',
+                                 [(key, i, file_id) for i, file_id in enumerate(file_ids)])
+
+    def forget_parts(self, key: str):
+        """Olvida los file_id (p. ej. si Telegram ya no los acepta)."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM parts WHERE key = ?', (key,))
+
+    def evict(self, keep: str = None) -> int:
+        """Borra del disco las copias locales menos usadas hasta volver al presupuesto."""
+        borrados = []
+        with self._lock, self._db:
+            filas = self._db.execute(
+                'SELECT key, file_path, size FROM videos WHERE file_path IS NOT NULL ORDER BY last_used'
+            ).fetchall()
+            total = sum(size for _, _, size in filas)
+            for key, file_path, size in filas:
+                if total <= self.budget:
+                    break
+                if key == keep:
+                    continue
+                self._db.execute('UPDATE videos SET file_path = NULL, size = 0 WHERE key = ?', (key,))
+                borrados.append(file_path)
+                total -= size
+        for file_path in borrados:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+        return len(borrados)
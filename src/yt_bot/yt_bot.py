@@ -0,0 +1,852 @@
+import os
+import logging
+import asyncio
+from pathlib import Path
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, InputFile
+from telegram.constants import ChatAction
+from telegram.error import BadRequest
+from telegram.ext import (
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+    CallbackContext,
+    ContextTypes
+)
+from vps_core.auth import AllowList
+from vps_core.bandwidth import BandwidthScheduler
+from vps_core.config import load_env
+from vps_core.dirindex import DirectoryIndexes
+from vps_core.hashing import DigestIndex, hash_file, link_duplicate
+from vps_core.janitor import TempJanitor
+from vps_core.log import configurar_logging
+from vps_core.metrics import METRICS_PORT, MetricsSampler
+from vps_core.runner import configure_builder, local_mode, run_application, upload_limit
+from vps_core.checkpoint import UploadCheckpoint
+from vps_core.split import PART_SIZE as SPLIT_PART_SIZE, FilePart, build_manifest, file_parts
+from vps_core.tempdir import ensure_dir
+from yt_bot.downloads import DownloadCancelled, DownloadManager, communicate
+from yt_bot.media_index import MediaIndex, video_key, youtube_id
+
+# Configuración
+load_env()
+TOKEN = os.getenv("YT_TELEGRAM_BOT") 
+AUTHORIZED_USERS = AllowList.from_env("MY_TELEGRAM_ID")
+# Límite de Telegram según el servidor de la API: 50 MB en la nube, 2000 MB con uno local
+MAX_FILE_SIZE = upload_limit('YT')
+PART_SIZE = min(SPLIT_PART_SIZE, MAX_FILE_SIZE)
+LOCAL_MODE = local_mode('YT')  # Los archivos completos se pasan por ruta al servidor local
+TEMP_DIR = "temp_downloads"
+CHUNK_SIZE = 1024 * 1024  # 1MB para chunks de subida
+CONNECT_TIMEOUT = 30
+STATUS_WINDOW = 15 * 60  # Ventana de mín/media/máx en /status
+STATUS_METRICS = [
+    ('⚙️ CPU', 'cpu', '%'),
+    ('📥 Red rx', 'net_rx', 'MB/s'),
+    ('📤 Red tx', 'net_tx', 'MB/s'),
+    ('💿 Disco lectura', 'disk_read', 'MB/s'),
+    ('💿 Disco escritura', 'disk_write', 'MB/s'),
+    ('⬇️ Descargas', 'download', 'MB/s'),
+    ('⬆️ Subidas', 'upload', 'MB/s'),
+]
+UPLOAD_PARALLEL_PARTS = int(os.getenv('UPLOAD_PARALLEL_PARTS', '2'))  # Partes subiéndose a la vez
+YTDLP_FORMAT = os.getenv('YTDLP_FORMAT')  # Selección de formato de yt-dlp (-f), opcional
+MERGE_FORMAT = 'mkv'
+LIST_PAGE_SIZE = 20  # Archivos por página en /list
+LIST_SORTS = {'mtime': '🕒 Recientes', 'size': '📦 Tamaño', 'name': '🔤 Nombre'}
+
+# Configurar logging (cola + hilo en segundo plano, no bloquea el event loop)
+configurar_logging()
+logger = logging.getLogger(__name__)
+
+# Ancho de banda del VPS repartido entre descargas y subidas
+bandwidth = BandwidthScheduler()
+# Limpieza periódica de TEMP_DIR (presupuesto de bytes, edad máxima, sin tocar cookies.txt)
+janitor = TempJanitor([TEMP_DIR])
+# Cola de descargas de yt-dlp (concurrencia limitada, progreso y cancelación).
+# Los archivos de cada descarga en curso quedan fijados para que la limpieza no los toque
+download_manager = DownloadManager(bandwidth=bandwidth, work_dir=TEMP_DIR, pin=janitor.pin)
+# Muestreo en segundo plano de CPU, memoria, disco, red y transferencias
+metrics = MetricsSampler(bandwidth)
+# Vídeos ya descargados/subidos (extractor + id + formato -> archivo local y file_id)
+media_index = MediaIndex()
+# Hash de cada descarga (integridad al subirla y detección de duplicados)
+digest_index = DigestIndex()
+# Contenido de los directorios listados con /list, actualizado por inotify
+dir_indexes = DirectoryIndexes()
+
+def ensure_temp_dir():
+    """Asegura que el directorio temporal existe."""
+    ensure_dir(TEMP_DIR)
+
+def is_authorized(user_id):
+    """Verifica si el usuario está autorizado."""
+    return AUTHORIZED_USERS.allows(user_id)
+
+async def start(update: Update, context: CallbackContext) -> None:
+    """Mensaje de inicio."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    await update.message.reply_text(
+        '👋 Hola! Soy un bot para descargar y subir archivos grandes.\n\n'
+        'Comandos disponibles:\n'
+        '/download <url> - Descargar video de YouTube\n'
+        '/batch <url> [url ...] - Descargar y subir varios vídeos o listas\n'
+        '/jobs - Ver descargas en curso\n'
+        '/cancel [id] - Cancelar descargas\n'
+        '/upload <file_path> - Subir archivo\n'
+        '/list [path] - Listar archivos\n'
+        '/clean - Limpiar archivos temporales\n'
+        '/status - Ver estado del servidor'
+    )
+
+async def download_video(update: Update, context: CallbackContext) -> None:
+    """Descarga un video de YouTube usando yt-dlp."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    if not context.args:
+        await update.message.reply_text('Por favor proporciona una URL. Ejemplo: /download https://youtu.be/ejemplo')
+        return
+    
+    url = ' '.join(context.args)
+    ensure_temp_dir()
+    
+    try:
+        filename = await fetch_video(update, context, url)
+        if filename:
+            await update.message.reply_text(
+                f'✅ Descarga completada: {os.path.basename(filename)}\n'
+                f'📏 Tamaño: {os.path.getsize(filename)/1024/1024:.2f} MB\n'
+                f'Usa /upload {filename} para subirlo.'
+            )
+        
+    except DownloadCancelled:
+        await update.message.reply_text(f'🛑 Descarga de {url} cancelada')
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error al descargar: {str(e)}')
+        logger.error(f"Error al descargar {url}: {e}")
+
+def build_ytdlp_cmd(url: str):
+    """Orden de yt-dlp para descargar un vídeo (con cookies si las hay)."""
+    # Configuración base de yt-dlp (el límite de velocidad lo pone el DownloadManager)
+    cmd = [
+        'yt-dlp',
+        '-o', f'{TEMP_DIR}/%(title)s.%(ext)s',
+        '--merge-output-format', MERGE_FORMAT,
+        '--no-playlist',
+        '--no-mtime',  # Fecha de la descarga, no la del servidor: la limpieza la ve como reciente
+        '--socket-timeout', '30',
+        '--retries', '10',
+        '--fragment-retries', '10',
+        '--extractor-retries', '5',
+        url
+    ]
+    if YTDLP_FORMAT:
+        cmd[1:1] = ['-f', YTDLP_FORMAT]
+    
+    # Añadir cookies si existen
+    cookies_path = os.path.join(TEMP_DIR, 'cookies.txt')
+    if os.path.exists(cookies_path):
+        cmd[1:1] = [  # Insertar después del comando principal
+            '--cookies', cookies_path,
+            '--force-ipv4',
+            '--mark-watched'
+        ]
+    return cmd
+
+async def fetch_video(update: Update, context: CallbackContext, url: str, warn_cookies: bool = True):
+    """Descarga un vídeo (o reutiliza una descarga anterior) y devuelve su ruta.
+    
+    Devuelve None si el vídeo ya estaba subido y se reenvió desde Telegram.
+    """
+    # ¿Ya se descargó o se subió este mismo vídeo con el mismo formato?
+    key = await resolve_video_key(url)
+    cached = media_index.lookup(key) if key else None
+    if cached:
+        local_path, file_ids = cached
+        if local_path:
+            await update.message.reply_text(f'♻️ Reutilizando la descarga anterior de {url}')
+            return local_path
+        if file_ids:
+            if await send_cached_parts(update, context, file_ids, url):
+                return None
+            media_index.forget_parts(key)
+    
+    status_message = await update.message.reply_text(f'⏬ Descargando video de {url}...')
+    cmd = build_ytdlp_cmd(url)
+    if '--cookies' in cmd:
+        logger.info("Usando cookies para la descarga")
+    elif warn_cookies:
+        await update.message.reply_text('⚠️ Descargando sin cookies - Algunos videos pueden requerir autenticación')
+    
+    async def show_progress(job):
+        await status_message.edit_text(f'⏬ {job.describe()}')
+    
+    # yt-dlp informa del progreso y de la ruta final mientras descarga
+    job = download_manager.submit(update.effective_user.id, url, cmd, show_progress)
+    filename = await job.wait()
+    # El trabajo lo tenía fijado hasta ahora; se sigue protegiendo mientras se registra
+    with janitor.pin(filename):
+        await register_download(update, filename)
+        if key:
+            # Puede borrar copias antiguas para respetar DOWNLOAD_CACHE_MB: mejor en un hilo
+            await asyncio.to_thread(media_index.store_file, key, url, filename)
+    return filename
+
+async def register_download(update: Update, filename: str) -> None:
+    """Registra una descarga nueva; si ya había otra idéntica comparten disco.
+    
+    Solo se compara con otras descargas del bot (en TEMP_DIR) y solo se lee
+    el archivo para calcular su hash si alguna tiene el mismo tamaño. La nueva
+    se sustituye por un enlace duro a la anterior: cada una conserva su ruta y
+    se puede borrar (p. ej. al expulsarla del índice) sin afectar a la otra.
+    """
+    candidates = digest_index.same_size(os.path.getsize(filename), exclude=filename, under=TEMP_DIR)
+    if not candidates:
+        # Sin hash: se calcula al subirla o si llega otra descarga del mismo tamaño
+        digest_index.record(filename)
+        return
+    # yt-dlp (y ffmpeg al unir vídeo y audio) escriben el archivo por su cuenta, así
+    # que se lee justo al terminar, cuando aún está en la caché de páginas del sistema
+    digest = await asyncio.to_thread(hash_file, filename)
+    for path, known in candidates:
+        if known is None:
+            # Descarga anterior registrada sin hash: ahora sí hay con quién compararla
+            known = await asyncio.to_thread(hash_file, path)
+            digest_index.record(path, known)
+        if known == digest and await asyncio.to_thread(link_duplicate, path, filename):
+            await update.message.reply_text(
+                f'♻️ {os.path.basename(filename)} es idéntico a {os.path.basename(path)}, '
+                'se comparte el espacio en disco'
+            )
+            break
+    # Después de enlazar: la ruta puede apuntar ya al archivo anterior
+    digest_index.record(filename, digest)
+
+async def expand_urls(urls):
+    """Convierte listas de reproducción en las URL de sus vídeos (sin descargar nada).
+    
+    Cada lista se sustituye por sus vídeos en el mismo sitio que ocupaba entre los argumentos.
+    """
+    async def expand(url: str):
+        # Los vídeos sueltos de YouTube no hace falta preguntárselos a yt-dlp
+        if youtube_id(url) and 'list=' not in url:
+            return [url]
+        process = await asyncio.create_subprocess_exec(
+            'yt-dlp', '--flat-playlist', '--yes-playlist', '--ignore-errors',
+            '--print', '%(webpage_url,url)s', url,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await communicate(process, 300)
+        return [line.strip() for line in stdout.decode(errors='replace').splitlines()
+                if line.strip().startswith('http')]
+    
+    # Las listas se consultan a la vez; el resultado se une en el orden de los argumentos
+    expanded = []
+    for videos in await asyncio.gather(*(expand(url) for url in urls)):
+        expanded.extend(videos)
+    # Quitar repetidos conservando la primera aparición
+    return list(dict.fromkeys(expanded))
+
+async def batch_download(update: Update, context: CallbackContext) -> None:
+    """Descarga varias URL o listas de reproducción y sube cada vídeo en cuanto termina (/batch)."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    if not context.args:
+        await update.message.reply_text('Uso: /batch <url> [url ...] (admite listas de reproducción)')
+        return
+    
+    ensure_temp_dir()
+    try:
+        urls = await expand_urls(context.args)
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error al leer las listas: {str(e)}')
+        return
+    if not urls:
+        await update.message.reply_text('No se encontró ningún vídeo.')
+        return
+    await update.message.reply_text(f'📦 Lote de {len(urls)} vídeos. Empezando...')
+    
+    # Solo se preparan tantos vídeos como descargas simultáneas; las subidas van de una en una
+    slots = asyncio.Semaphore(download_manager.concurrency)
+    upload_lock = asyncio.Lock()
+    
+    async def process(url: str) -> bool:
+        try:
+            async with slots:
+                filename = await fetch_video(update, context, url, warn_cookies=False)
+            if filename:
+                # Que la limpieza no lo borre mientras espera turno para subirse
+                with janitor.pin(filename):
+                    async with upload_lock:
+                        await upload_path(update, context, filename)
+            return True
+        except DownloadCancelled:
+            await update.message.reply_text(f'🛑 Descarga de {url} cancelada')
+        except Exception as e:
+            await update.message.reply_text(f'❌ Error con {url}: {str(e)}')
+            logger.error(f"Error en el lote con {url}: {e}")
+        return False
+    
+    results = await asyncio.gather(*(process(url) for url in urls))
+    await update.message.reply_text(
+        f'🏁 Lote terminado: {sum(results)} de {len(urls)} vídeos completados'
+    )
+
+async def resolve_video_key(url: str):
+    """Clave del vídeo en el índice (extractor:id:formato), o None si no se pudo saber."""
+    fmt = f'{YTDLP_FORMAT or "default"}.{MERGE_FORMAT}'
+    video_id = youtube_id(url)
+    if video_id:
+        return video_key('youtube', video_id, fmt)
+    # Otros sitios: preguntar a yt-dlp sin descargar nada
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'yt-dlp', '--no-playlist', '--skip-download', '--print', '%(extractor_key)s %(id)s', url,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await communicate(process, 60)
+    except Exception as e:
+        logger.warning(f"No se pudo identificar {url}: {e}")
+        return None
+    fields = stdout.decode(errors='replace').split()
+    if process.returncode != 0 or len(fields) != 2:
+        return None
+    return video_key(fields[0], fields[1], fmt)
+
+async def send_cached_parts(update: Update, context: CallbackContext, file_ids, name: str) -> bool:
+    """Reenvía un archivo ya subido usando los file_id de sus partes."""
+    try:
+        await update.message.reply_text(f'♻️ {name} ya estaba subido, reenviando...')
+        for i, file_id in enumerate(file_ids, 1):
+            caption = f'Parte {i}/{len(file_ids)}' if len(file_ids) > 1 else 'Archivo completo'
+            await context.bot.send_document(chat_id=update.effective_chat.id, document=file_id,
+                                            caption=caption)
+        if len(file_ids) > 1:
+            await update.message.reply_text('🧾 Para unir las partes: cat <nombre>.part* > <nombre>')
+        return True
+    except Exception as e:
+        logger.warning(f"No se pudieron reenviar los file_id de {name}: {e}")
+        return False
+
+async def list_jobs(update: Update, context: CallbackContext) -> None:
+    """Lista las descargas en cola, en curso y recientes (/jobs)."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    jobs = download_manager.jobs(update.effective_user.id)
+    if not jobs:
+        await update.message.reply_text('No hay descargas.')
+        return
+    await update.message.reply_text('📋 Descargas:\n' + '\n'.join(job.describe() for job in jobs))
+
+async def cancel_download(update: Update, context: CallbackContext) -> None:
+    """Cancela una descarga (/cancel <id>) o todas las del usuario (/cancel)."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    try:
+        job_id = int(context.args[0].lstrip('#')) if context.args else None
+    except ValueError:
+        await update.message.reply_text('Uso: /cancel [id]')
+        return
+    cancelled = download_manager.cancel(job_id, update.effective_user.id)
+    if cancelled:
+        await update.message.reply_text(f'🛑 {cancelled} descarga(s) cancelada(s)')
+    else:
+        await update.message.reply_text('No hay descargas que cancelar.')
+
+def split_large_file(file_path):
+    """Divide un archivo grande en rangos de bytes (sin copiarlo ni crear archivos nuevos)."""
+    try:
+        return file_parts(file_path, PART_SIZE)
+    
+    except Exception as e:
+        logger.error(f"Error al dividir {file_path}: {e}")
+        raise
+
+
+async def list_files(update: Update, context: CallbackContext) -> None:
+    """Lista los archivos disponibles (paginado, desde el índice del directorio)."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    path = '.' if not context.args else ' '.join(context.args)
+    
+    if not os.path.isdir(path):
+        await update.message.reply_text('❌ La ruta no existe.')
+        return
+    
+    try:
+        # Solo la primera vez se recorre el directorio; después lo mantiene inotify
+        index = await dir_indexes.get(path)
+        text, keyboard = list_page(index, 'mtime', 0)
+        await update.message.reply_text(text, reply_markup=keyboard)
+    
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error al listar archivos: {str(e)}')
+
+def list_page(index, sort: str, page: int):
+    """Texto y botones de una página del listado."""
+    if not index.count:
+        return f'No hay archivos en {index.path}.', None
+    
+    entries, page, pages = index.page(sort, page, LIST_PAGE_SIZE)
+    lines = []
+    for name, size, _ in entries:
+        label = name if len(name) <= 60 else '…' + name[-59:]
+        lines.append(f"{label} ({size/1024/1024:.2f} MB)")
+    text = (
+        f"📂 Contenido de {index.path}:\n"
+        f"📊 Total archivos: {index.count}\n"
+        f"📦 Tamaño total: {index.total_size/1024/1024:.2f} MB\n\n"
+        f"Archivos ({LIST_SORTS[sort]}, página {page + 1}/{pages}):\n" + '\n'.join(lines)
+    )
+    
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"list:{index.id}:{sort}:{page - 1}"))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"list:{index.id}:{sort}:{page + 1}"))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(label, callback_data=f"list:{index.id}:{key}:0")
+                 for key, label in LIST_SORTS.items() if key != sort])
+    return text, InlineKeyboardMarkup(rows)
+
+async def handle_list_page(update: Update, context: CallbackContext) -> None:
+    """Maneja los botones de página y orden de /list."""
+    query = update.callback_query
+    if not is_authorized(update.effective_user.id):
+        await query.answer('No autorizado.')
+        return
+    
+    _, index_id, sort, page = query.data.split(':')
+    index = dir_indexes.by_id(int(index_id))
+    if index is None or sort not in LIST_SORTS:
+        await query.answer('Este listado ya no está disponible, usa /list de nuevo')
+        return
+    
+    await query.answer()
+    text, keyboard = list_page(index, sort, int(page))
+    try:
+        await query.edit_message_text(text, reply_markup=keyboard)
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
+
+async def clean_temp(update: Update, context: CallbackContext) -> None:
+    """Limpia los archivos temporales (salvo cookies.txt y los que están en uso)."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    try:
+        # El borrado va en un hilo: con muchos archivos no bloquea al resto del bot
+        deleted, freed = await janitor.sweep(everything=True)
+        await update.message.reply_text(
+            f'🧹 Eliminados {deleted} archivos temporales.\n'
+            f'💾 Espacio liberado: {freed/1024/1024:.2f} MB'
+        )
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error al limpiar: {str(e)}')
+
+async def server_status(update: Update, context: CallbackContext) -> None:
+    """Muestra el estado del servidor (valores actuales y de los últimos minutos)."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+    
+    try:
+        # Obtener uso de disco
+        disk = os.statvfs('/')
+        disk_total = (disk.f_blocks * disk.f_frsize) / 1024 / 1024 / 1024
+        disk_used = ((disk.f_blocks - disk.f_bfree) * disk.f_frsize) / 1024 / 1024 / 1024
+        disk_percent = (disk_used / disk_total) * 100
+        
+        # Obtener carga del sistema
+        load = os.getloadavg()
+        
+        now = metrics.latest()
+        if now is None:
+            await update.message.reply_text('⏳ Aún no hay métricas, prueba en unos segundos.')
+            return
+        mem_used = now['mem_used'] / 1024 / 1024 / 1024
+        mem_total = now['mem_total'] / 1024 / 1024 / 1024
+        
+        message = (
+            "🖥️ Estado del servidor:\n\n"
+            f"💽 Disco: {disk_used:.2f}/{disk_total:.2f} GB ({disk_percent:.1f}% usado)\n"
+            f"🧠 Memoria: {mem_used:.2f}/{mem_total:.2f} GB ({100 * mem_used / mem_total:.1f}% usado)\n"
+            f"📊 Carga del sistema: {load[0]:.2f}, {load[1]:.2f}, {load[2]:.2f}\n"
+            f"📂 Espacio temporal: {len(os.listdir(TEMP_DIR)) if os.path.isdir(TEMP_DIR) else 0} archivos\n\n"
+            f"Ahora (mín/media/máx en {STATUS_WINDOW // 60} min):\n"
+            + "\n".join(status_line(label, key, unit) for label, key, unit in STATUS_METRICS)
+        )
+        for kind, name, rate in metrics.transfers():
+            message += f"\n{'⬇️' if kind == 'download' else '⬆️'} {name[:40]}: {rate/1024/1024:.2f} MB/s"
+            stats = metrics.summary((kind, name), STATUS_WINDOW)
+            if stats:
+                message += " ({:.2f}/{:.2f}/{:.2f})".format(*(v / 1024 / 1024 for v in stats))
+        
+        await update.message.reply_text(message)
+    
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error al obtener estado: {str(e)}')
+
+def status_line(label: str, key: str, unit: str) -> str:
+    """Valor actual de una métrica y su mínimo/media/máximo reciente."""
+    scale = 1 if unit == '%' else 1024 * 1024
+    now = metrics.latest()[key] / scale
+    stats = metrics.summary(key, STATUS_WINDOW)
+    line = f"{label}: {now:.1f} {unit}"
+    if stats:
+        line += " ({:.1f}/{:.1f}/{:.1f})".format(*(v / scale for v in stats))
+    return line
+        
+async def handle_cookies(update: Update, context: CallbackContext) -> None:
+    """Maneja la subida y validación de cookies."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('⚠️ No autorizado.')
+        return
+    
+    if not update.message.document:
+        await update.message.reply_text('ℹ️ Envía el archivo cookies.txt como documento.')
+        return
+    
+    doc = update.message.document
+    ensure_temp_dir()
+    cookies_path = os.path.join(TEMP_DIR, 'cookies.txt')
+    
+    try:
+        # Validaciones del archivo
+        if not doc.file_name.lower().endswith('.txt'):
+            await update.message.reply_text('❌ El archivo debe ser .txt')
+            return
+            
+        if doc.file_size > 10 * 1024:  # 10KB máximo
+            await update.message.reply_text('❌ Archivo demasiado grande (máx 10KB)')
+            return
+        
+        # Descargar y validar cookies
+        await (await doc.get_file()).download_to_drive(cookies_path)
+        
+        with open(cookies_path, 'r') as f:
+            cookies_content = f.read()
+            if 'youtube.com' not in cookies_content:
+                os.remove(cookies_path)
+                await update.message.reply_text('❌ Cookies inválidas: No contienen datos de YouTube')
+                return
+                
+        await update.message.reply_text('✅ Cookies actualizadas correctamente!')
+        logger.info(f"Cookies actualizadas por {update.effective_user.id}")
+        
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error: {str(e)}')
+        if os.path.exists(cookies_path):
+            os.remove(cookies_path)
+
+async def help_command(update: Update, context: CallbackContext) -> None:
+    """Muestra los comandos disponibles."""
+    if not is_authorized(update.effective_user.id):
+        await update.message.reply_text('No autorizado.')
+        return
+
+    await update.message.reply_text(
+        '📖 *Comandos disponibles:*\n\n'
+        '/start - Mostrar mensaje de bienvenida\n'
+        '/help - Mostrar esta ayuda\n'
+        '/download <url> - Descargar video de YouTube\n'
+        '/batch <url> [url ...] - Descargar y subir varios vídeos o listas\n'
+        '/jobs - Ver descargas en curso\n'
+        '/cancel [id] - Cancelar descargas\n'
+        '/upload <file\\_path> - Subir archivo\n'
+        '/list [path] - Listar archivos\n'
+        '/clean - Limpiar archivos temporales\n'
+        '/status - Ver estado del servidor',
+        parse_mode='Markdown'
+    )
+
+async def send_startup_message(context: ContextTypes.DEFAULT_TYPE):
+    """Envía mensaje de inicio usando el contexto correcto."""
+    for user_id in AUTHORIZED_USERS:
+        try:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=(
+                    "✅ *Bot iniciado correctamente*\\.\n\n"
+                    "📖 *Comandos disponibles:*\n\n"
+                    "/start \\- Mostrar mensaje de bienvenida\n"
+                    "/help \\- Mostrar ayuda\n"
+                    "/download <url> \\- Descargar video de YouTube\n"
+                    "/batch <url> \\.\\.\\. \\- Descargar y subir varios vídeos\n"
+                    "/jobs \\- Ver descargas\n"
+                    "/cancel \\[id\\] \\- Cancelar descargas\n"
+                    "/upload <file\\_path> \\- Subir archivo\n"
+                    "/list \\[path\\] \\- Listar archivos\n"
+                    "/clean \\- Limpiar temporales\n"
+                    "/status \\- Estado del servidor"
+                ),
+                parse_mode='MarkdownV2'
+            )
+        except Exception as e:
+            logger.error(f"Error enviando mensaje a {user_id}: {e}")
+
+async def post_init(application):
+    """Tareas posteriores a la inicialización."""
+    application.create_task(metrics.run())
+    application.create_task(janitor.run())
+    if METRICS_PORT:
+        try:
+            await metrics.serve()
+        except OSError as e:
+            logger.error(f"No se pudo abrir el endpoint de métricas: {e}")
+    await send_startup_message(application)
+
+async def upload_large_file(update: Update, context: CallbackContext, file_path, caption: str = ""):
+    """Sube archivos grandes usando el bot del contexto y devuelve el mensaje enviado.
+    
+    file_path puede ser una ruta o una FilePart (un rango de bytes de otro archivo).
+    """
+    if isinstance(file_path, FilePart):
+        part, own_part = file_path, False
+    elif LOCAL_MODE:
+        return await upload_local_file(update, context, file_path, caption)
+    else:
+        part = FilePart(file_path, 0, os.path.getsize(file_path), os.path.basename(file_path))
+        own_part = True
+    filename = part.name
+    # Espera a que la subida quepa en el enlace y mide su velocidad real
+    # (las subidas tienen prioridad sobre las descargas)
+    transfer = await bandwidth.acquire('upload', filename)
+    part.on_read = transfer.record
+    # Timeout según el tamaño y la velocidad medida en subidas anteriores
+    timeout = bandwidth.timeout_for(part.length, 'upload')
+    try:
+        await context.bot.send_chat_action(
+            chat_id=update.effective_chat.id, 
+            action=ChatAction.UPLOAD_DOCUMENT
+        )
+        
+        await update.message.reply_text(f"⚡ Subiendo {filename}...")
+        
+        # read_file_handle=False: httpx lee el archivo por trozos en lugar de cargarlo entero
+        part.seek(0)
+        message = await context.bot.send_document(
+            chat_id=update.effective_chat.id,
+            document=InputFile(part, filename=filename, read_file_handle=False),
+            caption=caption,
+            read_timeout=timeout,
+            write_timeout=timeout,
+            connect_timeout=CONNECT_TIMEOUT
+        )
+        return message
+        
+    except Exception as e:
+        logger.error(f"Error subiendo {filename}: {e}")
+        raise
+    finally:
+        transfer.close()
+        part.on_read = None
+        # Las FilePart de upload_parts no se cierran aquí: después se necesita su hash
+        if own_part:
+            part.close()
+
+async def upload_local_file(update: Update, context: CallbackContext, file_path: str, caption: str = ""):
+    """Sube un archivo con el servidor local de la Bot API: solo se envía su ruta."""
+    filename = os.path.basename(file_path)
+    size = os.path.getsize(file_path)
+    # El servidor lee el archivo por su cuenta: solo se puede medir al terminar
+    transfer = await bandwidth.acquire('upload', filename)
+    timeout = bandwidth.timeout_for(size, 'upload')
+    try:
+        await update.message.reply_text(f"⚡ Subiendo {filename} desde el disco...")
+        message = await context.bot.send_document(
+            chat_id=update.effective_chat.id,
+            document=Path(file_path).absolute(),  # En modo local se convierte en file://
+            filename=filename,
+            caption=caption,
+            read_timeout=timeout,
+            write_timeout=timeout,
+            connect_timeout=CONNECT_TIMEOUT
+        )
+        transfer.record(size)
+        return message
+    except Exception as e:
+        logger.error(f"Error subiendo {filename}: {e}")
+        raise
+    finally:
+        transfer.close()
+
+async def upload_parts(update: Update, context: CallbackContext, file_path: str, parts):
+    """Sube las partes de un archivo, varias a la vez, guardando un punto de control.
+    
+    Devuelve los file_id de las partes en orden.
+    
+    Las partes que ya constan como enviadas en el punto de control se saltan,
+    así que tras un reinicio se continúa por la primera que falte.
+    """
+    filename = os.path.basename(file_path)
+    checkpoint = UploadCheckpoint(file_path, PART_SIZE)
+    if checkpoint.sent:
+        await update.message.reply_text(
+            f'♻️ Reanudando: {len(checkpoint.sent)}/{len(parts)} partes ya estaban subidas'
+        )
+    semaphore = asyncio.Semaphore(UPLOAD_PARALLEL_PARTS)
+    
+    async def upload_part(i: int, part: FilePart):
+        try:
+            async with semaphore:
+                message = await upload_large_file(update, context, part, f'Parte {i}/{len(parts)} de {filename}')
+            # El hash se calculó mientras se subía; aquí solo se lee si hizo falta releer
+            digest = await asyncio.to_thread(part.compute_digest)
+            checkpoint.mark_sent(i, message.document.file_id, digest)
+            await update.message.reply_text(f'✅ Parte {i} subida')
+        except Exception as e:
+            await update.message.reply_text(f'❌ Error en parte {i}: {str(e)}')
+            raise
+    
+    pending = [upload_part(i, part) for i, part in enumerate(parts, 1) if i not in checkpoint.sent]
+    results = await asyncio.gather(*pending, return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        # Las partes que sí se subieron quedan en el punto de control
+        raise errors[0]
+    
+    # Manifiesto con los hashes de las partes y cómo unirlas
+    manifest = await asyncio.to_thread(build_manifest, file_path, parts, checkpoint.digests())
+    await update.message.reply_document(
+        document=manifest.encode(),
+        filename=f'{filename}.sha256',
+        caption=f'🧾 Para unir las partes: cat "{filename}".part* > "{filename}"'
+    )
+    file_ids = [checkpoint.sent[i]['file_id'] for i in sorted(checkpoint.sent)]
+    checkpoint.remove()
+    return file_ids
+
+async def upload_file(update: Update, context: CallbackContext) -> None:
+    """Maneja la subida de archivos con gestión asíncrona completa."""
+    try:
+        if not is_authorized(update.effective_user.id):
+            await update.message.reply_text('No autorizado.')
+            return
+        
+        if not context.args:
+            await update.message.reply_text('Ejemplo: /upload /ruta/al/archivo.mkv')
+            return
+        
+        file_path = ' '.join(context.args)
+        
+        if not os.path.exists(file_path):
+            await update.message.reply_text(f'❌ Archivo no encontrado: {file_path}')
+            return
+        
+        with janitor.pin(file_path):
+            await upload_path(update, context, file_path)
+            
+    except Exception as e:
+        await update.message.reply_text(f'❌ Error crítico: {str(e)}')
+        logger.error(f"Error en upload_file: {e}", exc_info=True)
+
+async def upload_path(update: Update, context: CallbackContext, file_path: str) -> None:
+    """Sube un archivo (en partes si hace falta), reutilizando file_id si ya se subió."""
+    file_size = os.path.getsize(file_path)
+    filename = os.path.basename(file_path)
+    
+    # Si es un vídeo descargado que ya se subió, reenviar sus file_id
+    key = media_index.key_for_path(file_path)
+    cached = media_index.lookup(key) if key else None
+    if cached and cached[1]:
+        if await send_cached_parts(update, context, cached[1], filename):
+            return
+        media_index.forget_parts(key)
+    
+    if file_size > MAX_FILE_SIZE:
+        await update.message.reply_text(f'✂️ Dividiendo archivo de {file_size/1024/1024:.2f} MB...')
+        parts = split_large_file(file_path)
+        
+        await update.message.reply_text(f'📦 {len(parts)} partes. Iniciando subida...')
+        
+        try:
+            file_ids = await upload_parts(update, context, file_path, parts)
+        finally:
+            for part in parts:
+                part.close()
+        await update.message.reply_text('🎉 Todas las partes subidas exitosamente!')
+        
+    else:
+        # En modo local sube el servidor; si no, el hash se calcula mientras se envía
+        part = None if LOCAL_MODE else FilePart(file_path, 0, file_size, filename)
+        try:
+            message = await upload_large_file(update, context, part or file_path, f'Archivo completo: {filename}')
+            digest = part.digest if part else None
+        finally:
+            if part:
+                part.close()
+        file_ids = [message.document.file_id]
+        await update.message.reply_text('✅ Subida completada')
+        if digest and digest_index.verify(file_path, digest) is False:
+            logger.warning(f"{file_path} no coincide con el hash guardado al descargarlo")
+            await update.message.reply_text(
+                f'⚠️ {filename} no coincide con el hash guardado al descargarlo (¿datos dañados en disco?)'
+            )
+    
+    if key:
+        media_index.store_parts(key, file_ids)
+
+def main():
+    """Configuración principal del bot."""
+    # concurrent_updates: /jobs y /cancel responden mientras hay descargas en curso
+    builder = ApplicationBuilder() \
+        .token(TOKEN) \
+        .http_version('1.1') \
+        .get_updates_http_version('1.1') \
+        .post_init(post_init)
+    application = configure_builder(builder, 'YT').build()
+
+    # Handlers
+    handlers = [
+        CommandHandler("start", start),
+        CommandHandler("help", help_command),
+        CommandHandler("download", download_video),
+        CommandHandler("batch", batch_download),
+        CommandHandler("jobs", list_jobs),
+        CommandHandler("cancel", cancel_download),
+        CommandHandler("upload", upload_file),
+        CommandHandler("list", list_files),
+        CallbackQueryHandler(handle_list_page, pattern=r'^list:'),
+        CommandHandler("clean", clean_temp),
+        CommandHandler("status", server_status),
+        MessageHandler(filters.Document.ALL, handle_cookies)
+    ]
+
+    # Manejo de errores global
+    application.add_error_handler(error_handler)
+    
+    for handler in handlers:
+        application.add_handler(handler)
+
+    # Ejecutar el bot (polling o webhook según BOT_MODE)
+    run_application(application, 'YT')
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Maneja errores no capturados."""
+    logger.error("Excepción no capturada:", exc_info=context.error)
+    
+    # Los botones de /list llegan como callback query, sin update.message
+    if isinstance(update, Update) and update.effective_message:
+        await update.effective_message.reply_text(f'⚠️ Error interno: {context.error}')
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
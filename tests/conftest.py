@@ -0,0 +1,66 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Servidor falso de la Bot API para las pruebas.
+#
+# Responde a getMe y a los envíos con un mensaje mínimo y guarda cada petición
+# (método, Content-Type y cuerpo) para comprobar qué se envió.
+
+BOT = {'id': 1, 'is_bot': True, 'first_name': 'prueba', 'username': 'prueba_bot'}
+CHAT = {'id': 5, 'type': 'private'}
+DOCUMENT = {'file_id': 'F1', 'file_unique_id': 'U1', 'file_name': 'archivo.bin', 'file_size': 1}
+
+
+class FakeBotAPI:
+    """Peticiones recibidas por el servidor falso."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.requests = []  # [(método, Content-Type, cuerpo)]
+
+    def calls(self, method: str):
+        return [r for r in self.requests if r[0] == method]
+
+
+def _result(method: str):
+    if method == 'getMe':
+        return BOT
+    if method.startswith('send'):
+        mensaje = {'message_id': 2, 'date': 0, 'chat': CHAT}
+        if method == 'sendDocument':
+            mensaje['document'] = DOCUMENT
+        return mensaje
+    return True
+
+
+@pytest.fixture
+def fake_bot_api():
+    api = None
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            method = self.path.rsplit('/', 1)[-1]
+            api.requests.append((method, self.headers.get('Content-Type', ''), body))
+            datos = json.dumps({'ok': True, 'result': _result(method)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        do_GET = do_POST
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    api = FakeBotAPI(f'http://127.0.0.1:{server.server_address[1]}')
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    yield api
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from vps_core import bandwidth as bw
+from vps_core.bandwidth import MIN_RATE, TIMEOUT_MAX, TIMEOUT_MIN, BandwidthScheduler
+
+
+def measured(transfer, rate: float, age: float = 10):
+    """Deja una transferencia como si llevara age segundos a rate bytes/s."""
+    transfer.rate = rate
+    transfer.started = time.monotonic() - age
+    transfer._last_time = time.monotonic()
+    return transfer
+
+
+def test_allowed_splits_by_priority_but_lends_unused_bandwidth():
+    scheduler = BandwidthScheduler(capacity=300)
+    subida = measured(scheduler.open('upload', 'u'), 200)
+    descarga = measured(scheduler.open('download', 'd'), 100)
+    assert scheduler.allowed(subida) == 200
+    assert scheduler.allowed(descarga) == 100
+    subida.rate = 20  # La subida no usa su parte: la descarga puede aprovecharla
+    assert scheduler.allowed(descarga) == 280
+
+
+def test_unknown_capacity_does_not_limit():
+    scheduler = BandwidthScheduler(capacity=0)
+    assert scheduler.allowed(scheduler.open('download')) == float('inf')
+    assert scheduler.has_room('upload', 2)
+
+
+def test_timeout_grows_with_size_and_measured_rate():
+    scheduler = BandwidthScheduler(capacity=0)
+    assert scheduler.timeout_for(1) == TIMEOUT_MIN
+    assert scheduler.timeout_for(10 ** 15) == TIMEOUT_MAX
+    assert scheduler.timeout_for(100 * MIN_RATE) == pytest.approx(300)
+    transfer = scheduler.open('upload')
+    transfer.bytes, transfer.started = 100 * MIN_RATE * 4, time.monotonic() - 100
+    transfer.close()
+    assert scheduler.timeout_for(100 * MIN_RATE) == pytest.approx(75, rel=0.01)
+
+
+def test_another_upload_fits_only_while_uploads_leave_part_of_their_share():
+    scheduler = BandwidthScheduler(capacity=1000)
+    primera = measured(scheduler.open('upload', 'a'), 200)
+    assert scheduler.has_room('upload', 2)  # Limitada por Telegram, no por el enlace
+    measured(scheduler.open('upload', 'b'), 200)
+    assert scheduler.has_room('upload', 2)
+    primera.rate = 700  # Entre las dos ya llenan el enlace
+    assert not scheduler.has_room('upload', 2)
+    assert scheduler.has_room('download', 1)  # Sin descargas activas siempre cabe
+
+
+def test_new_transfer_is_measured_before_admitting_another():
+    scheduler = BandwidthScheduler(capacity=1000)
+    measured(scheduler.open('upload', 'a'), 10, age=0)
+    assert not scheduler.has_room('upload', 2)
+
+
+def test_acquire_waits_until_there_is_room(monkeypatch):
+    monkeypatch.setattr(bw, 'ADMIT_INTERVAL', 0.01)
+    scheduler = BandwidthScheduler(capacity=1000)
+    llena = measured(scheduler.open('upload', 'a'), 1000)
+
+    async def main():
+        espera = asyncio.ensure_future(scheduler.acquire('upload', 'b'))
+        await asyncio.sleep(0.05)
+        assert not espera.done()
+        llena.close()
+        transfer = await asyncio.wait_for(espera, 1)
+        assert transfer.name == 'b'
+        assert scheduler.active('upload') == [transfer]
+
+    asyncio.run(main())
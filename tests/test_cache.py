@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from unzip_bot.cache import ArchiveCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArchiveCache(str(tmp_path / 'cache.sqlite3'))
+
+
+def test_lookup_returns_members_in_archive_order(cache):
+    cache.store('A', 'a.zip', [('b.txt', 'D2', 2, 'fid_b'), ('a.txt', 'D1', 1, 'fid_a')])
+    assert cache.lookup('A') == [('b.txt', 'fid_b'), ('a.txt', 'fid_a')]
+    assert cache.lookup('X') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_same_content_under_another_name_keeps_both_file_ids(cache):
+    cache.store('A', 'a.zip', [('docs/a.txt', 'D', 1, 'fid_a')])
+    cache.store('C', 'c.zip', [('other/renamed.txt', 'D', 1, 'fid_c')])
+    # Reenviar A no puede mandar el file_id que Telegram muestra como renamed.txt
+    assert cache.lookup('A') == [('docs/a.txt', 'fid_a')]
+    assert cache.lookup('C') == [('other/renamed.txt', 'fid_c')]
+    assert cache.blob_file_id('D', 'a.txt') == 'fid_a'
+    assert cache.blob_file_id('D', 'renamed.txt') == 'fid_c'
+    assert cache.blob_file_id('D', 'otro.txt') is None
+
+
+def test_forgotten_file_id_is_a_miss_until_stored_again(cache):
+    cache.store('A', 'a.zip', [('a.txt', 'D1', 1, 'fid_a'), ('b.txt', 'D2', 1, 'fid_b')])
+    cache.forget_file_ids(['fid_b'])
+    assert cache.lookup('A') is None
+    cache.store_blobs([('b.txt', 'D2', 1, 'fid_b2')])
+    assert cache.lookup('A') == [('a.txt', 'fid_a'), ('b.txt', 'fid_b2')]
+
+
+def test_invalidate_keeps_the_same_content_under_other_names(cache):
+    cache.store('A', 'a.zip', [('a.txt', 'D', 1, 'fid_a')])
+    cache.store('C', 'c.zip', [('c.txt', 'D', 1, 'fid_c')])
+    cache.invalidate('A')
+    assert cache.lookup('A') is None
+    assert cache.lookup('C') == [('c.txt', 'fid_c')]
+
+
+def test_evict_drops_least_recently_used_archives(tmp_path):
+    cache = ArchiveCache(str(tmp_path / 'cache.sqlite3'), max_entries=1)
+    cache.store('A', 'a.zip', [('a.txt', 'D1', 1, 'fid_a')])
+    cache.store('B', 'b.zip', [('b.txt', 'D2', 1, 'fid_b')])
+    assert cache.lookup('A') is None
+    assert cache.lookup('B') == [('b.txt', 'fid_b')]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_migrates_blobs_keyed_by_digest_only(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    db = sqlite3.connect(path)
+    db.executescript(
+        'CREATE TABLE blobs (digest TEXT PRIMARY KEY, file_id TEXT, size INTEGER, last_used REAL, file_name TEXT);'
+        "INSERT INTO blobs VALUES ('D1', 'fid_1', 1, 0, 'a.txt');"
+        "INSERT INTO blobs VALUES ('D2', 'fid_2', 1, 0, NULL);"
+    )
+    db.close()
+    cache = ArchiveCache(path)
+    assert cache.blob_file_id('D1', 'a.txt') == 'fid_1'
+    assert cache.stats()['blobs'] == 1  # Sin nombre no se puede reutilizar
+    cache.store_blobs([('b.txt', 'D1', 1, 'fid_b')])
+    assert cache.blob_file_id('D1', 'a.txt') == 'fid_1'
+    assert cache.blob_file_id('D1', 'b.txt') == 'fid_b'
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from vps_core.checkpoint import UploadCheckpoint
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'video.mkv'
+    path.write_bytes(b'x' * 1000)
+    return path
+
+
+def test_resume_after_restart_continues_with_the_missing_parts(tmp_path, video):
+    directorio = str(tmp_path / 'checkpoints')
+    checkpoint = UploadCheckpoint(str(video), 400, directorio)
+    assert checkpoint.sent == {}
+    checkpoint.mark_sent(2, 'id2', 'hash2')
+    checkpoint.mark_sent(1, 'id1')
+    # Reinicio del bot: un objeto nuevo lee lo guardado en disco
+    reanudado = UploadCheckpoint(str(video), 400, directorio)
+    assert reanudado.sent == {1: {'file_id': 'id1', 'sha256': None}, 2: {'file_id': 'id2', 'sha256': 'hash2'}}
+    assert reanudado.digests() == {2: 'hash2'}
+    assert os.listdir(directorio) == [os.path.basename(reanudado.path)]  # Sin temporales
+    reanudado.remove()
+    reanudado.remove()
+    assert UploadCheckpoint(str(video), 400, directorio).sent == {}
+
+
+def test_changed_file_or_part_size_starts_from_scratch(tmp_path, video):
+    directorio = str(tmp_path / 'checkpoints')
+    UploadCheckpoint(str(video), 400, directorio).mark_sent(1, 'id1')
+    assert UploadCheckpoint(str(video), 500, directorio).sent == {}
+    video.write_bytes(b'y' * 1001)
+    assert UploadCheckpoint(str(video), 400, directorio).sent == {}
+    checkpoint = UploadCheckpoint(str(video), 400, directorio)
+    checkpoint.mark_sent(1, 'id1')
+    os.utime(video, ns=(0, 0))  # Mismo tamaño pero reescrito
+    assert UploadCheckpoint(str(video), 400, directorio).sent == {}
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path, video):
+    directorio = str(tmp_path / 'checkpoints')
+    checkpoint = UploadCheckpoint(str(video), 400, directorio)
+    with open(checkpoint.path, 'w') as f:
+        f.write('{"key": ')  # Corte a mitad de una escritura antigua
+    assert UploadCheckpoint(str(video), 400, directorio).sent == {}
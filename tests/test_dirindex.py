@@ -0,0 +1,134 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from vps_core.dirindex import SORTS, DirectoryIndex, DirectoryIndexes
+
+
+def write(path, size: int, mtime: float):
+    path.write_bytes(b'x' * size)
+    os.utime(path, (mtime, mtime))
+
+
+def index_of(path) -> DirectoryIndex:
+    index = DirectoryIndex(str(path), 1)
+    index.replace(index.scan())
+    return index
+
+
+def listing(index: DirectoryIndex, sort: str):
+    entries, _, _ = index.page(sort, 0, 1000)
+    return entries
+
+
+@pytest.mark.parametrize('sort', list(SORTS))
+def test_views_follow_events_without_rescanning(tmp_path, sort):
+    rng = random.Random(sort)
+    for i in range(30):
+        write(tmp_path / f'f{i:02d}', rng.randrange(100), 1000 + rng.randrange(50))
+    index = index_of(tmp_path)
+    listing(index, sort)  # La vista se ordena una vez aquí
+
+    for paso in range(200):
+        name = f'f{rng.randrange(40):02d}'
+        if rng.random() < 0.3:
+            (tmp_path / name).unlink(missing_ok=True)
+        else:
+            write(tmp_path / name, rng.randrange(100), 1000 + rng.randrange(50))
+        index.update(name)
+        assert listing(index, sort) == listing(index_of(tmp_path), sort), paso
+    assert index.total_size == index_of(tmp_path).total_size
+
+
+def test_page_orders_and_clamps(tmp_path):
+    write(tmp_path / 'b', 30, 1000)
+    write(tmp_path / 'A', 10, 3000)
+    write(tmp_path / 'c', 20, 2000)
+    index = index_of(tmp_path)
+    assert [e[0] for e in listing(index, 'mtime')] == ['A', 'c', 'b']
+    assert [e[0] for e in listing(index, 'size')] == ['b', 'c', 'A']
+    assert [e[0] for e in listing(index, 'name')] == ['A', 'b', 'c']
+    assert index.page('name', 0, 2) == ([('A', 10, 3000), ('b', 30, 1000)], 0, 2)
+    assert index.page('name', 9, 2) == ([('c', 20, 2000)], 1, 2)
+    assert index.page('name', -1, 2)[1] == 0
+
+
+async def until(condicion, timeout: float = 2):
+    """Espera a que inotify entregue los eventos y se cumpla la condición."""
+    for _ in range(int(timeout / 0.01)):
+        if condicion():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('no llegó el evento')
+
+
+def test_concurrent_first_lookups_share_one_scan(tmp_path, monkeypatch):
+    write(tmp_path / 'a', 1, 1000)
+    recorridos = []
+    scan = DirectoryIndex.scan
+    monkeypatch.setattr(DirectoryIndex, 'scan', lambda self: (recorridos.append(self.path), scan(self))[1])
+
+    async def main():
+        indexes = DirectoryIndexes()
+        primero, segundo = await asyncio.gather(indexes.get(str(tmp_path)), indexes.get(str(tmp_path) + '/'))
+        assert primero is segundo
+        assert await indexes.get(str(tmp_path)) is primero
+        assert recorridos == [str(tmp_path)]
+
+    asyncio.run(main())
+
+
+def test_inotify_keeps_the_index_up_to_date(tmp_path):
+    async def main():
+        indexes = DirectoryIndexes()
+        index = await indexes.get(str(tmp_path))
+        if index.wd is None:
+            pytest.skip('inotify no disponible')
+        assert index.count == 0
+        write(tmp_path / 'nuevo', 10, 1000)
+        await until(lambda: index.entries.get('nuevo') == (10, 1000))
+        (tmp_path / 'nuevo').rename(tmp_path / 'movido')
+        (tmp_path / 'sub').mkdir()  # Los subdirectorios no cuentan
+        await until(lambda: list(index.entries) == ['movido'])
+        assert index.total_size == 10
+        (tmp_path / 'movido').unlink()
+        await until(lambda: index.count == 0 and index.total_size == 0)
+
+    asyncio.run(main())
+
+
+def test_least_recently_used_directories_are_dropped(tmp_path):
+    dirs = [tmp_path / name for name in ('a', 'b', 'c')]
+    for d in dirs:
+        d.mkdir()
+
+    async def main():
+        indexes = DirectoryIndexes(max_dirs=2)
+        a = await indexes.get(str(dirs[0]))
+        b = await indexes.get(str(dirs[1]))
+        assert await indexes.get(str(dirs[0])) is a  # a pasa a ser el más reciente
+        c = await indexes.get(str(dirs[2]))
+        assert indexes.by_id(b.id) is None and b.wd is None
+        assert indexes.by_id(a.id) is a and indexes.by_id(c.id) is c
+        assert await indexes.get(str(dirs[1])) is not b  # Se vuelve a indexar con otro id
+
+    asyncio.run(main())
+
+
+def test_deleted_directory_is_forgotten(tmp_path):
+    carpeta = tmp_path / 'carpeta'
+    carpeta.mkdir()
+
+    async def main():
+        indexes = DirectoryIndexes()
+        index = await indexes.get(str(carpeta))
+        if index.wd is None:
+            pytest.skip('inotify no disponible')
+        carpeta.rmdir()
+        await until(lambda: indexes.by_id(index.id) is None)
+        with pytest.raises(OSError):
+            await indexes.get(str(carpeta))
+
+    asyncio.run(main())
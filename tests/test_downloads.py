@@ -0,0 +1,206 @@
+import asyncio
+import os
+import stat
+import sys
+import textwrap
+import time
+
+import pytest
+
+from yt_bot.downloads import DownloadCancelled, DownloadManager, communicate
+from vps_core.bandwidth import BandwidthScheduler
+from vps_core.janitor import TempJanitor
+
+# yt-dlp falso: un script que ignora sus argumentos e imprime lo que haría yt-dlp
+# con las plantillas de DownloadManager (progreso y ruta final).
+
+
+def fake_ytdlp(tmp_path, body: str) -> str:
+    script = tmp_path / 'yt-dlp'
+    script.write_text(f'#!{sys.executable}\nimport os, subprocess, sys, time\n' + textwrap.dedent(body))
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    return str(script)
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+async def wait_pids(path, n: int):
+    for _ in range(200):
+        if path.exists() and len(path.read_text().split()) == n:
+            return [int(p) for p in path.read_text().split()]
+        await asyncio.sleep(0.02)
+    raise AssertionError('el yt-dlp falso no arrancó')
+
+
+async def wait_dead(pids):
+    for _ in range(200):
+        if not any(alive(pid) for pid in pids):
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError(f'siguen vivos: {[p for p in pids if alive(p)]}')
+
+
+def test_download_reports_progress_and_final_file(tmp_path):
+    final = tmp_path / 'video.mkv'
+    cmd = fake_ytdlp(tmp_path, f'''
+        print('[progreso]  50.0%|1.00MiB/s|00:01|512', flush=True)
+        open({str(final)!r}, 'wb').write(b'x' * 1024)
+        print('[archivo] {final}', flush=True)
+    ''')
+
+    async def main():
+        manager = DownloadManager(bandwidth=BandwidthScheduler(capacity=0))
+        vistos = []
+
+        async def on_progress(job):
+            vistos.append((job.status, job.percent))
+
+        job = manager.submit(1, 'https://video', [cmd], on_progress)
+        assert await job.wait() == str(final)
+        assert job.status == 'terminado'
+        assert ('descargando', None) in vistos
+        assert manager.jobs(1) == [job]
+
+    asyncio.run(main())
+
+
+def test_failed_download_reports_stderr(tmp_path):
+    cmd = fake_ytdlp(tmp_path, '''
+        print('ERROR: vídeo no disponible', file=sys.stderr)
+        sys.exit(1)
+    ''')
+
+    async def main():
+        job = DownloadManager(bandwidth=BandwidthScheduler(capacity=0)).submit(1, 'u', [cmd])
+        with pytest.raises(Exception, match='vídeo no disponible'):
+            await job.wait()
+        assert job.status == 'error'
+
+    asyncio.run(main())
+
+
+def test_cancel_terminates_the_whole_process_group(tmp_path):
+    pids = tmp_path / 'pids'
+    cmd = fake_ytdlp(tmp_path, f'''
+        hijo = subprocess.Popen(['sleep', '30'])
+        open({str(pids)!r}, 'w').write(f'{{os.getpid()}} {{hijo.pid}}')
+        time.sleep(30)
+    ''')
+
+    async def main():
+        manager = DownloadManager(bandwidth=BandwidthScheduler(capacity=0))
+        job = manager.submit(7, 'u', [cmd])
+        procesos = await wait_pids(pids, 2)
+        assert manager.cancel(user_id=7) == 1
+        with pytest.raises(DownloadCancelled):
+            await job.wait()
+        await wait_dead(procesos)
+
+    asyncio.run(main())
+
+
+def test_cancelled_task_does_not_leave_ytdlp_running(tmp_path):
+    pids = tmp_path / 'pids'
+    cmd = fake_ytdlp(tmp_path, f'''
+        hijo = subprocess.Popen(['sleep', '30'])
+        open({str(pids)!r}, 'w').write(f'{{os.getpid()}} {{hijo.pid}}')
+        time.sleep(30)
+    ''')
+
+    async def main():
+        manager = DownloadManager(bandwidth=BandwidthScheduler(capacity=0))
+        manager.submit(1, 'u', [cmd])
+        procesos = await wait_pids(pids, 2)
+        # Como al apagar el bot: se cancela la tarea que espera a yt-dlp, no el trabajo
+        for tarea in asyncio.all_tasks():
+            if tarea is not asyncio.current_task():
+                tarea.cancel()
+        await wait_dead(procesos)
+
+    asyncio.run(main())
+
+
+def test_communicate_kills_the_process_on_timeout():
+    async def main():
+        process = await asyncio.create_subprocess_exec('sleep', '30', stdout=asyncio.subprocess.PIPE)
+        inicio = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            await communicate(process, 0.1)
+        await asyncio.wait_for(process.wait(), 2)
+        assert time.monotonic() - inicio < 2
+
+    asyncio.run(main())
+
+
+def test_job_files_are_pinned_until_wait_returns(tmp_path):
+    trabajo = tmp_path / 'descargas'
+    trabajo.mkdir()
+    final, seguir = trabajo / 'video.mkv', tmp_path / 'seguir'
+    cmd = fake_ytdlp(tmp_path, f'''
+        temp = sys.argv[sys.argv.index('--paths') + 1].split(':', 1)[1]
+        open(os.path.join(temp, 'video.mkv.part'), 'wb').write(b'x' * 10)
+        os.utime(os.path.join(temp, 'video.mkv.part'), (0, 0))
+        open({str(final)!r}, 'wb').write(b'x' * 100)
+        os.utime({str(final)!r}, (0, 0))
+        print('[archivo] {final}', flush=True)
+        while not os.path.exists({str(seguir)!r}):
+            time.sleep(0.02)
+    ''')
+    janitor = TempJanitor([str(trabajo)], budget=1, max_age=1, grace=0)
+
+    async def main():
+        manager = DownloadManager(bandwidth=BandwidthScheduler(capacity=0), work_dir=str(trabajo),
+                                  pin=janitor.pin)
+        job = manager.submit(1, 'u', [cmd])
+        for _ in range(200):
+            if os.path.realpath(final) in janitor._pins:
+                break
+            await asyncio.sleep(0.02)
+        temp_dir = trabajo / f'.job_{job.id}'
+        assert await janitor.sweep(everything=True) == (0, 0)
+        assert (temp_dir / 'video.mkv.part').exists() and final.exists()
+        seguir.touch()
+        assert await job.wait() == str(final)
+        assert not temp_dir.exists()
+        assert janitor._pins == {}
+        assert await janitor.sweep() == (1, 100)
+
+    asyncio.run(main())
+
+
+def test_batch_runs_only_concurrency_downloads_with_fragment_args(tmp_path):
+    seguir = tmp_path / 'seguir'
+    cmd = fake_ytdlp(tmp_path, f'''
+        open(os.path.join({str(tmp_path)!r}, f'argv_{{os.getpid()}}'), 'w').write('\\n'.join(sys.argv[1:]))
+        while not os.path.exists({str(seguir)!r}):
+            time.sleep(0.02)
+        final = os.path.join({str(tmp_path)!r}, sys.argv[-1])
+        open(final, 'wb').write(b'x')
+        print('[archivo]', final, flush=True)
+    ''')
+
+    async def main():
+        manager = DownloadManager(concurrency=2, fragments=8, bandwidth=BandwidthScheduler(capacity=1000))
+        jobs = [manager.submit(1, f'v{i}', [cmd, f'v{i}.mkv']) for i in range(5)]
+        for _ in range(200):
+            if len(list(tmp_path.glob('argv_*'))) == 2:
+                break
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.1)
+        assert len(list(tmp_path.glob('argv_*'))) == 2
+        assert [job.status for job in jobs] == ['descargando'] * 2 + ['en cola'] * 3
+        argv = next(tmp_path.glob('argv_*')).read_text().split('\n')
+        assert argv[argv.index('--concurrent-fragments') + 1] == '8'
+        assert argv[argv.index('--limit-rate') + 1] == '1000'
+        seguir.touch()
+        resultados = await asyncio.gather(*(job.wait() for job in jobs))
+        assert resultados == [str(tmp_path / f'v{i}.mkv') for i in range(5)]
+        assert {job.status for job in jobs} == {'terminado'}
+
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from unzip_bot.extractor import (
+    ExtractionCancelled, ExtractionError, ExtractionTimeout, ExtractorPool, iter_extract
+)
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_zip(path, members: dict) -> str:
+    with zipfile.ZipFile(path, 'w') as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return str(path)
+
+
+def stuck_archive(tmp_path) -> str:
+    """Un FIFO sin escritor: el proceso hijo se queda bloqueado al abrirlo."""
+    path = tmp_path / 'atascado.zip'
+    os.mkfifo(path)
+    return str(path)
+
+
+def test_pool_extracts_in_a_child_process(tmp_path):
+    archivo = make_zip(tmp_path / 'a.zip', {'uno.txt': b'1', 'dir/dos.txt': b'22', '../fuera.txt': b'x'})
+    destino = tmp_path / 'salida'
+
+    async def main():
+        pool = ExtractorPool(max_workers=2, timeout=30)
+        resultado = await pool.extract('j1', 'ana', archivo, str(destino), 'zip')
+        assert resultado == {str(destino / 'uno.txt'): sha256(b'1'), str(destino / 'dir' / 'dos.txt'): sha256(b'22'),
+                             str(destino / 'fuera.txt'): sha256(b'x')}
+        assert await pool.list('j2', 'ana', archivo, 'zip') == [('uno.txt', 1), ('dir/dos.txt', 2), ('../fuera.txt', 1)]
+        assert pool.active_jobs() == []
+
+    asyncio.run(main())
+    assert not (tmp_path / 'fuera.txt').exists()
+
+
+def test_errors_in_the_child_are_reported(tmp_path):
+    roto = tmp_path / 'roto.zip'
+    roto.write_bytes(b'esto no es un zip')
+
+    async def main():
+        with pytest.raises(ExtractionError, match='BadZipFile'):
+            await ExtractorPool(max_workers=1, timeout=30).extract('j', 'ana', str(roto), str(tmp_path), 'zip')
+
+    asyncio.run(main())
+
+
+def test_timeout_kills_the_child(tmp_path):
+    archivo = stuck_archive(tmp_path)
+
+    async def main():
+        pool = ExtractorPool(max_workers=1, timeout=30)
+        with pytest.raises(ExtractionTimeout):
+            await pool.list('j', 'ana', archivo, 'zip', timeout=0.5)
+        assert pool._processes == {} and pool.active_jobs() == []
+        # El semáforo quedó libre para el siguiente
+        ok = make_zip(tmp_path / 'ok.zip', {'a': b'a'})
+        assert await asyncio.wait_for(pool.list('k', 'ana', ok, 'zip'), 30) == [('a', 1)]
+
+    asyncio.run(main())
+
+
+def test_cancel_owner_stops_running_and_queued_jobs_only_for_that_user(tmp_path):
+    atascado = stuck_archive(tmp_path)
+    ok = make_zip(tmp_path / 'ok.zip', {'a': b'a'})
+
+    async def main():
+        pool = ExtractorPool(max_workers=1, timeout=30)
+        en_curso = asyncio.ensure_future(pool.list('j1', 'ana', atascado, 'zip'))
+        en_espera = asyncio.ensure_future(pool.list('j2', 'ana', ok, 'zip'))
+        for _ in range(100):
+            if 'j1' in pool._processes:
+                break
+            await asyncio.sleep(0.05)
+        proceso = pool._processes['j1']
+        assert sorted(pool.active_jobs('ana')) == ['j1', 'j2']
+        otro = asyncio.ensure_future(pool.list('j3', 'bea', ok, 'zip'))
+        await asyncio.sleep(0)
+        assert pool.cancel_owner('ana') == 2
+        for tarea in (en_curso, en_espera):
+            with pytest.raises(ExtractionCancelled):
+                await asyncio.wait_for(tarea, 10)
+        assert not proceso.is_alive()
+        assert await asyncio.wait_for(otro, 30) == [('a', 1)]
+        assert not pool.cancel('j1')
+
+    asyncio.run(main())
+
+
+def test_stream_keeps_at_most_lookahead_files_ahead_of_the_consumer(tmp_path):
+    miembros = {f'{i:02}.bin': bytes([i]) * 1000 for i in range(6)}
+    archivo = make_zip(tmp_path / 'a.zip', miembros)
+    destino = tmp_path / 'salida'
+
+    async def main():
+        pool = ExtractorPool(max_workers=1, timeout=30)
+        recibidos = []
+        async for path, digest in pool.stream('j', 'ana', archivo, str(destino), 'zip', lookahead=2):
+            await asyncio.sleep(0.2)  # Envío lento: el hijo tiene tiempo de adelantarse
+            en_disco = [p for p in destino.iterdir()]
+            assert len(en_disco) <= 2, en_disco
+            assert digest == sha256(open(path, 'rb').read())
+            recibidos.append(os.path.basename(path))
+            os.unlink(path)  # Como send_streamed_files: se borra antes de pedir el siguiente
+        assert recibidos == list(miembros)
+        assert pool.active_jobs() == [] and pool._processes == {}
+
+    asyncio.run(main())
+
+
+def test_stream_reports_errors_and_stops_the_child(tmp_path):
+    roto = tmp_path / 'roto.tar'
+    roto.write_bytes(b'esto no es un tar' * 100)
+
+    async def main():
+        pool = ExtractorPool(max_workers=1, timeout=30)
+        with pytest.raises(ExtractionError):
+            async for _ in pool.stream('j', 'ana', str(roto), str(tmp_path / 'salida'), 'tar'):
+                pass
+        assert pool._processes == {}
+
+    asyncio.run(main())
+
+
+def test_tar_is_streamed_in_archive_order(tmp_path):
+    origen = tmp_path / 'origen'
+    origen.mkdir()
+    nombres = ['b.txt', 'a.txt', 'c.txt']
+    with tarfile.open(tmp_path / 'a.tar.gz', 'w:gz') as tar:
+        for nombre in nombres:
+            (origen / nombre).write_bytes(nombre.encode())
+            tar.add(origen / nombre, arcname=f'dir/{nombre}')
+    salida = tmp_path / 'salida'
+    assert [os.path.basename(p) for p, _ in iter_extract(str(tmp_path / 'a.tar.gz'), str(salida), 'tar:gz')] == nombres
+    assert (salida / 'dir' / 'a.txt').read_bytes() == b'a.txt'
+
+
+def test_7z_is_decompressed_in_a_single_pass(tmp_path, monkeypatch):
+    py7zr = pytest.importorskip('py7zr')
+    if 'factory' not in inspect.signature(py7zr.SevenZipFile.extract).parameters:
+        pytest.skip('py7zr < 1.0 no admite escritores propios')
+    origen = tmp_path / 'origen'
+    origen.mkdir()
+    archivo = tmp_path / 'solido.7z'
+    with py7zr.SevenZipFile(archivo, 'w') as z:
+        for i in range(20):
+            (origen / f'{i:02}.txt').write_bytes(f'miembro {i}\n'.encode() * 500)
+            z.write(origen / f'{i:02}.txt', f'{i:02}.txt')
+
+    llamadas = []
+    extract = py7zr.SevenZipFile.extract
+
+    @functools.wraps(extract)
+    def contar(self, *args, **kwargs):
+        llamadas.append(kwargs)
+        return extract(self, *args, **kwargs)
+
+    monkeypatch.setattr(py7zr.SevenZipFile, 'extract', contar)
+    salida = tmp_path / 'salida'
+    pedidos = []
+    # before_member ve cuántos archivos están ya terminados cuando py7zr pide el siguiente
+    before_member = lambda: pedidos.append(len(list(salida.glob('*.txt'))) if salida.exists() else 0)
+    resultado = list(iter_extract(str(archivo), str(salida), '7z', before_member))
+
+    assert len(llamadas) == 1
+    assert [os.path.basename(p) for p, _ in resultado] == [f'{i:02}.txt' for i in range(20)]
+    assert all(d == sha256(f'miembro {i}\n'.encode() * 500) for i, (_, d) in enumerate(resultado))
+    assert pedidos == list(range(20))  # Cada miembro se pide tras terminar el anterior
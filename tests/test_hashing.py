@@ -0,0 +1,69 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from vps_core.hashing import DigestIndex, HashingWriter, copy_hashed, hash_file, link_duplicate
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return DigestIndex(str(tmp_path / 'digests.sqlite3'))
+
+
+def test_hash_while_writing_matches_hash_of_the_file(tmp_path):
+    datos = os.urandom(3 * 1024 * 1024 + 7)
+    destino = tmp_path / 'copia'
+    with open(destino, 'wb') as f:
+        assert copy_hashed(io.BytesIO(datos), f) == sha256(datos)
+    assert hash_file(str(destino)) == sha256(datos)
+    writer = HashingWriter(io.BytesIO())
+    writer.write(b'ab')
+    writer.write(b'c')
+    assert (writer.size, writer.hexdigest()) == (3, sha256(b'abc'))
+
+
+def test_same_size_only_returns_unchanged_files_under_the_directory(tmp_path, index):
+    descargas = tmp_path / 'descargas'
+    descargas.mkdir()
+    a, b, fuera = descargas / 'a', descargas / 'b', tmp_path / 'fuera'
+    for path in (a, b, fuera):
+        path.write_bytes(b'1234')
+        index.record(str(path))
+    index.record(str(b), sha256(b'1234'))
+    assert sorted(index.same_size(4, exclude=str(a), under=str(descargas))) == [(str(b), sha256(b'1234'))]
+    assert index.same_size(5) == []
+    b.write_bytes(b'12345')  # Cambió: se olvida
+    assert index.same_size(4, under=str(descargas)) == [(str(a), None)]
+    assert index.digest(str(b)) is None
+
+
+def test_verify_fills_a_missing_digest_and_detects_damage(tmp_path, index):
+    path = tmp_path / 'video'
+    path.write_bytes(b'contenido')
+    assert index.verify(str(path), sha256(b'contenido')) is None  # No registrado
+    assert index.digest(str(path)) is None
+    index.record(str(path))
+    assert index.verify(str(path), sha256(b'contenido')) is None  # Se rellena con el de la subida
+    assert index.digest(str(path)) == sha256(b'contenido')
+    assert index.verify(str(path), sha256(b'contenido')) is True
+    assert index.verify(str(path), sha256(b'otro')) is False
+
+
+def test_link_duplicate_shares_the_inode_but_names_stay_independent(tmp_path):
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    a.write_bytes(b'mismo')
+    b.write_bytes(b'mismo')
+    assert link_duplicate(str(a), str(b))
+    assert os.path.samefile(a, b)
+    assert not link_duplicate(str(a), str(b))  # Ya comparten disco
+    a.unlink()
+    assert b.read_bytes() == b'mismo'
+    assert not (tmp_path / 'b.enlace').exists()
+    assert not link_duplicate(str(tmp_path / 'no_existe'), str(b))
+    assert b.read_bytes() == b'mismo'
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from vps_core.janitor import TempJanitor
+
+HORA = 3600
+
+
+def write(path, size: int, age: float):
+    """Archivo de size bytes usado por última vez hace age segundos."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'x' * size)
+    cuando = time.time() - age
+    os.utime(path, (cuando, cuando))
+    return path
+
+
+def sweep(janitor, everything: bool = False):
+    return asyncio.run(janitor.sweep(everything))
+
+
+def test_budget_evicts_least_recently_used_first(tmp_path):
+    viejo = write(tmp_path / 'viejo', 100, 3 * HORA)
+    medio = write(tmp_path / 'medio', 100, 2 * HORA)
+    nuevo = write(tmp_path / 'nuevo', 100, 1 * HORA)
+    janitor = TempJanitor([str(tmp_path)], budget=150, max_age=0, grace=60)
+    assert sweep(janitor) == (2, 200)
+    assert not viejo.exists() and not medio.exists() and nuevo.exists()
+    assert sweep(janitor) == (0, 0)
+
+
+def test_max_age_and_grace(tmp_path):
+    caducado = write(tmp_path / 'sub' / 'caducado', 10, 25 * HORA)
+    reciente = write(tmp_path / 'reciente', 10, 1 * HORA)
+    escribiendo = write(tmp_path / 'video.part', 10, 0)
+    janitor = TempJanitor([str(tmp_path)], budget=0, max_age=24 * HORA, grace=60)
+    assert sweep(janitor) == (1, 10)
+    assert not caducado.exists() and reciente.exists()
+    assert sweep(janitor, everything=True) == (1, 10)
+    assert escribiendo.exists()  # Dentro del periodo de gracia ni con everything
+
+
+def test_pinned_paths_and_cookies_are_never_deleted(tmp_path):
+    trabajo = tmp_path / 'job_1'
+    en_trabajo = write(trabajo / 'dentro' / 'extraido.bin', 100, 48 * HORA)
+    fijado = write(tmp_path / 'subiendo.mkv', 100, 48 * HORA)
+    activo = write(tmp_path / 'activo.mkv', 100, 48 * HORA)
+    cookies = write(tmp_path / 'cookies.txt', 100, 48 * HORA)
+    suelto = write(tmp_path / 'suelto', 100, 48 * HORA)
+    janitor = TempJanitor([str(tmp_path), str(tmp_path / 'no_existe')], budget=1, max_age=HORA, grace=0,
+                          pinned=lambda: [str(activo)])
+    with janitor.pin(str(trabajo)), janitor.pin(str(fijado)):
+        with janitor.pin(str(fijado)):
+            pass  # Los pins se cuentan: salir de uno no libera el otro
+        assert sweep(janitor, everything=True) == (1, 100)
+        assert (trabajo / 'dentro').is_dir()
+    assert not suelto.exists()
+    assert all(p.exists() for p in (en_trabajo, fijado, activo, cookies))
+    assert sweep(janitor) == (2, 200)
+    assert not en_trabajo.exists() and not fijado.exists() and activo.exists() and cookies.exists()
+    assert not trabajo.exists()  # Sin el pin se quitan también los directorios vacíos
+
+
+def test_pins_follow_symlinks(tmp_path):
+    real = write(tmp_path / 'real' / 'video.mkv', 10, 48 * HORA)
+    enlace = tmp_path / 'enlace'
+    enlace.symlink_to(tmp_path / 'real')
+    janitor = TempJanitor([str(tmp_path)], budget=0, max_age=HORA, grace=0)
+    with janitor.pin(str(enlace / 'video.mkv')):
+        assert sweep(janitor) == (0, 0)
+    assert real.exists()
+
+
+def test_run_keeps_going_after_errors(tmp_path, monkeypatch):
+    janitor = TempJanitor([str(tmp_path)], interval=0)
+    pasadas = []
+
+    def fallar(pins, everything):
+        pasadas.append(1)
+        raise OSError('disco')
+
+    monkeypatch.setattr(janitor, '_sweep', fallar)
+
+    async def main():
+        tarea = asyncio.ensure_future(janitor.run())
+        while len(pasadas) < 3:
+            await asyncio.sleep(0.01)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+
+    asyncio.run(main())
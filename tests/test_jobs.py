@@ -0,0 +1,162 @@
+import asyncio
+import os
+import shutil
+from collections import namedtuple
+
+import pytest
+
+from unzip_bot.jobs import JobCancelled, JobRejected, JobScheduler
+
+Uso = namedtuple('Uso', 'total used free')
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    """Disco falso con 1000 bytes libres (se puede cambiar con disk.free)."""
+    class Disco:
+        free = 1000
+    monkeypatch.setattr(shutil, 'disk_usage', lambda path: Uso(10 ** 6, 0, Disco.free))
+    return Disco
+
+
+async def run_jobs(scheduler, pedidos, orden):
+    """Lanza un trabajo por (usuario, nombre) y anota en qué orden consiguen turno."""
+    async def trabajo(user_id, nombre):
+        async with scheduler.job(user_id):
+            orden.append(nombre)
+            await asyncio.sleep(0.01)
+    await asyncio.gather(*(trabajo(u, n) for u, n in pedidos))
+
+
+def test_turns_are_shared_round_robin_between_users(tmp_path, disk):
+    async def main():
+        scheduler = JobScheduler(root=str(tmp_path), max_jobs=1, max_per_user=1)
+        orden = []
+        pedidos = [('ana', 'a1'), ('ana', 'a2'), ('ana', 'a3'), ('bea', 'b1'), ('bea', 'b2'), ('cris', 'c1')]
+        await run_jobs(scheduler, pedidos, orden)
+        assert orden == ['a1', 'b1', 'c1', 'a2', 'b2', 'a3']
+        assert scheduler.queued() == 0 and scheduler._running == 0
+
+    asyncio.run(main())
+
+
+def test_global_and_per_user_limits(tmp_path, disk):
+    async def main():
+        scheduler = JobScheduler(root=str(tmp_path), max_jobs=2, max_per_user=1)
+        entrar, salir = asyncio.Event(), asyncio.Event()
+        dentro = []
+
+        async def trabajo(user_id):
+            async with scheduler.job(user_id):
+                dentro.append(user_id)
+                entrar.set()
+                await salir.wait()
+
+        tareas = [asyncio.ensure_future(trabajo(u)) for u in ('ana', 'ana', 'bea', 'cris')]
+        await asyncio.sleep(0.05)
+        assert dentro == ['ana', 'bea']
+        assert scheduler.will_wait('cris') and scheduler.queued() == 2
+        salir.set()
+        await asyncio.gather(*tareas)
+        assert sorted(dentro) == ['ana', 'ana', 'bea', 'cris']
+        assert not scheduler.will_wait('ana')
+
+    asyncio.run(main())
+
+
+def test_cancel_owner_only_touches_queued_jobs_and_skips_cancelled_waiters(tmp_path, disk):
+    async def main():
+        scheduler = JobScheduler(root=str(tmp_path), max_jobs=1, max_per_user=1)
+        salir = asyncio.Event()
+        orden = []
+
+        async def trabajo(user_id, nombre):
+            async with scheduler.job(user_id):
+                orden.append(nombre)
+                await salir.wait()
+
+        en_curso = asyncio.ensure_future(trabajo('ana', 'a1'))
+        await asyncio.sleep(0)
+        en_cola = asyncio.ensure_future(trabajo('ana', 'a2'))
+        abandonado = asyncio.ensure_future(trabajo('bea', 'b1'))
+        siguiente = asyncio.ensure_future(trabajo('cris', 'c1'))
+        await asyncio.sleep(0)
+        abandonado.cancel()  # El usuario se fue mientras esperaba
+        await asyncio.sleep(0)
+        assert scheduler.cancel_owner('ana') == 1
+        with pytest.raises(JobCancelled):
+            await en_cola
+        salir.set()
+        await asyncio.gather(en_curso, siguiente)
+        assert orden == ['a1', 'c1']
+        assert scheduler._running == 0 and scheduler.queued() == 0
+
+    asyncio.run(main())
+
+
+def test_reserve_waits_for_released_space_and_rejects_the_impossible(tmp_path, disk):
+    async def main():
+        scheduler = JobScheduler(root=str(tmp_path), max_jobs=2, max_per_user=2, disk_reserve=100,
+                                 admission_timeout=5)
+        liberar = asyncio.Event()
+        reservado = asyncio.Event()
+
+        async def grande():
+            async with scheduler.job('ana') as job:
+                await job.reserve(800)
+                reservado.set()
+                await liberar.wait()
+
+        primero = asyncio.ensure_future(grande())
+        await reservado.wait()
+        async with scheduler.job('bea') as job:
+            with pytest.raises(JobRejected):
+                await job.reserve(901)  # Ni con todo el disco libre cabría
+            espera = asyncio.ensure_future(job.reserve(500))
+            await asyncio.sleep(0.05)
+            assert not espera.done()
+            assert scheduler.free_space() == 100
+            liberar.set()
+            await asyncio.wait_for(espera, 1)
+            assert job.reserved == 500 and scheduler.free_space() == 400
+        await primero
+        assert scheduler._reserved == 0
+
+    asyncio.run(main())
+
+
+def test_reserve_gives_up_after_the_admission_timeout(tmp_path, disk):
+    async def main():
+        scheduler = JobScheduler(root=str(tmp_path), max_jobs=2, max_per_user=2, disk_reserve=0,
+                                 admission_timeout=0.1)
+        async with scheduler.job('ana') as ocupa, scheduler.job('bea') as job:
+            await ocupa.reserve(600)
+            with pytest.raises(JobRejected, match='Tiempo de espera'):
+                await job.reserve(600)
+            assert job.reserved == 0
+
+    asyncio.run(main())
+
+
+def test_workspace_is_removed_unless_kept(tmp_path, disk):
+    async def main():
+        scheduler = JobScheduler(root=str(tmp_path))
+        async with scheduler.job('ana') as job:
+            assert scheduler.workspaces() == {job.workspace}
+            open(os.path.join(job.workspace, 'archivo'), 'w').close()
+        assert not os.path.exists(job.workspace)
+        async with scheduler.job('ana') as job:
+            job.keep_workspace = True
+        assert os.path.isdir(job.workspace) and scheduler.workspaces() == set()
+
+    asyncio.run(main())
+
+
+def test_check_archive_rejects_bombs(tmp_path, disk):
+    async def main():
+        async with JobScheduler(root=str(tmp_path)).job('ana') as job:
+            assert job.check_archive(1000, [('a', 500), ('b', 500)]) == 1000
+            with pytest.raises(JobRejected, match='Ratio'):
+                job.check_archive(10, [('bomba', 10 ** 6)])
+
+    asyncio.run(main())
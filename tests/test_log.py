@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+# Cada prueba configura el logging en un proceso aparte: configurar_logging()
+# cambia el logger raíz y solo tiene efecto la primera vez.
+
+SRC = str(Path(__file__).resolve().parents[1] / 'src')
+
+
+def run(codigo: str, cwd):
+    entorno = dict(os.environ, PYTHONPATH=SRC)
+    subprocess.run([sys.executable, '-c', textwrap.dedent(codigo)], cwd=cwd, env=entorno, check=True, timeout=60)
+
+
+def log_lines(tmp_path, nombre: str = 'app.log'):
+    lineas = []
+    for path in tmp_path.glob(f'{nombre}*'):
+        lineas += path.read_text(encoding='utf-8').splitlines()
+    return lineas
+
+
+def test_prefork_workers_log_through_the_supervisor(tmp_path):
+    run('''
+        import logging, os
+        from vps_core.log import configurar_logging, detener_logging, preparar_workers
+        configurar_logging(archivo='app.log', formato='%(process)d %(message)s', max_bytes=20000, backups=50)
+        preparar_workers()
+        hijos = []
+        for w in range(4):
+            pid = os.fork()
+            if pid == 0:
+                for i in range(500):
+                    logging.info(f'worker {w} linea {i} ' + 'x' * 40)
+                detener_logging()
+                os._exit(0)
+            hijos.append(pid)
+        for pid in hijos:
+            os.waitpid(pid, 0)
+        logging.info('supervisor fin')
+        detener_logging()
+    ''', tmp_path)
+    lineas = log_lines(tmp_path)
+    assert len(list(tmp_path.glob('app.log.*'))) > 1  # Hubo rotación
+    mensajes = [linea.split(' ', 1)[1] for linea in lineas]
+    esperados = [f'worker {w} linea {i} ' + 'x' * 40 for w in range(4) for i in range(500)]
+    assert sorted(mensajes) == sorted(esperados + ['supervisor fin'])
+
+
+def test_worker_exceptions_reach_the_supervisor(tmp_path):
+    run('''
+        import logging, os
+        from vps_core.log import configurar_logging, detener_logging, preparar_workers
+        configurar_logging(archivo='app.log', json_logs=True)
+        preparar_workers()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                logging.exception('fallo en %s', 'worker')
+            detener_logging()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        detener_logging()
+    ''', tmp_path)
+    registro, = [json.loads(linea) for linea in log_lines(tmp_path)]
+    assert registro['msg'] == 'fallo en worker'
+    assert registro['level'] == 'ERROR'
+    assert 'ZeroDivisionError' in registro['exc']
+    assert registro['pid'] != os.getpid()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    run('''
+        import logging, sys, threading
+        import vps_core.log as log
+        log.QUEUE_SIZE = 10
+        log.configurar_logging(archivo='app.log')
+        bloqueo = threading.Event()
+        handler = log._estado['handlers'][0]
+        emitir = handler.emit
+        handler.emit = lambda record: (bloqueo.wait(), emitir(record))  # Disco atascado
+        for i in range(100):
+            logging.info(f'linea {i}')
+        assert log.registros_descartados() > 0, log.registros_descartados()
+        bloqueo.set()
+        log.detener_logging()
+    ''', tmp_path)
+    assert 0 < len(log_lines(tmp_path)) < 100
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from yt_bot.media_index import MediaIndex, video_key, youtube_id
+
+
+@pytest.fixture
+def index(tmp_path):
+    return MediaIndex(str(tmp_path / 'downloads.sqlite3'), budget=250)
+
+
+def video(tmp_path, name: str, size: int = 100):
+    path = tmp_path / name
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10',
+    'https://youtu.be/dQw4w9WgXcQ?si=abc',
+    'https://m.youtube.com/shorts/dQw4w9WgXcQ',
+    ' https://music.youtube.com/watch?list=x&v=dQw4w9WgXcQ ',
+])
+def test_youtube_id_from_url(url):
+    assert youtube_id(url) == 'dQw4w9WgXcQ'
+
+
+@pytest.mark.parametrize('url', ['https://vimeo.com/123', 'https://www.youtube.com/watch?v=corto',
+                                 'https://www.youtube.com/playlist?list=PL123', 'no es una url'])
+def test_youtube_id_needs_ytdlp_for_anything_else(url):
+    assert youtube_id(url) is None
+
+
+def test_lookup_returns_the_file_and_uploaded_parts(tmp_path, index):
+    key = video_key('Youtube', 'dQw4w9WgXcQ', 'best')
+    assert key == 'youtube:dQw4w9WgXcQ:best'
+    assert index.lookup(key) is None
+    path = video(tmp_path, 'a.mkv')
+    index.store_file(key, 'u', path)
+    assert index.lookup(key) == (path, [])
+    assert index.key_for_path(path) == key
+    index.store_parts(key, ['p1', 'p2'])
+    assert index.lookup(key) == (path, ['p1', 'p2'])
+    index.store_file(key, 'u', path)  # Descargado de nuevo: las partes ya no valen
+    assert index.lookup(key) == (path, [])
+
+
+def test_deleted_file_keeps_the_file_ids(tmp_path, index):
+    path = video(tmp_path, 'a.mkv')
+    index.store_file('k', 'u', path)
+    index.store_parts('k', ['p1'])
+    (tmp_path / 'a.mkv').unlink()
+    assert index.lookup('k') == (None, ['p1'])
+    index.forget_parts('k')
+    assert index.lookup('k') == (None, [])
+
+
+def test_least_recently_used_files_are_evicted_over_budget(tmp_path, index):
+    for name in ('a', 'b'):
+        index.store_file(name, 'u', video(tmp_path, name))
+        time.sleep(0.01)
+    index.lookup('a')  # a pasa a ser la más reciente
+    index.store_file('c', 'u', video(tmp_path, 'c'))
+    assert not (tmp_path / 'b').exists()
+    assert index.lookup('b') == (None, [])
+    assert (tmp_path / 'a').exists() and (tmp_path / 'c').exists()
+    # La recién descargada no se expulsa aunque no quepa
+    index.store_file('grande', 'u', video(tmp_path, 'grande', 1000))
+    assert (tmp_path / 'grande').exists()
+    assert not (tmp_path / 'a').exists() and not (tmp_path / 'c').exists()
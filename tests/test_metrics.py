@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from vps_core.metrics import TRANSFER_METRIC, MetricsSampler
+
+
+class FakeBandwidth:
+    def __init__(self):
+        self.rates = {}  # (tipo, nombre) -> bytes/s
+
+    def active(self):
+        return [SimpleNamespace(kind=kind, name=name, current_rate=lambda rate=rate: rate)
+                for (kind, name), rate in self.rates.items()]
+
+
+def reading(t: float, net_rx: int = 0):
+    return {'time': t, 'cpu': (int(t * 10), int(t * 40)), 'disk': (0, 0), 'net': (net_rx, 0),
+            'mem': (1024, 4096)}
+
+
+def sampler_with(bandwidth, rates_per_sample):
+    sampler = MetricsSampler(bandwidth, history=10)
+    sampler.sample(reading(0))
+    for i, rates in enumerate(rates_per_sample, 1):
+        bandwidth.rates = rates
+        sampler.sample(reading(i, net_rx=i * 1000))
+    return sampler
+
+
+def test_sample_rates_and_first_reading_is_only_a_reference():
+    sampler = MetricsSampler(history=10)
+    assert sampler.sample(reading(0)) is None
+    muestra = sampler.sample(reading(2, net_rx=4000))
+    assert muestra['net_rx'] == 2000
+    assert muestra['cpu'] == 25
+    assert muestra['mem_used'] == 1024
+    assert muestra['jobs'] == {}
+
+
+def test_history_keeps_per_job_rates():
+    bandwidth = FakeBandwidth()
+    sampler = sampler_with(bandwidth, [
+        {('download', 'a'): 100.0},
+        {('download', 'a'): 300.0, ('upload', 'b'): 50.0},
+        {('upload', 'b'): 70.0},
+    ])
+    assert sampler.transfers() == [('upload', 'b', 70.0)]
+    assert sampler.summary(('download', 'a'), 3600) == (100.0, 200.0, 300.0)
+    assert sampler.summary(('upload', 'b'), 3600) == (50.0, 60.0, 70.0)
+    assert sampler.summary(('upload', 'x'), 3600) is None
+    assert sampler.summary('download', 3600) == (0.0, 400 / 3, 300.0)
+
+
+def test_ring_buffer_is_bounded():
+    sampler = sampler_with(FakeBandwidth(), [{}] * 25)
+    assert len(sampler.samples) == 10
+
+
+def test_prometheus_groups_families_and_includes_job_windows():
+    bandwidth = FakeBandwidth()
+    sampler = sampler_with(bandwidth, [{('download', 'v"1'): 100.0}, {('download', 'v"1'): 300.0}])
+    texto = sampler.prometheus()
+    assert 'vps_network_receive_bytes_per_second 1000.0' in texto
+    assert f'{TRANSFER_METRIC}{{kind="download",name="v\\"1"}} 300.0' in texto
+    assert f'{TRANSFER_METRIC}_window{{kind="download",name="v\\"1",stat="avg"}} 200.0' in texto
+    # Cada familia aparece en un solo bloque, tras su # TYPE
+    familias = [linea.split()[2] for linea in texto.splitlines() if linea.startswith('# TYPE')]
+    assert len(familias) == len(set(familias))
+    vistas = []
+    for linea in texto.splitlines():
+        if not linea.startswith('#'):
+            familia = linea.split('{')[0].split()[0]
+            if not vistas or vistas[-1] != familia:
+                vistas.append(familia)
+    assert len(vistas) == len(set(vistas))
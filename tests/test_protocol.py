@@ -0,0 +1,42 @@
+import pytest
+
+from basic_messaging.protocol import (
+    CABECERA, MAX_PAYLOAD, TIPO_LOTE, TIPO_SALUDO, ErrorProtocolo, LectorTramas, codificar_lote,
+    codificar_trama, decodificar_lote
+)
+
+
+def test_frames_split_across_reads_come_out_whole_and_in_order():
+    datos = (codificar_trama(TIPO_SALUDO, 'hola soy ñandú'.encode()) + codificar_trama(TIPO_LOTE, b'')
+             + codificar_trama(TIPO_SALUDO, b'x' * 1000))
+    lector = LectorTramas()
+    tramas = []
+    for i in range(len(datos)):  # Un byte por lectura: el peor caso
+        tramas += lector.alimentar(datos[i:i + 1])
+    assert tramas == [(TIPO_SALUDO, 'hola soy ñandú'.encode()), (TIPO_LOTE, b''), (TIPO_SALUDO, b'x' * 1000)]
+    assert lector.pendiente == 0
+
+
+def test_pipelined_frames_in_one_read():
+    lector = LectorTramas()
+    datos = b''.join(codificar_trama(TIPO_SALUDO, str(i).encode()) for i in range(100))
+    tramas = lector.alimentar(datos + datos[:3])
+    assert [payload for _, payload in tramas] == [str(i).encode() for i in range(100)]
+    assert lector.pendiente == 3
+
+
+def test_max_payload_is_enforced_before_buffering_the_body():
+    assert len(codificar_trama(TIPO_SALUDO, b'x' * MAX_PAYLOAD)) == CABECERA.size + MAX_PAYLOAD
+    with pytest.raises(ErrorProtocolo):
+        codificar_trama(TIPO_SALUDO, b'x' * (MAX_PAYLOAD + 1))
+    lector = LectorTramas()
+    # Basta la cabecera para rechazarla, sin esperar al megabyte de datos
+    with pytest.raises(ErrorProtocolo):
+        lector.alimentar(CABECERA.pack(MAX_PAYLOAD + 1, TIPO_SALUDO))
+
+
+def test_batch_payload_roundtrip_and_validation():
+    assert decodificar_lote(codificar_lote(['ana', 'josé'])) == ['ana', 'josé']
+    for malo in (b'{"a": 1}', b'[1, 2]', b'no es json', b'\xff'):
+        with pytest.raises(ErrorProtocolo):
+            decodificar_lote(malo)
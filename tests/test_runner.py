@@ -0,0 +1,150 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pytest
+
+from vps_core.runner import (
+    CLOUD_UPLOAD_LIMIT, LOCAL_UPLOAD_LIMIT, configure_builder, local_mode, run_application, upload_limit
+)
+
+telegram_ext = pytest.importorskip('telegram.ext')
+
+CONTENIDO = b'contenido-del-archivo-' * 64
+
+
+@pytest.fixture
+def clean_env(monkeypatch):
+    for name in ('TELEGRAM_API_URL', 'TELEGRAM_LOCAL_MODE', 'BOT_MODE', 'WEBHOOK_URL', 'WEBHOOK_PORT',
+                 'WEBHOOK_SECRET', 'WEBHOOK_PATH', 'MAX_CONCURRENT_UPDATES'):
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(f'TEST_{name}', raising=False)
+    return monkeypatch
+
+
+def send_document(path: Path):
+    """Construye la aplicación con la configuración del entorno y envía un documento."""
+    builder = telegram_ext.ApplicationBuilder().token('123:abc')
+    application = configure_builder(builder, 'TEST').build()
+
+    async def enviar():
+        async with application.bot as bot:
+            await bot.send_document(chat_id=5, document=path.absolute())
+
+    asyncio.run(enviar())
+
+
+def test_upload_limit_follows_local_mode(clean_env):
+    assert not local_mode('TEST')
+    assert upload_limit('TEST') == CLOUD_UPLOAD_LIMIT
+    clean_env.setenv('TELEGRAM_LOCAL_MODE', '1')
+    assert upload_limit('TEST') == LOCAL_UPLOAD_LIMIT
+    # La variable con prefijo manda sobre la común
+    clean_env.setenv('TEST_TELEGRAM_LOCAL_MODE', 'no')
+    assert upload_limit('TEST') == CLOUD_UPLOAD_LIMIT
+
+
+def test_local_mode_requires_api_url(clean_env):
+    clean_env.setenv('TEST_TELEGRAM_LOCAL_MODE', '1')
+    with pytest.raises(RuntimeError):
+        configure_builder(telegram_ext.ApplicationBuilder().token('123:abc'), 'TEST')
+
+
+def test_api_url_uploads_bytes_without_local_mode(clean_env, fake_bot_api, tmp_path):
+    clean_env.setenv('TEST_TELEGRAM_API_URL', fake_bot_api.url)
+    archivo = tmp_path / 'archivo.bin'
+    archivo.write_bytes(CONTENIDO)
+
+    send_document(archivo)
+
+    (_, content_type, body), = fake_bot_api.calls('sendDocument')
+    assert content_type.startswith('multipart/form-data')
+    assert CONTENIDO in body
+
+
+def test_local_mode_sends_file_uri_without_bytes(clean_env, fake_bot_api, tmp_path):
+    clean_env.setenv('TEST_TELEGRAM_API_URL', fake_bot_api.url + '/')
+    clean_env.setenv('TEST_TELEGRAM_LOCAL_MODE', 'true')
+    archivo = tmp_path / 'archivo.bin'
+    archivo.write_bytes(CONTENIDO)
+
+    send_document(archivo)
+
+    assert fake_bot_api.calls('getMe')
+    (_, content_type, body), = fake_bot_api.calls('sendDocument')
+    # Solo viaja la ruta: el servidor local lee el archivo del disco
+    assert not content_type.startswith('multipart/form-data')
+    assert parse_qs(body.decode())['document'] == [archivo.absolute().as_uri()]
+    assert CONTENIDO not in body
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def post_update(port: int, path: str, secret: str = None) -> int:
+    """Entrega un update al webhook como lo haría Telegram y devuelve el código HTTP."""
+    update = {'update_id': 1, 'message': {'message_id': 1, 'date': 0, 'chat': {'id': 5, 'type': 'private'},
+                                          'text': '/start'}}
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/{path}', data=json.dumps(update).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    if secret:
+        request.add_header('X-Telegram-Bot-Api-Secret-Token', secret)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_webhook_mode_registers_and_checks_secret(clean_env, fake_bot_api):
+    pytest.importorskip('tornado')  # Extra [webhooks]
+    port = free_port()
+    clean_env.setenv('TEST_TELEGRAM_API_URL', fake_bot_api.url)
+    clean_env.setenv('TEST_BOT_MODE', 'webhook')
+    clean_env.setenv('TEST_WEBHOOK_URL', 'https://bot.example/')
+    clean_env.setenv('TEST_WEBHOOK_PORT', str(port))
+    clean_env.setenv('TEST_WEBHOOK_SECRET', 's3cr3t')
+    clean_env.setenv('TEST_MAX_CONCURRENT_UPDATES', '32')
+    application = configure_builder(telegram_ext.ApplicationBuilder().token('123:abc'), 'TEST').build()
+    assert application.update_processor.max_concurrent_updates == 32
+
+    recibidos = []
+
+    async def on_update(update, context):
+        recibidos.append(update.update_id)
+        context.application.stop_running()
+
+    application.add_handler(telegram_ext.TypeHandler(object, on_update))
+    codigos = []
+
+    def telegram():
+        # Espera a que el servidor del webhook escuche y entrega un update sin y con secreto
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        codigos.append(post_update(port, 'test'))
+        codigos.append(post_update(port, 'test', 's3cr3t'))
+
+    hilo = threading.Thread(target=telegram, daemon=True)
+    hilo.start()
+    run_application(application, 'TEST')
+    hilo.join(5)
+
+    assert codigos == [403, 200]
+    assert recibidos == [1]
+    (_, _, body), = fake_bot_api.calls('setWebhook')
+    datos = parse_qs(body.decode())
+    assert datos['url'] == ['https://bot.example/test']
+    assert datos['secret_token'] == ['s3cr3t']
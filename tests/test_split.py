@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from vps_core.split import FilePart, build_manifest, file_parts, split_ranges
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def original(tmp_path):
+    path = tmp_path / 'video.mkv'
+    path.write_bytes(os.urandom(10 * 1024 + 5))
+    return path
+
+
+def test_ranges_cover_the_file_exactly():
+    assert split_ranges(10, 4) == [(0, 4), (4, 4), (8, 2)]
+    assert split_ranges(8, 4) == [(0, 4), (4, 4)]
+    assert split_ranges(0, 4) == []
+
+
+def test_parts_read_back_the_original_and_hide_fileno(original):
+    parts = file_parts(str(original), 4096)
+    assert [p.name for p in parts] == ['video.mkv.part001', 'video.mkv.part002', 'video.mkv.part003']
+    datos = b''
+    for part in parts:
+        with pytest.raises(io.UnsupportedOperation):
+            part.fileno()
+        # La longitud que ve un cliente HTTP es la de la parte, no la del archivo
+        assert part.seek(0, io.SEEK_END) == part.length
+        part.seek(0)
+        datos += part.read()
+        part.close()
+    assert datos == original.read_bytes()
+
+
+def test_digest_is_computed_while_reading_and_reset_on_reread(original):
+    datos = original.read_bytes()
+    part = FilePart(str(original), 4096, 4096, 'p')
+    assert part.digest is None
+    part.read(100)
+    part.seek(1000)  # Salto: lo que se lea ahora no es consecutivo
+    part.read()
+    assert part.digest is None
+    part.seek(0)  # Reintento de la subida desde el principio
+    contados = []
+    part.on_read = contados.append
+    while part.read(777):
+        pass
+    assert part.digest == sha256(datos[4096:8192])
+    assert sum(contados) == 4096
+    part.seek(0)
+    part.read(10)
+    assert part.digest is None
+    assert part.compute_digest() == sha256(datos[4096:8192])
+
+
+def test_truncated_file_is_an_error(original):
+    part = FilePart(str(original), 8192, 2000, 'p')
+    os.truncate(original, 9000)
+    with pytest.raises(IOError, match='truncado'):
+        part.read()
+
+
+def test_manifest_checks_with_sha256sum(original, tmp_path):
+    parts = file_parts(str(original), 4096)
+    conocido = sha256(original.read_bytes()[:4096])
+    manifiesto = build_manifest(str(original), parts, {1: conocido})
+    assert manifiesto.startswith(f'# video.mkv: {10 * 1024 + 5} bytes en 3 partes\n')
+    assert parts[0].digest is None  # Su hash se dio hecho: no se releyó
+    destino = tmp_path / 'recibido'
+    destino.mkdir()
+    for part in parts:
+        part.seek(0)
+        (destino / part.name).write_bytes(part.read())
+    (destino / 'video.mkv.sha256').write_text(manifiesto)
+    lineas = [linea for linea in manifiesto.splitlines() if not linea.startswith('#')]
+    assert lineas == [f'{sha256((destino / p.name).read_bytes())}  {p.name}' for p in parts]
+    if shutil.which('sha256sum'):
+        subprocess.run(['sha256sum', '-c', 'video.mkv.sha256'], cwd=destino, check=True, capture_output=True)
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from vps_core.uploader import TokenBucket, UploadProgress, UploadScheduler
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Esperas instantáneas: se anotan los segundos pedidos a asyncio.sleep."""
+    pedidas = []
+    dormir = asyncio.sleep
+
+    async def sleep(seconds, *args):
+        pedidas.append(seconds)
+        await dormir(0)
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    return pedidas
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=3)
+        inicio = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        assert time.monotonic() - inicio < 0.03  # La ráfaga no espera
+        for _ in range(4):
+            await bucket.acquire()
+        assert time.monotonic() - inicio == pytest.approx(4 / 20, abs=0.05)
+        bucket.pause(0.2)
+        antes = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - antes >= 0.2
+
+    asyncio.run(main())
+
+
+def test_flood_control_waits_without_spending_retries():
+    async def main():
+        scheduler = UploadScheduler(retries=0, chat_rate=100, chat_burst=1)
+        intentos = []
+
+        async def enviar():
+            intentos.append(time.monotonic())
+            if len(intentos) < 3:
+                raise RetryAfter(0)  # Se espera retry_after más medio segundo de margen
+            return 'ok'
+
+        assert await scheduler.send(5, enviar) == 'ok'
+        assert len(intentos) == 3
+        assert intentos[2] - intentos[0] >= 1
+
+    asyncio.run(main())
+
+
+def test_network_errors_are_retried_with_backoff_and_bad_requests_are_not(sleeps):
+    async def main():
+        scheduler = UploadScheduler(retries=2, chat_rate=1000, chat_burst=100)
+        errores = [TimedOut(), NetworkError('caída')]
+
+        async def inestable():
+            if errores:
+                raise errores.pop(0)
+            return 'ok'
+
+        assert await scheduler.send(5, inestable) == 'ok'
+        esperas = [s for s in sleeps if s >= 1]
+        assert len(esperas) == 2 and esperas[1] > esperas[0] / 3
+
+        async def siempre_falla():
+            raise TimedOut()
+
+        with pytest.raises(TimedOut):
+            await scheduler.send(5, siempre_falla)
+
+        llamadas = []
+
+        async def mala():
+            llamadas.append(1)
+            raise BadRequest('archivo vacío')
+
+        with pytest.raises(BadRequest):
+            await scheduler.send(5, mala)
+        assert llamadas == [1]
+
+    asyncio.run(main())
+
+
+def test_concurrency_is_limited():
+    async def main():
+        scheduler = UploadScheduler(concurrency=2, global_rate=1000, chat_rate=1000, chat_burst=100)
+        activos, maximo = 0, 0
+
+        async def enviar():
+            nonlocal activos, maximo
+            activos += 1
+            maximo = max(maximo, activos)
+            await asyncio.sleep(0.01)
+            activos -= 1
+
+        await asyncio.gather(*(scheduler.send(i % 3, enviar) for i in range(10)))
+        assert maximo == 2
+
+    asyncio.run(main())
+
+
+class FakeMessage:
+    def __init__(self):
+        self.texts = []
+
+    async def reply_text(self, text):
+        self.texts.append(text)
+        return self
+
+    async def edit_text(self, text):
+        self.texts.append(text)
+
+
+def test_progress_edits_are_throttled_and_the_summary_lists_failures():
+    async def main():
+        mensaje = FakeMessage()
+        progreso = UploadProgress(mensaje, 'Enviando', total=3, interval=60)
+        await progreso.start()
+        await progreso.add(True)
+        await progreso.add(False, 'roto.txt')
+        assert mensaje.texts == ['Enviando\n📤 Enviados: 0/3']  # Aún no toca editar
+        await progreso.add(True)
+        await progreso.finish('Hecho')
+        assert mensaje.texts[-1] == 'Hecho\n📤 Enviados: 2/3\n❌ Fallidos: 1\n• roto.txt'
+
+    asyncio.run(main())